@@ -1,6 +1,7 @@
 import pathlib
 import re
 import typing
+import unicodedata
 
 import nestedtext
 
@@ -9,6 +10,8 @@ class AutoTranslator:
     def __init__(self, config: dict, game_config:dict) -> None:
         self.config = config
         self.game_config = game_config
+        # Placeholder text (See `protect_codes`) -> its translation.
+        self.translation_cache: typing.Dict[str, str] = {}
 
     def translate_actors(
         self, names: typing.Dict[int, typing.List[str]]
@@ -83,6 +86,14 @@ class AutoTranslator:
         raise NotImplementedError()
     
     def read_nested(self, nested:pathlib.Path) -> typing.Union[typing.List[str], typing.Dict[str,typing.Any], None]:
+        if nested.name.endswith(".lines.txt"):
+            # Lines exports are translated in the same layout as NestedText exports.
+            from RPGMVZ import RPGMVZLines
+
+            try:
+                return RPGMVZLines.to_nested(RPGMVZLines.loads(nested.read_text(encoding="utf-8")))
+            except RPGMVZLines.LinesError:
+                return None
         try:
             r = nestedtext.loads(nested.read_text(encoding="utf-8"))
             if isinstance(r,(int, dict)):
@@ -93,11 +104,85 @@ class AutoTranslator:
             return None
         
     def write_nested(self, data:typing.Dict[str, typing.List[str]], nested:pathlib.Path) -> typing.Union[typing.List[str], typing.Dict[str,typing.Any], None]:
+        if nested.name.endswith(".lines.txt"):
+            from RPGMVZ import RPGMVZLines
+
+            nested.write_text(RPGMVZLines.dumps(RPGMVZLines.from_nested(data)),encoding="utf-8")
+            return
         nested.write_text(nestedtext.dumps(data),encoding="utf-8")
 
 
     jp_rgx = re.compile(r"[一-龠]+|[ぁ-ゔ]+|[ァ-ヴー]+", flags=re.UNICODE)
 
+    def japanese_flags(self, strings: typing.List[str]) -> typing.List[bool]:
+        """`jp_rgx.search` for many strings at once. Vectorized when numpy is installed. (See `RPGMVZFeatures.analyze`)"""
+        from RPGMVZ.RPGMVZFeatures import analyze
+
+        return [count > 0 for count in analyze(strings).japanese]
+
+    # RPG Maker control codes. \V[12], \N[1], \C[4], \I[5], \FS[24], \n<Name>, \G, \!, \., \|, \{, \\ ...
+    control_rgx = re.compile(r"\\(?:[A-Za-z]+(?:\[[^\]\n]*\]|<[^>\n]*>)?|[{}\\$.|!<>^])")
+    # Translators tend to add spaces or switch to full width characters. Both are accepted when restoring.
+    placeholder_rgx = re.compile(r"[{｛]\s*([0-9０-９]+)\s*[}｝]")
+
+    def protect_codes(self, text: str) -> typing.Tuple[str, typing.List[str]]:
+        """Swaps the control codes of `text` for numbered placeholders (`{0}`, `{1}`, ...).
+
+        Lines that only differ in their control codes (e.g. `\\V[1]` and `\\V[2]`) then give the same placeholder text,
+        which is used for the cache and dedup key of the translation. (See `cache_key`)
+
+        Returns:
+            typing.Tuple[str, typing.List[str]]: The placeholder text and the codes, in order. Text that already looks like a placeholder is returned as is, without codes.
+        """
+        if self.placeholder_rgx.search(text):
+            return text, []
+        codes: typing.List[str] = []
+
+        def swap(match: re.Match) -> str:
+            codes.append(match.group())
+            return f"{{{len(codes) - 1}}}"
+
+        return self.control_rgx.sub(swap, text), codes
+
+    def cache_key(self, protected: str) -> str:
+        """The cache and dedup key of a placeholder text.
+
+        Full and half width forms (NFKC), runs of spaces and spaces around each line do not count. Line breaks do,
+        since the translation keeps them.
+        """
+        text = unicodedata.normalize("NFKC", protected)
+        return "\n".join(" ".join(line.split()) for line in text.strip().split("\n"))
+
+    def restore_codes(self, translated: str, codes: typing.List[str]) -> typing.Optional[str]:
+        """Puts the control codes back into a translated placeholder text.
+
+        Returns:
+            typing.Optional[str]: None if a placeholder went missing, was repeated or was mangled by the translator.
+        """
+        if not codes:
+            return translated
+        found = [int(match.group(1)) for match in self.placeholder_rgx.finditer(translated)]
+        if sorted(found) != list(range(len(codes))):
+            return None
+        return self.placeholder_rgx.sub(lambda match: codes[int(match.group(1))], translated)
+
+    def translate_protected(self, text: str, translate: typing.Callable[[str], str]) -> str:
+        """Translates `text` with `translate`, keeping its control codes out of the translator's reach.
+
+        Translations are cached on the placeholder text (See `cache_key`), so repeated lines are only sent once.
+        Falls back to sending `text` as is if the translator breaks the placeholders. Only translations that restore cleanly are cached.
+        """
+        protected, codes = self.protect_codes(text)
+        key = self.cache_key(protected)
+        translated = self.translation_cache.get(key)
+        if translated is None:
+            translated = translate(protected)
+        restored = self.restore_codes(translated, codes)
+        if restored is None:
+            return translate(text)
+        self.translation_cache[key] = translated
+        return restored
+
     def unpack_list_like(self, list_data:typing.List[str]) -> typing.List[typing.Dict[str, str]]:
         processing_data = []
         output_data = []
@@ -125,6 +210,33 @@ class AutoTranslator:
         return final
 
 
+    def translate_export(
+        self,
+        export_name: str,
+        data: typing.Dict[str, typing.Any],
+        actors: bool,
+        events: bool,
+        items: bool,
+        names: bool,
+    ) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """Translates a single export that is already loaded. Used to translate without going through the export files.
+
+        Args:
+            export_name (str): The file name of the export. Used to tell what the export holds.
+            data (typing.Dict[str, typing.Any]): The NestedText export data.
+            actors (bool): _description_
+            events (bool): _description_
+            items (bool): _description_
+            names (bool): _description_
+
+        Raises:
+            NotImplementedError: The function is not implemented by the translator
+
+        Returns:
+            typing.Optional[typing.Dict[str, typing.Any]]: The translated data. None if nothing was translated.
+        """
+        raise NotImplementedError()
+
     def translate_exports(
         self,
         exports: typing.Union[
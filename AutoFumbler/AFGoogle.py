@@ -94,20 +94,22 @@ class GoogleTranslator(AutoTranslator):
         
         # max_event_lines = self.config["Google"]["max_event_lines"]
 
+        def translate(text: str) -> str:
+            return self.google_instance.translate(text, "English", source_language="Japanese").result
+
         for ev_idx, event_section in events.items():
             unpacked_list_events = self.unpack_list_like(event_section)
             translated_data = []
             pbar = tqdm.tqdm(total=len(unpacked_list_events), desc=f"ev_idx: {ev_idx}")
+            japanese = self.japanese_flags([event_data["txt"] for event_data in unpacked_list_events])
             for idx, event_data in enumerate(unpacked_list_events):
-                if not self.jp_rgx.search(event_data["txt"]):
+                if not japanese[idx]:
                     translated_data.append(event_data)
                     pbar.update(1)
                     continue
                 if event_data["typ"] == "choice":
                     event_data["txt"] = self.collapse_chars(event_data["txt"])
-                    translated = self.google_instance.translate(
-                        event_data["txt"], "English", source_language="Japanese"
-                    ).result
+                    translated = self.translate_protected(event_data["txt"], translate)
                     orig_count = len(event_data["txt"].split("\n"))
                     event_data["txt"] = translated.strip()
                     nw_lines = event_data["txt"].split("\n")
@@ -142,9 +144,7 @@ class GoogleTranslator(AutoTranslator):
                     else:
                         # Keep it as is.
                         concat_lines = "\n".join(orig_lines)
-                    translated = self.google_instance.translate(
-                        concat_lines, "English", source_language="Japanese"
-                    ).result
+                    translated = self.translate_protected(concat_lines, translate)
 
                     # Repad and rewrap tests.
                     orig_count = len(event_data["txt"].split("\n"))
@@ -212,6 +212,35 @@ class GoogleTranslator(AutoTranslator):
             events[ev_idx] = self.pack_translated(translated_data)
         return events
 
+    def translate_export(
+        self,
+        export_name: str,
+        data: typing.Dict[str, typing.Any],
+        actors: bool,
+        events: bool,
+        items: bool,
+        names: bool,
+    ) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        export_name = export_name.lower()
+        if actors and "actors" in export_name:
+            # Actor ID -> {"name", "nickname", "profile", "note"}
+            translate_data = {
+                idx: [actor.get("name", ""), actor.get("profile", ""), actor.get("nickname", "")]
+                for idx, actor in data.items()
+            }
+            for idx, (name, profile, nickname) in self.translate_actors(translate_data).items():
+                if isinstance(profile, list):
+                    profile = "\n".join(profile)
+                for key, value in (("name", name), ("profile", profile), ("nickname", nickname)):
+                    if key in data[idx]:
+                        data[idx][key] = value
+            return data
+        if events and "commonevents" in export_name:
+            return self.translate_events(data)
+        elif events and export_name.startswith("map"):
+            return self.translate_events(data)
+        return None
+
     def translate_exports(
         self,
         exports: typing.List[pathlib.Path] | typing.Generator[pathlib.Path, None, None],
@@ -221,36 +250,13 @@ class GoogleTranslator(AutoTranslator):
         names: bool,
     ):
         for export in exports:
-            export_name = export.name.lower()
             if not export.exists():
                 continue
-            if actors and "actors" in export_name:
-                data = self.read_nested(export)
-                if not isinstance(data, dict):
-                    return
-                translate_data = {}
-                rd = {}
-                for idx, actor in enumerate(self.unpack_list_like(data["Actors"])):
-                    name, note, nick, profile = actor
-                    translate_data[idx] = [name, profile, nick]
-                    rd[idx] = [name, note, nick, profile]
-                translate_data = self.translate_actors(translate_data)
-                for idx, actor in enumerate(self.unpack_list_like(data["Actors"])):
-                    rd[idx][0] = actor[0]
-                    rd[idx][2] = actor[3]
-                    rd[idx][3] = actor[2]
-                z = []
-                for value in rd.values():
-                    z.extend(value)
-                    z.append("<>")
-                self.write_nested({"Actors": z}, export)
-            if events and "commonevents" in export_name:
-                data = self.read_nested(export)
-                if not isinstance(data, dict):
-                    return
-                self.write_nested(self.translate_events(data), export)
-            elif events and export_name.startswith("map"):
-                data = self.read_nested(export)
-                if not isinstance(data, dict):
-                    return
-                self.write_nested(self.translate_events(data), export)
+            data = self.read_nested(export)
+            if not isinstance(data, dict):
+                return
+            translated = self.translate_export(
+                export.name, data, actors, events, items, names
+            )
+            if translated is not None:
+                self.write_nested(translated, export)
@@ -18,41 +18,47 @@ class OobaModel(AutoTranslator):
 
     def __init__(self, prompt_config:dict) -> None:
         self.prompt:dict = prompt_config
+        self.translation_cache: typing.Dict[str, str] = {}
 
     def translate_events(self, nested_text:dict) -> dict:
         def chunks(lst, n):
             for i in range(0, len(lst), n):
                 yield lst[i:i + n]
         session = httpx.Client()
+        def send(text):
+            dc = self.prompt["events"].replace("{dialogues}",text)
+            request = {
+                'prompt': dc,
+                'max_new_tokens': 1024,
+                'auto_max_new_tokens': True,
+                'preset': 'None',
+                'do_sample': True,
+                'temperature': self.prompt.get("temp", 0.2),
+                'top_p': self.prompt.get("top_p", 0.2),
+                'top_k': self.prompt.get("top_k", 0.2),
+                'repetition_penalty': 1.0,
+                'repetition_penalty_range': 1024,
+                'seed': -1,
+                'add_bos_token': True,
+                'mirostat_mode': 2,
+                'mirostat_tau': 5,
+                'mirostat_eta': 0.1,
+                'stopping_strings': ["</s>"]
+            }
+            rich.print(request)
+            # print(dc)
+            session_url = self.prompt["ooba_url"]
+            r = session.post(session_url, json=request, timeout=None)
+            result = r.json()["results"][0]["text"]
+            print(dc + result)
+            return result
         final = {}
         for event_id, dialogues in nested_text.items():
             t_buffer = ""
             for diag in dialogues:
-                dc = self.prompt["events"].replace("{dialogues}",diag)
-                request = {
-                    'prompt': dc,
-                    'max_new_tokens': 1024,
-                    'auto_max_new_tokens': True,
-                    'preset': 'None',
-                    'do_sample': True,
-                    'temperature': self.prompt.get("temp", 0.2),
-                    'top_p': self.prompt.get("top_p", 0.2),
-                    'top_k': self.prompt.get("top_k", 0.2),
-                    'repetition_penalty': 1.0,
-                    'repetition_penalty_range': 1024,
-                    'seed': -1,
-                    'add_bos_token': True,
-                    'mirostat_mode': 2,
-                    'mirostat_tau': 5,
-                    'mirostat_eta': 0.1,
-                    'stopping_strings': ["</s>"]
-                }
-                rich.print(request)
-                # print(dc)
-                session_url = self.prompt["ooba_url"]
-                r = session.post(session_url, json=request, timeout=None)
-                print(dc + r.json()["results"][0]["text"])
-                t_buffer += dc + r.json()["results"][0]["text"] + "---\n"
+                # Sends the placeholder text. Repeated dialogues are only sent once and broken placeholders resend `diag`. (See `AutoTranslator.translate_protected`)
+                result = self.translate_protected(diag, send)
+                t_buffer += self.prompt["events"].replace("{dialogues}",diag) + result + "---\n"
             final[str(event_id)] = t_buffer
         return final
             
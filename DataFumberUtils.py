@@ -1,3 +1,8 @@
+import pathlib
+import time
+import tracemalloc
+import typing
+
 import orjson
 import typer
 
@@ -11,5 +16,423 @@ def decode_json():
 def encode_json():
     print(orjson.dumps(input("Enter decoded json>:")).decode())
 
+
+def measure(func: typing.Callable, rounds: int) -> typing.Tuple[float, int]:
+    """Average time in ms and the peak traced memory in KiB of `func()`."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] // 1024
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+@app.command(name="bench-map")
+def bench_map(map_file: pathlib.Path, rounds: int = 20):
+    """Compares the full map parse against the tile skipping parse used for mapping."""
+    from RPGMVZ.RPGMVZScan import load_map_without_tiles
+
+    raw = map_file.read_bytes()
+    full = orjson.loads(raw)
+    full["data"] = []
+    if full != load_map_without_tiles(raw):
+        raise Exception("Tile skipping parse does not match the full parse.")
+    print(f"{map_file.name}: {len(raw) // 1024} KiB")
+    for name, func in [
+        ("orjson.loads", lambda: orjson.loads(raw)),
+        ("load_map_without_tiles", lambda: load_map_without_tiles(raw)),
+    ]:
+        elapsed, peak = measure(func, rounds)
+        print(f"{name:>24}: {elapsed:8.2f} ms, peak {peak} KiB")
+
+
+def baseline_decoder(revision: str, config: dict) -> typing.Callable[[list], list]:
+    """`MVZFungler.parse_page_lists`, the if-chain decoder, as of a git revision of this repository."""
+    import subprocess
+    import types
+
+    path = "RPGMVZ/RPGMVZBase.py"
+    source = subprocess.run(
+        ["git", "show", f"{revision}:{path}"],
+        cwd=pathlib.Path(__file__).resolve().parent,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        check=True,
+    ).stdout
+    module = types.ModuleType("baseline")
+    exec(compile(source, f"{revision}:{path}", "exec"), module.__dict__)
+    fungler_cls = getattr(module, "MVZFungler", None)
+    if fungler_cls is None or not hasattr(fungler_cls, "parse_page_lists"):
+        raise Exception(f"{revision} has no if-chain decoder (MVZFungler.parse_page_lists).")
+    return fungler_cls(pathlib.Path(), pathlib.Path(), pathlib.Path(), config).parse_page_lists
+
+
+@app.command(name="bench-events")
+def bench_events(
+    commands: int = 100000,
+    rounds: int = 10,
+    game_type: str = "MV",
+    baseline: typing.Optional[str] = typer.Option(
+        None, help="Also time the if-chain decoder of this git revision, e.g. the last one before the command registry."
+    ),
+):
+    """Times the event command decoder on synthetic pages with and without text."""
+    from RPGMVZ.RPGMVZCommands import EventCommandDecoder
+
+    def cmd(code, parameters):
+        return {"code": code, "indent": 0, "parameters": parameters}
+
+    text_page = []
+    while len(text_page) < commands:
+        text_page += [
+            cmd(101, ["", 0, 0, 2]),
+            cmd(401, ["こんにちは"]),
+            cmd(401, ["元気？"]),
+            cmd(102, [["はい", "いいえ"], 1, 0, 2, 0]),
+            cmd(402, [0, "はい"]),
+            cmd(0, []),
+            cmd(402, [1, "いいえ"]),
+            cmd(0, []),
+            cmd(404, []),
+            cmd(356, ["D_TEXT 文字 24"]),
+            cmd(320, [1, "名前"]),
+            cmd(122, [5, 5, 0, 4, "'テスト'"]),
+            cmd(121, [1, 1, 0]),
+            cmd(230, [60]),
+            cmd(111, [0, 1, 0]),
+            cmd(412, []),
+        ]
+    # Pages end with an empty command, which the if-chain relies on.
+    text_page = text_page[: commands - 1] + [cmd(0, [])]
+    plain_page = [cmd((121, 230, 111, 0)[idx % 4], [1]) for idx in range(commands)]
+    # The if-chain pops the choices it matched. Both decoders get fresh ones every round.
+    menus = [(command["parameters"], command["parameters"][0]) for command in text_page if command["code"] == 102]
+
+    def refill():
+        for parameters, choices in menus:
+            parameters[0] = list(choices)
+
+    config = {"General": {"type": game_type}, "Events": {"dtext": True, "code_122": [5], "auto_code_122": False}}
+    decoders = [("registry", EventCommandDecoder(config).decode)]
+    if baseline:
+        decoders.insert(0, (baseline, baseline_decoder(baseline, config)))
+    print(f"{commands} commands, codes: {sorted(EventCommandDecoder(config).codes)}")
+    for name, page in [("text page", text_page), ("no text page", plain_page)]:
+        for label, decode in decoders:
+
+            def run():
+                refill()
+                return decode(page)
+
+            entries = len(run())
+            elapsed, peak = measure(run, rounds)
+            print(
+                f"{name:>14} {label:>8}: {elapsed:8.2f} ms, {commands / elapsed / 1000:6.2f} M commands/s, {entries} entries, peak {peak} KiB"
+            )
+
+
+@app.command(name="bench-choices")
+def bench_choices(depth: int = 6, width: int = 3, menus: int = 20, rounds: int = 10):
+    """Checks and times Show Choices decoding on nested synthetic menus with repeated labels."""
+    from RPGMVZ.RPGMVZCommands import EventCommandDecoder, choice_branches
+
+    page: typing.List[typing.Dict[str, typing.Any]] = []
+    expected: typing.Dict[int, typing.List[int]] = {}
+
+    def cmd(code, parameters, indent):
+        page.append({"code": code, "indent": indent, "parameters": parameters})
+        return len(page) - 1
+
+    def menu(level: int, indent: int):
+        # Every menu uses the same labels, so only the indents tell the branches apart.
+        labels = ["はい", "いいえ", "はい"][:width] + [f"選択{idx}" for idx in range(3, width)]
+        base = cmd(102, [labels, 1, 0, 2, 0], indent)
+        expected[base] = []
+        for idx, label in enumerate(labels):
+            expected[base].append(cmd(402, [idx, label], indent))
+            cmd(101, ["", 0, 0, 2], indent + 1)
+            cmd(401, [f"{label}{level}"], indent + 1)
+            if level < depth and idx == 0:
+                menu(level + 1, indent + 1)
+            cmd(0, [], indent + 1)
+        cmd(403, [6, None], indent)
+        cmd(0, [], indent + 1)
+        cmd(404, [], indent)
+
+    for _ in range(menus):
+        menu(1, 0)
+    cmd(0, [], 0)
+    if choice_branches(page) != expected:
+        raise Exception("Show Choices branches do not match the generated menus.")
+    decoder = EventCommandDecoder(
+        {"General": {"type": "MV"}, "Events": {"code_122": [], "auto_code_122": False}}
+    )
+    entries = [entry for entry in decoder.decode(page) if entry["type"] == "text_choice"]
+    if [entry["pointer"] for entry in entries] != [[base, *branches] for base, branches in expected.items()]:
+        raise Exception("Decoded choices do not point to their own branches.")
+    print(f"{len(page)} commands, {len(expected)} menus, depth {depth}")
+    for name, func in [
+        ("choice_branches", lambda: choice_branches(page)),
+        ("decode", lambda: decoder.decode(page)),
+    ]:
+        elapsed, peak = measure(func, rounds)
+        print(f"{name:>16}: {elapsed:8.2f} ms, {len(page) / elapsed / 1000:6.2f} M commands/s, peak {peak} KiB")
+
+
+@app.command(name="bench-features")
+def bench_features(strings: int = 200000, rounds: int = 5):
+    """Compares the numpy text features against the regex fallback on synthetic event text."""
+    from RPGMVZ import RPGMVZFeatures
+
+    texts = [
+        f"こんにちは{idx}\\V[{idx % 3}]\n元気？{idx} \\C[2]hello\\C[0]" if idx % 4 else f"Plain line {idx}"
+        for idx in range(strings)
+    ]
+    if RPGMVZFeatures.numpy is None:
+        raise Exception("numpy is not installed.")
+    expected = RPGMVZFeatures._analyze_python(texts)
+    features = RPGMVZFeatures._analyze_numpy(texts)
+    for name, _ in RPGMVZFeatures.TextFeatures.columns:
+        if getattr(features, name) != getattr(expected, name):
+            raise Exception(f"numpy features do not match the fallback: {name}")
+    print(f"{strings} strings, {sum(map(len, texts)) // 1024} K characters")
+    for name, func in [
+        ("regex", lambda: RPGMVZFeatures._analyze_python(texts)),
+        ("numpy", lambda: RPGMVZFeatures._analyze_numpy(texts)),
+    ]:
+        elapsed, peak = measure(func, rounds)
+        print(f"{name:>8}: {elapsed:8.2f} ms, peak {peak} KiB")
+
+
+def synthetic_sections(sections: int, lines: int) -> typing.Dict[str, typing.List[str]]:
+    """Export lines shaped like a large CommonEvents: text lines with control codes and `<>` separators."""
+    return {
+        str(section): [
+            "<>" if idx % 4 == 3 else f"こんにちは{section}-{idx}\\V[{idx % 3}] & <{idx}>"
+            for idx in range(lines)
+        ]
+        for section in range(1, sections + 1)
+    }
+
+
+@app.command(name="bench-xlsx")
+def bench_xlsx(
+    sections: int = 500,
+    lines: int = 400,
+    writer: typing.Optional[str] = typer.Option(
+        None, help="Run only this writer (pandas, stream) in this process."
+    ),
+):
+    """Compares the pandas xlsx export against the streaming writer. Each writer runs in its own process for a fair peak RSS."""
+    import resource
+    import subprocess
+    import sys
+    import tempfile
+
+    if writer is None:
+        print(f"{sections} sheets of {lines} lines")
+        for name in ("pandas", "stream"):
+            subprocess.run(
+                [sys.executable, __file__, "bench-xlsx", "--sections", str(sections), "--lines", str(lines), "--writer", name],
+                check=True,
+            )
+        return
+    values = synthetic_sections(sections, lines)
+    output = pathlib.Path(tempfile.mkdtemp()) / f"{writer}.xlsx"
+    start = time.perf_counter()
+    if writer == "pandas":
+        # The export before the streaming writer, import included.
+        import pandas
+
+        with pandas.ExcelWriter(str(output)) as excel:
+            for sheet_name, list_values in values.items():
+                pandas.DataFrame.from_dict(
+                    {
+                        "Original": list_values,
+                        "Inital": [""] * len(list_values),
+                        "Edited": [""] * len(list_values),
+                        "Final": [""] * len(list_values),
+                    }
+                ).to_excel(excel, sheet_name=sheet_name)
+    elif writer == "stream":
+        from RPGMVZ.RPGMVZBase import EXCEL_COLUMNS
+        from RPGMVZ.RPGMVZXlsx import XlsxStream
+
+        with XlsxStream(output) as workbook:
+            for sheet_name, list_values in values.items():
+                sheet = workbook.add_sheet(sheet_name)
+                sheet.write_row([None, *EXCEL_COLUMNS])
+                sheet.write_rows([idx, value] for idx, value in enumerate(list_values))
+    else:
+        raise Exception(f"Unknown writer: {writer}")
+    elapsed = (time.perf_counter() - start) * 1000
+    # ru_maxrss is in KiB on Linux.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{writer:>8}: {elapsed:8.2f} ms, peak RSS {peak // 1024} MiB, {output.stat().st_size // 1024} KiB")
+    output.unlink()
+    output.parent.rmdir()
+
+
+@app.command(name="bench-xlsx-import")
+def bench_xlsx_import(rows: int = 50000, sheets: int = 50):
+    """Compares the pandas `read_excel` + `iterrows` import against the streaming reader on a workbook with shared strings."""
+    import tempfile
+
+    import pandas
+
+    from RPGMVZ.RPGMVZBase import EXCEL_COLUMNS
+    from RPGMVZ.RPGMVZXlsx import XlsxReader, pick_texts
+
+    per_sheet = max(1, rows // sheets)
+    values = synthetic_sections(sheets, per_sheet)
+    output = pathlib.Path(tempfile.mkdtemp()) / "import.xlsx"
+    # Written by pandas (shared strings, like a workbook saved by Excel) with some rows translated.
+    with pandas.ExcelWriter(str(output)) as excel:
+        for sheet_name, list_values in values.items():
+            pandas.DataFrame.from_dict(
+                {
+                    "Original": list_values,
+                    "Inital": [f"TL {value}" if idx % 2 else None for idx, value in enumerate(list_values)],
+                    "Edited": [f"ED {value}" if idx % 5 == 0 else None for idx, value in enumerate(list_values)],
+                    "Final": [f"FN {value}" if idx % 7 == 0 else None for idx, value in enumerate(list_values)],
+                }
+            ).to_excel(excel, sheet_name=sheet_name)
+
+    def old_import():
+        data = {}
+        for sheet_name, data_frame in pandas.read_excel(output, sheet_name=None).items():
+            data[sheet_name] = []
+            for _, row in data_frame.iterrows():
+                text_value = None
+                for column in EXCEL_COLUMNS[::-1]:
+                    if isinstance(row[column], str) and row[column]:
+                        text_value = row[column]
+                        break
+                data[sheet_name].append(text_value)
+        return data
+
+    def stream_import():
+        with XlsxReader(output) as workbook:
+            return {
+                sheet_name: pick_texts(workbook.rows(sheet_name), EXCEL_COLUMNS[::-1])[None]
+                for sheet_name in workbook.sheets
+            }
+
+    if old_import() != stream_import():
+        raise Exception("Streaming import does not match pandas.")
+    print(f"{sheets * per_sheet} rows in {sheets} sheets, {output.stat().st_size // 1024} KiB")
+    for name, func in [
+        ("pandas", old_import),
+        ("stream", stream_import),
+    ]:
+        elapsed, peak = measure(func, 1)
+        print(f"{name:>8}: {elapsed:8.2f} ms, peak {peak} KiB")
+    output.unlink()
+    output.parent.rmdir()
+
+
+@app.command(name="bench-lines")
+def bench_lines(megabytes: int = 10, rounds: int = 3):
+    """Compares parsing an events export as NestedText (then splitting on `<>`) against the lines format."""
+    import nestedtext
+
+    from RPGMVZ import RPGMVZLines
+    from RPGMVZ.RPGMVZBase import split_entries
+
+    # Enough events of 400 lines for `megabytes` of NestedText.
+    per_event = len(nestedtext.dumps(synthetic_sections(1, 400)).encode("utf-8"))
+    sections = synthetic_sections(max(1, megabytes * 1024 * 1024 // per_event), 400)
+    nested_raw = nestedtext.dumps(sections)
+    events = RPGMVZLines.from_nested(sections)
+    lines_raw = RPGMVZLines.dumps(events)
+
+    def nested_parse():
+        return {key: split_entries(lines) for key, lines in nestedtext.loads(nested_raw).items()}
+
+    def lines_parse():
+        return {key: [text for text, _, _ in entries] for key, entries in RPGMVZLines.loads(lines_raw).items()}
+
+    if nested_parse() != lines_parse():
+        raise Exception("Lines export does not parse to the same entries.")
+    print(
+        f"{len(sections)} events, nested {len(nested_raw.encode('utf-8')) / 1e6:.1f} MB, lines {len(lines_raw.encode('utf-8')) / 1e6:.1f} MB"
+    )
+    for name, func in [
+        ("nestedtext", nested_parse),
+        ("lines", lines_parse),
+    ]:
+        elapsed, peak = measure(func, rounds)
+        print(f"{name:>12}: {elapsed:8.2f} ms, peak {peak} KiB")
+
+
+@app.command(name="mapping-json")
+def mapping_json(mapping_file: pathlib.Path, output: typing.Optional[pathlib.Path] = None):
+    """Prints (or writes to `output`) the json view of a mapping file. Works for binary and json mappings."""
+    from RPGMVZ.RPGMVZEntries import load_mapping
+
+    raw = orjson.dumps(load_mapping(mapping_file.read_bytes()), option=orjson.OPT_INDENT_2)
+    if output:
+        output.write_bytes(raw)
+    else:
+        print(raw.decode("utf-8"))
+
+
+@app.command(name="bench-mapping")
+def bench_mapping(mapping_file: pathlib.Path, rounds: int = 5):
+    """Compares loading an event mapping as json dicts against the binary `EntryTable`."""
+    from RPGMVZ.RPGMVZEntries import EntryTable, load_mapping
+
+    mapping = load_mapping(mapping_file.read_bytes())
+    table = EntryTable.from_mapping(mapping)
+    if table.to_mapping() != mapping:
+        raise Exception("EntryTable does not round trip the mapping.")
+    json_raw = orjson.dumps(mapping, option=orjson.OPT_INDENT_2)
+    binary_raw = table.to_bytes()
+    if EntryTable.from_bytes(binary_raw).to_mapping() != mapping:
+        raise Exception("Binary encoding does not round trip the mapping.")
+    print(
+        f"{mapping_file.name}: {len(table)} entries, json {len(json_raw) // 1024} KiB, binary {len(binary_raw) // 1024} KiB"
+    )
+    # Millions of live dicts slow down every garbage collection. Don't let them skew the table timings.
+    del mapping
+    for name, func in [
+        ("json -> dicts", lambda: orjson.loads(json_raw)),
+        ("binary -> table", lambda: EntryTable.from_bytes(binary_raw)),
+        ("table rows", lambda: sum(1 for _ in table.rows())),
+        ("table -> binary", lambda: table.to_bytes()),
+    ]:
+        elapsed, peak = measure(func, rounds)
+        print(f"{name:>16}: {elapsed:8.2f} ms, peak {peak} KiB")
+
+
+@app.command(name="store-query")
+def store_query(
+    db_file: pathlib.Path,
+    file: typing.Optional[str] = None,
+    event: typing.Optional[int] = None,
+    untranslated: bool = False,
+):
+    """Lists the event mapping entries in a project database (`store = "sqlite"`), one json object per line."""
+    from RPGMVZ.RPGMVZStore import SQLiteStore
+
+    store = SQLiteStore(db_file, db_file.parent / "data")
+    for entry in store.entries(rel=file, event=event, untranslated=untranslated):
+        print(orjson.dumps(entry).decode("utf-8"))
+
+
+@app.command(name="store-status")
+def store_status(db_file: pathlib.Path):
+    """Prints how many entries of each event mapping in a project database are still untranslated."""
+    from RPGMVZ.RPGMVZStore import SQLiteStore
+
+    store = SQLiteStore(db_file, db_file.parent / "data")
+    for rel, total, untranslated in store.status():
+        print(f"{rel:>24}: {untranslated:6}/{total:<6} untranslated")
+
+
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    app()
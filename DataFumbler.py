@@ -26,7 +26,11 @@ project_folder_name = "tl_workspace"
 def mapping(
     game_exec: pathlib.Path,
     config: typing.Optional[pathlib.Path] = None,
-    overwrite: bool = False,
+    overwrite: bool = typer.Option(
+        False, help="Remap every file, even if its mapping is up to date."
+    ),
+    jobs: int = 1,
+    force: bool = typer.Option(False, help="Ignore the build state. For map, the same as --overwrite."),
 ):
 
     if not game_exec.is_file() or not game_exec.suffix.endswith(".exe"):
@@ -47,7 +51,9 @@ def mapping(
         except tomli.TOMLDecodeError:
             typer.secho("Config Read Error. `DataFumbler.toml` was not decoded properly. Check your config.", fg="red")
             return False
-    MVZHandler(game_exec, config_dict).create_maps(replace=overwrite)
+    MVZHandler(game_exec, config_dict).create_maps(
+        replace=overwrite, jobs=jobs, force=force
+    )
 
 
 @app.command(name="export")
@@ -55,7 +61,17 @@ def export_data(
     game_exec: pathlib.Path,
     config: typing.Optional[pathlib.Path] = None,
     overwrite: bool = False,
-    format = "xlsx"
+    format: str = typer.Option(
+        "xlsx", help="[nested, lines, xlsx] or delta: a lines export of the strings new or changed since the last export."
+    ),
+    jobs: int = 1,
+    force: bool = False,
+    workbook: bool = typer.Option(
+        False, help="Export every file as one sheet of a single export/project.xlsx. Implies --format xlsx."
+    ),
+    only: typing.Optional[typing.List[str]] = typer.Option(
+        None, help="Only put data files matching this name or glob in the workbook. Can be repeated. (Map*.json also matches MapInfos.json, use Map[0-9]*.json for maps only)"
+    ),
 ):
 
     if not game_exec.is_file() or not game_exec.suffix.endswith(".exe"):
@@ -74,7 +90,11 @@ def export_data(
             config_dict = tomli.loads(config.read_text(encoding="utf-8"))
         except tomli.TOMLDecodeError:
             raise Exception("Config Read Error. Decode Error.")
-    MVZHandler(game_exec, config_dict).export(replace=overwrite, format=format)
+    handler = MVZHandler(game_exec, config_dict)
+    if workbook:
+        handler.export_workbook(only=only)
+        return
+    handler.export(replace=overwrite, format=format, jobs=jobs, force=force)
 
 
 @app.command(name="import")
@@ -82,6 +102,18 @@ def import_data(
     game_exec: pathlib.Path,
     config: typing.Optional[pathlib.Path] = None,
     overwrite: bool = False,
+    jobs: int = 1,
+    force: bool = False,
+    only: typing.Optional[typing.List[str]] = typer.Option(
+        None, help="Only import data files matching this name or glob. Can be repeated. (Map*.json also matches MapInfos.json, use Map[0-9]*.json for maps only)"
+    ),
+    event: typing.Optional[typing.List[int]] = typer.Option(
+        None, help="Only import this event ID of maps and common events. Can be repeated."
+    ),
+    format: str = typer.Option("nested", help="Export format to import from. [nested, lines, delta, xlsx]"),
+    workbook: bool = typer.Option(
+        False, help="Import the sheets of export/project.xlsx (See `export --workbook`)."
+    ),
 ):
 
     if not game_exec.is_file() or not game_exec.suffix.endswith(".exe"):
@@ -100,13 +132,147 @@ def import_data(
             config_dict = tomli.loads(config.read_text(encoding="utf-8"))
         except tomli.TOMLDecodeError:
             raise Exception("Config Read Error. Decode Error.")
-    MVZHandler(game_exec, config_dict).import_maps()
+    handler = MVZHandler(game_exec, config_dict)
+    if workbook:
+        handler.import_workbook(only=only)
+        return
+    handler.import_maps(
+        jobs=jobs, force=force, only=only, events=event, format=format
+    )
 
 
 @app.command(name="patch")
 def patch_data(
     game_exec: pathlib.Path,
     config: typing.Optional[pathlib.Path] = None,
+    jobs: int = 1,
+    force: bool = False,
+    refresh_game: bool = False,
+    only: typing.Optional[typing.List[str]] = typer.Option(
+        None, help="Only patch data files matching this name or glob. Can be repeated. (Map*.json also matches MapInfos.json, use Map[0-9]*.json for maps only)"
+    ),
+    event: typing.Optional[typing.List[int]] = typer.Option(
+        None, help="Only patch this event ID of maps and common events. Can be repeated."
+    ),
+):
+    if not game_exec.is_file() or not game_exec.suffix.endswith(".exe"):
+        raise FileNotFoundError("Expecting a game executable.")
+
+    if config:
+        try:
+            config_dict = tomli.loads(config.read_text(encoding="utf-8"))
+        except tomli.TOMLDecodeError:
+            raise Exception("Config Read Error. Decode Error.")
+    else:
+        config = game_exec.resolve().parent / "DataFumbler.toml"
+        if not config.exists():
+            raise Exception("Config Read Error. Config not found.")
+        try:
+            config_dict = tomli.loads(config.read_text(encoding="utf-8"))
+        except tomli.TOMLDecodeError:
+            raise Exception("Config Read Error. Decode Error.")
+    MVZHandler(game_exec, config_dict).patch(
+        skip_copy=not refresh_game, jobs=jobs, force=force, only=only, events=event
+    )
+
+
+@app.command(name="analyze")
+def analyze_text(
+    game_exec: pathlib.Path,
+    config: typing.Optional[pathlib.Path] = None,
+    force: bool = False,
+    only: typing.Optional[typing.List[str]] = typer.Option(
+        None, help="Only analyze data files matching this name or glob. Can be repeated. (Map*.json also matches MapInfos.json, use Map[0-9]*.json for maps only)"
+    ),
+):
+    if not game_exec.is_file() or not game_exec.suffix.endswith(".exe"):
+        raise FileNotFoundError("Expecting a game executable.")
+
+    if config:
+        try:
+            config_dict = tomli.loads(config.read_text(encoding="utf-8"))
+        except tomli.TOMLDecodeError:
+            raise Exception("Config Read Error. Decode Error.")
+    else:
+        config = game_exec.resolve().parent / "DataFumbler.toml"
+        if not config.exists():
+            raise Exception("Config Read Error. Config not found.")
+        try:
+            config_dict = tomli.loads(config.read_text(encoding="utf-8"))
+        except tomli.TOMLDecodeError:
+            raise Exception("Config Read Error. Decode Error.")
+    summaries = MVZHandler(game_exec, config_dict).analyze_text(only=only, force=force)
+    print(f"{'file':<32} {'strings':>8} {'japanese':>8} {'escapes':>8} {'max line':>8}")
+    for rel, summary in summaries.items():
+        print(
+            f"{rel:<32} {summary['strings']:>8} {summary['japanese']:>8} {summary['escapes']:>8} {summary['max_line']:>8}"
+        )
+
+
+@app.command(name="run")
+def run_all(
+    game_exec: pathlib.Path,
+    config: typing.Optional[pathlib.Path] = None,
+    translator: str = "",
+    events: bool = False,
+    items: bool = False,
+    actors: bool = False,
+    write_exports: bool = False,
+    force: bool = False,
+    refresh_game: bool = False,
+    depth: int = 4,
+):
+    if not game_exec.is_file() or not game_exec.suffix.endswith(".exe"):
+        raise FileNotFoundError("Expecting a game executable.")
+
+    if config:
+        try:
+            config_dict = tomli.loads(config.read_text(encoding="utf-8"))
+        except tomli.TOMLDecodeError:
+            raise Exception("Config Read Error. Decode Error.")
+    else:
+        config = game_exec.resolve().parent / "DataFumbler.toml"
+        if not config.exists():
+            raise Exception("Config Read Error. Config not found.")
+        try:
+            config_dict = tomli.loads(config.read_text(encoding="utf-8"))
+        except tomli.TOMLDecodeError:
+            raise Exception("Config Read Error. Decode Error.")
+
+    translate = None
+    if translator.lower() == "google":
+        config_auto = pathlib.Path(__file__).resolve().parent / "DataFumblerAuto.toml"
+        if not config_auto.exists():
+            raise Exception("Google needs a DataFumblerAuto.toml.")
+        try:
+            config_auto_dict = tomli.loads(config_auto.read_text(encoding="utf-8"))
+        except tomli.TOMLDecodeError:
+            raise Exception("ConfigAuto Read Error. Decode Error.")
+
+        from AutoFumbler.AFGoogle import GoogleTranslator
+
+        model = GoogleTranslator(config_auto_dict, config_dict)
+
+        def translate(export_name: str, data):
+            return model.translate_export(export_name, data, actors, events, items, False)
+
+    elif translator:
+        raise Exception(f"Unknown translator: {translator}. Expected one of [google]")
+    MVZHandler(game_exec, config_dict).run(
+        translate=translate,
+        write_exports=write_exports,
+        skip_copy=not refresh_game,
+        force=force,
+        depth=depth,
+    )
+
+
+@app.command(name="watch")
+def watch_exports(
+    game_exec: pathlib.Path,
+    config: typing.Optional[pathlib.Path] = None,
+    debounce: float = 0.3,
+    polling: bool = False,
 ):
     if not game_exec.is_file() or not game_exec.suffix.endswith(".exe"):
         raise FileNotFoundError("Expecting a game executable.")
@@ -124,7 +290,7 @@ def patch_data(
             config_dict = tomli.loads(config.read_text(encoding="utf-8"))
         except tomli.TOMLDecodeError:
             raise Exception("Config Read Error. Decode Error.")
-    MVZHandler(game_exec, config_dict).patch()
+    MVZHandler(game_exec, config_dict).watch(debounce=debounce, polling=polling)
 
 
 if __name__ == "__main__":
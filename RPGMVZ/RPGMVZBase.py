@@ -6,10 +6,52 @@ import nestedtext
 
 import orjson
 
-try:
-    import pandas
-except ImportError:
-    pandas = None
+from .RPGMVZCache import DocumentCache
+from .RPGMVZCommands import EventCommandDecoder, get_decoder
+from .RPGMVZEntries import EntryTable
+from .RPGMVZFeatures import TextFeatures
+from .RPGMVZLines import LinesError, Section, dumps as dump_lines, keyed_entries, loads as load_lines
+from .RPGMVZManifest import content_hash
+from .RPGMVZPages import PageCache
+from .RPGMVZPlan import PatchPlan
+from .RPGMVZScan import Path, find_spans, set_path, splice
+from .RPGMVZStore import FileStore, MappingStore
+from .RPGMVZXlsx import XlsxReader, XlsxStream, pick_texts
+
+# Columns of an xlsx export after the original text. Translators fill them in, the last filled one is imported.
+EXCEL_COLUMNS = ("Original", "Inital", "Edited", "Final")
+
+
+def split_entries(lines: typing.List[str]) -> typing.List[typing.List[str]]:
+    """Splits exported event lines into the text of each entry on the `<>` (`<>c`) lines ending them."""
+    entries = []
+    entry = []
+    for line in lines:
+        if line.startswith("<>") and len(line) in [2, 3]:
+            entries.append(entry)
+            entry = []
+        else:
+            entry.append(line)
+    return entries
+
+
+def keep_sections(raw_data: str, keys: typing.Set[str]) -> str:
+    """Blanks out the top level sections of a NestedText dictionary whose key is not in `keys`.
+
+    Blank lines are ignored by NestedText, so only the kept sections are parsed and line numbers in errors stay correct.
+    The text is returned as is if it has top level lines other than simple `key:` lines.
+    """
+    lines = raw_data.split("\n")
+    keep = True
+    for idx, line in enumerate(lines):
+        if line and not line[0].isspace() and line[0] != "#":
+            key, sep, rest = line.partition(":")
+            if not sep or rest.strip() or line[0] in "-:>[{":
+                return raw_data
+            keep = key in keys
+        if not keep:
+            lines[idx] = ""
+    return "\n".join(lines)
 
 
 class MVZFungler:
@@ -19,6 +61,9 @@ class MVZFungler:
         mapped_file: pathlib.Path,
         export_file: pathlib.Path,
         config: dict,
+        documents: typing.Optional[DocumentCache] = None,
+        pages: typing.Optional[PageCache] = None,
+        store: typing.Optional[MappingStore] = None,
     ) -> None:
         """Base class that implements MV Related classes.
 
@@ -38,6 +83,9 @@ class MVZFungler:
             mapped_file (pathlib.Path): The mapped file to write to.
             export_file (pathlib.Path): The export file to write to.
             config (dict): Configuration for the project
+            documents (typing.Optional[DocumentCache]): Parsed document cache shared by the project. Defaults to a private cache.
+            pages (typing.Optional[PageCache]): Decoded event page cache shared by the project. Defaults to None (Pages are always decoded).
+            store (typing.Optional[MappingStore]): Where mappings are kept. Defaults to files next to `mapped_file`.
         """
         self.original_file: pathlib.Path = original_file
         self.mapped_file: pathlib.Path = mapped_file
@@ -45,9 +93,42 @@ class MVZFungler:
         self.config = config
         self.game_type = self.config["General"].get("type", "MV")
         self.logger = logging.getLogger("DF|MVZ")
+        self.documents = documents if documents is not None else DocumentCache()
+        self.pages = pages
+        if store is None:
+            store = FileStore(
+                self.documents, self.config["General"].get("mapping_format", "json")
+            )
+        self.store = store
         self._cached_orig_data = None
+        self._command_decoder: typing.Optional[EventCommandDecoder] = None
+        # When set, nested exports are kept in `staged_export` instead of the export file. (See MVZHandler.run)
+        self.stage_exports = False
+        self.staged_export: typing.Any = None
+        # Event IDs (as mapping keys) to limit import and patch to. None for all. Only used when `scoped_events` is set.
+        self.event_filter: typing.Optional[typing.Set[str]] = None
+        # When set, xlsx exports go to a sheet of this project workbook instead of the export file. (See MVZHandler.export_workbook)
+        self.workbook: typing.Optional[XlsxStream] = None
+        # When set, xlsx imports read these {section: lines} of the project workbook instead of the export file. (See MVZHandler.import_workbook)
+        self.workbook_sections: typing.Optional[typing.Dict[str, typing.List[str]]] = None
+        # Set by imports that left part of the mapping alone. (A partial export or strings that failed to import)
+        self.partial_import = False
+        # When set, lines exports only hold the strings with these IDs. (See MVZHandler.export with `delta`)
+        self.export_ids: typing.Optional[typing.Set[str]] = None
 
     fungler_type = None
+    # Config sections the fungler reads. Used to tell which files a config change affects.
+    config_sections: typing.Tuple[str, ...] = ("General",)
+    # The fungler's mapping is keyed on event IDs and it honors `event_filter`.
+    scoped_events = False
+    # The fungler maps event command pages and implements `command_pages`, `mapped_page` and `set_mapped_page`.
+    indexed_commands = False
+    # The mapping is an event mapping that can be stored as an `EntryTable`. (See `MappingStore.write`)
+    compact_mapping = False
+    # The events of the mapping have pages (Maps) instead of a single list (CommonEvents).
+    paged_mapping = True
+    # Changes with the layout of the mapping. Mappings made with another layout are out of date.
+    mapping_version: typing.Optional[str] = None
     jp_rgx = re.compile(r"[一-龠]+|[ぁ-ゔ]+|[ァ-ヴー]+", flags=re.UNICODE)
 
     def apply_maps(self, patch_file: pathlib.Path) -> bool:
@@ -92,30 +173,25 @@ class MVZFungler:
     def export_excel(self, values: typing.Dict[str, typing.List[str]]) -> bool:
         """Exports the file to an Excel Sheet
 
+        Rows are streamed to the workbook (See `XlsxStream`). Each key of `values` gets its own sheet, unless
+        `workbook` is set: the file is then a single sheet of the project workbook, with the keys in a `Section` column.
+
         Args:
             values (typing.Dict[str, typing.List[str]]): A list of values to use
-
-        Raises:
-            ImportError: _description_
         """
-        if not pandas:
-            raise ImportError(
-                "export_excel needs `pandas` and `XlsxWriter` to be installed."
-            )
-        with pandas.ExcelWriter(
-            str(self.export_file),
-        ) as writer:
+        if self.workbook is not None:
+            sheet = self.workbook.add_sheet(self.export_file.stem)
+            sheet.write_row(["Section", *EXCEL_COLUMNS])
+            for section, list_values in values.items():
+                sheet.write_rows([section, value] for value in list_values)
+            self.workbook.close_sheet()
+            return True
+        with XlsxStream(self.export_file) as workbook:
             for sheet_name, list_values in values.items():
-                formatted = {
-                    "Original": list_values,
-                    "Inital": [""] * len(list_values),
-                    "Edited": [""] * len(list_values),
-                    "Final": [""] * len(list_values),
-                }
-
-                pandas.DataFrame.from_dict(formatted).to_excel(
-                    writer, sheet_name=sheet_name
-                )
+                sheet = workbook.add_sheet(sheet_name)
+                # An unnamed index column, then the text columns. (The layout of the old pandas exports)
+                sheet.write_row([None, *EXCEL_COLUMNS])
+                sheet.write_rows([idx, value] for idx, value in enumerate(list_values))
         return True
 
     def export_nested(
@@ -124,14 +200,28 @@ class MVZFungler:
             typing.Dict[typing.Any, typing.Any], typing.List[typing.Any]
         ],
     ) -> bool:
+        if self.stage_exports:
+            self.staged_export = value
+            return True
         self.export_file.write_text(nestedtext.dumps(value), encoding="utf-8")
         return True
 
     def import_nested(self, type_shed: typing.Type) -> typing.Optional[typing.Any]:
+        if self.stage_exports:
+            if not self.staged_export:
+                return False
+            if not isinstance(self.staged_export, type_shed):
+                self.logger.error(
+                    f"Unable to import staged export for file: {self.export_file.name}. Invalid Type Check"
+                )
+                return None
+            return self.staged_export
         try:
             raw_data = self.export_file.read_text("utf-8")
             if raw_data == "{}":
                 return False
+            if self.event_filter is not None:
+                raw_data = keep_sections(raw_data, self.event_filter)
             data = nestedtext.loads(raw_data)
             if not isinstance(data, type_shed):
                 self.logger.error(
@@ -147,25 +237,93 @@ class MVZFungler:
             )
             return None
 
+    def export_lines(self, value: typing.Dict[str, Section]) -> bool:
+        """Exports to the lines format. (See `RPGMVZLines`)"""
+        self.export_file.write_text(dump_lines(value), encoding="utf-8")
+        return True
+
+    def import_lines(self) -> typing.Optional[typing.Dict[str, Section]]:
+        try:
+            return load_lines(self.export_file.read_text("utf-8"))
+        except LinesError as e:
+            self.logger.error(f"Unable to import lines for file: {self.export_file.name}. {e}")
+            return None
+
+    def import_events(self, format: str) -> typing.Optional[typing.Dict[str, typing.List[typing.List[str]]]]:
+        """Reads an events export as event ID -> text lines of each entry.
+
+        Lines exports come grouped into entries already. The other formats are split on their `<>` lines.
+        Lines exports whose entries all have string IDs give `KeyedEntries` instead. (See `import_by_id`)
+        """
+        if format == "lines":
+            data = self.import_lines()
+            if not data:
+                return None
+            events = {}
+            for event_idx, entries in data.items():
+                if not isinstance(entries, list):
+                    self.logger.error(
+                        f"Unable to import lines for file: {self.export_file.name}. Event {event_idx} has fields."
+                    )
+                    return None
+                events[event_idx] = [lines for lines, _, _ in entries]
+            keyed = keyed_entries(data)
+            return events if keyed is None else keyed
+        if format == "nested":
+            data = self.import_nested(dict)
+        elif format == "xlsx":
+            data = self.import_excel(dict)
+        else:
+            raise Exception(f"Unknown format: {format}")
+        if not data:
+            return None
+        return {event_idx: split_entries(lines) for event_idx, lines in data.items()}
+
+    def import_by_id(self, mapping: EntryTable, keyed: typing.Dict[str, typing.List[str]]) -> bool:
+        """Sets the text of the mapping rows whose string ID is in `keyed`. Rows left out of the export keep their text.
+
+        Strings that do not fit (unknown ID, other line count) are reported by ID and skipped. The rest is still imported.
+        `partial_import` is set unless the export held every row of the mapping and all of them were imported.
+
+        Returns:
+            bool: False if nothing could be imported.
+        """
+        rows = {key: row for row, key in enumerate(mapping.ids(self.original_file.stem))}
+        failed = []
+        imported = 0
+        for key, text in keyed.items():
+            row = rows.get(key)
+            if row is None:
+                failed.append(f"{key} (Not in the mapping)")
+                continue
+            if self.event_filter is not None and str(mapping.event[row]) not in self.event_filter:
+                continue
+            if len(text) != mapping.text_count(row):
+                failed.append(f"{key} (Expecting {mapping.text_count(row)} lines. Got {len(text)})")
+                continue
+            mapping.set_text(row, text)
+            imported += 1
+        self.partial_import = bool(failed) or imported != len(rows)
+        if failed:
+            self.logger.error(
+                f"{len(failed)} strings of {self.export_file.name} were not imported: {', '.join(failed)}"
+            )
+        return imported > 0 or not failed
+
     def import_excel(self, type_shed: typing.Type) -> typing.Optional[typing.Any]:
-        if not pandas:
-            raise ImportError("import_excel needs `pandas` to be installed.")
-        data = {}
-        for sheet_name, data_frame in pandas.read_excel(
-            self.export_file, sheet_name=None
-        ).items():
-            data[sheet_name] = []
-            for idx, row in data_frame.iterrows():
-                text_value = None
-                if row["Final"]:
-                    text_value = row["Final"]
-                elif row["Edited"]:
-                    text_value = row["Final"]
-                elif row["Inital"]:
-                    text_value = row["Inital"]
-                elif row["Original"]:
-                    text_value = row["Original"]
-                data[sheet_name].append(text_value)
+        """Reads the sheets of the xlsx export (or `workbook_sections` when set) as {sheet name: lines}.
+
+        Each line is the last filled in column of its row. (Final, then Edited, Inital and Original)
+        """
+        if self.workbook_sections is not None:
+            data = self.workbook_sections
+        else:
+            data = {}
+            with XlsxReader(self.export_file) as workbook:
+                for sheet_name in workbook.sheets:
+                    data[sheet_name] = pick_texts(
+                        workbook.rows(sheet_name), EXCEL_COLUMNS[::-1]
+                    )[None]
         if not isinstance(data, type_shed):
             self.logger.error(
                 f"Unable to import xlsx for file: {self.export_file.name}. Invalid Type Check"
@@ -182,7 +340,7 @@ class MVZFungler:
         return True
 
     def read_mapped(
-        self, create: bool = False
+        self, create: bool = False, mutable: bool = False
     ) -> typing.Union[None, typing.Dict[str, typing.Any]]:
         """Reads the mapped file into a dictionary.
 
@@ -191,6 +349,7 @@ class MVZFungler:
         Args:
             type (str): The "type" to check against.
             create (bool, optional): _description_. Defaults to False.
+            mutable (bool, optional): The mapping will be modified. Returns a copy that is not shared with other readers. Defaults to False.
 
         Returns:
             _type_: _description_
@@ -198,8 +357,8 @@ class MVZFungler:
         if self.fungler_type is None:
             raise Exception(f"fungler_type is missing an inheritence.")
         # self.logger.info(self.mapped_file)
-        if self.mapped_file.exists():
-            mapping = orjson.loads(self.mapped_file.read_bytes())
+        if self.store.exists(self.mapped_file):
+            mapping = self.store.read_mapping(self.mapped_file, mutable=mutable)
             if self.type_check(self.mapped_file, mapping, self.fungler_type):
 
                 return mapping
@@ -210,178 +369,471 @@ class MVZFungler:
             if create:
                 return {"type": self.fungler_type}
 
-    def parse_page_lists(self, page_list_data: list):
-        """Processes MV/MZ Pages found in maps.json and CommonEvents.json
+    def read_table(self, mutable: bool = False) -> typing.Optional[EntryTable]:
+        """Reads an event mapping as an `EntryTable`. Works for both mapping formats.
 
         Args:
-            page_list_data (list): A list of pages
+            mutable (bool, optional): The table will be modified. Returns a table that is not shared with other readers. Defaults to False.
+        """
+        if not self.store.exists(self.mapped_file):
+            return None
+        table = self.store.read_table(self.mapped_file, self.paged_mapping, mutable=mutable)
+        if not self.type_check(self.mapped_file, table.header, self.fungler_type):
+            self.logger.error("Type Check failed")
+            return None
+        return table
+
+    def write_mapped(self, mapping: typing.Union[typing.Dict[str, typing.Any], EntryTable]):
+        """Writes the mapping to the store. With the file store, the written mapping is kept in the document cache."""
+        self.store.write(
+            self.mapped_file, mapping, compact=self.compact_mapping, paged=self.paged_mapping
+        )
+
+    def patch_operations(
+        self, mapping: typing.Dict[str, typing.Any], validate: bool = True
+    ) -> typing.Iterator[typing.Tuple[Path, typing.Any]]:
+        """Yields the writes needed to apply the mapping: (path in the original document, new value).
+
+        Args:
+            mapping (typing.Dict[str, typing.Any]): The mapping to apply.
+            validate (bool, optional): Skip (and warn about) values that would break the game. Defaults to True.
+        """
+        raise NotImplementedError()
+
+    def command_operations(
+        self, page_list: Path, text_data: typing.Dict[str, typing.Any], validate: bool = True
+    ) -> typing.Iterator[typing.Tuple[Path, typing.Any]]:
+        """Yields the writes for one mapped event command entry. (See `RPGMVZCommands`)
+
+        Args:
+            page_list (Path): Path of the page's command list in the original document.
+            text_data (typing.Dict[str, typing.Any]): The mapped entry.
+            validate (bool, optional): Skip (and warn about) values that would break the game. Defaults to True.
+        """
+        if text_data["type"] == "text":
+            for txt_idx, ptr in enumerate(text_data["pointer"]):
+                if txt_idx == 0 and "101code" in text_data["meta"]:
+                    yield page_list + (ptr, "parameters", 4), text_data["text"][txt_idx]
+                else:
+                    yield page_list + (ptr, "parameters", 0), text_data["text"][txt_idx]
+        elif text_data["type"] == "text_name_change":
+            ptr = text_data["pointer"][0]
+            yield page_list + (ptr, "parameters", 1), text_data["text"][0]
+        elif text_data["type"] == "text_choice":
+            # For Code 402. Note for MZ that this for loop should not execute since the list is empty.
+            for txt_idx, ptr in enumerate(text_data["pointer"][1:]):
+                yield page_list + (ptr, "parameters", 1), text_data["text"][txt_idx]
+            # Write back to code 102
+            yield page_list + (text_data["pointer"][0], "parameters", 0), text_data["text"]
+        # D_TEXT
+        elif text_data["type"] == "d_text":
+            d_pointer = text_data["pointer"][0]
+            formatted = text_data["meta"].format(DTEXT=text_data["text"][0])
+            yield page_list + (d_pointer, "parameters", 0), formatted
+        elif text_data["type"] == "c12_text":
+            if validate:
+                for rgx_match in re.finditer("'", text_data["text"][0]):
+                    if text_data["text"][0][rgx_match.start() - 1] != "\\":
+                        self.logger.warning(
+                            f"\"{text_data['text'][0]}\" does not have an escape sequence for >'<. Refusing to use it. File name: {self.original_file.name}"
+                        )
+                        return
+            # The script is the last parameter of a code 122 script operand.
+            yield page_list + (text_data["pointer"][0], "parameters", 4), f"'{text_data['text'][0]}'"
+        elif text_data["type"] == "plugin_arg":
+            ptr = text_data["pointer"][0]
+            yield page_list + (ptr, "parameters", 3, text_data["meta"]), text_data["text"][0]
+
+    @property
+    def spans_file(self) -> pathlib.Path:
+        return self.mapped_file.with_suffix(".spans")
+
+    def load_spans(
+        self, raw: bytes, paths: typing.List[Path], digest: typing.Optional[str] = None
+    ) -> typing.Optional[typing.Dict[Path, typing.Tuple[int, int]]]:
+        """Gets the byte offsets of `paths` in the original file.
+
+        Offsets are kept in a `.spans` file next to the mapping and reused while the original file is unchanged.
 
         Returns:
-            _type_: _description_
+            typing.Optional[typing.Dict[Path, typing.Tuple[int, int]]]: None if a path could not be found.
         """
-        page_list_events = []
-        t_pages = len(page_list_data)
-        do_dtext = self.config.get("Events", {}).get("dtext", False)
-        dtext_rgx = re.compile(r"D_TEXT (.+) (\d+)")
-        dtext_rgx_fallback = re.compile(r"D_TEXT (.+)")
-
-        var_122 = self.config.get("Events", {}).get("code_122", None)
-        auto_var_122 = self.config.get("Events", {}).get("auto_code_122", None)
-        tile_name_pop = self.config.get("Events", {}).get("tile_name_pop", None)
-        if var_122 is None or auto_var_122 is None:
-            raise Exception("code_122/auto_code_122 is missing.")
-
-        def process_code356(base_i):
-            event = page_list_data[base_i]
-            if do_dtext:
-                if len(event["parameters"]) > 1:
-                    return
-                event_param = event["parameters"][0]
-                d_text_check = event_param.startswith(
-                    "D_TEXT"
-                ) and not event_param.startswith("D_TEXT_SETTING")
-                if not d_text_check:
-                    return
-                if event_param.strip() == "D_TEXT":
-                    return
-                dtext_param = event["parameters"][0]
-                fi = dtext_rgx.findall(dtext_param)
-                fallback = False
-                if not fi:
-                    fi = dtext_rgx_fallback.findall(dtext_param)
-                    if isinstance(fi[0], str):
-                        fi = [[fi[0], "_"]]
-                    fallback = True
-                if not fi:
-                    self.logger.info("Regex failed to match DText.")
-                    return
-                    # raise Exception("Regex failed to match DText.")
-                
-                text_data = {
-                    "type": "d_text",
-                    "text": [fi[0][0]],
-                    "pointer": [base_i],
-                    "meta": dtext_rgx.sub(f"D_TEXT {{DTEXT}} {fi[0][1]}", dtext_param),
+        if digest is None:
+            digest = content_hash(raw)
+        spans: typing.Dict[Path, typing.Tuple[int, int]] = {}
+        if self.spans_file.exists():
+            stored = orjson.loads(self.spans_file.read_bytes())
+            if stored.get("hash") == digest:
+                spans = {
+                    tuple(path): tuple(span) for path, span in stored["spans"]
                 }
-                if fallback:
-                    text_data["meta"] = f"D_TEXT {{DTEXT}}"
-                page_list_events.append(text_data)
+        if any(path not in spans for path in paths):
+            try:
+                spans.update(find_spans(raw, paths))
+            except ValueError as e:
+                self.logger.warning(f"Unable to scan {self.original_file.name}: {e}")
+                return None
+            if any(path not in spans for path in paths):
+                return None
+            self.spans_file.write_bytes(
+                orjson.dumps(
+                    {"hash": digest, "spans": [[path, span] for path, span in spans.items()]}
+                )
+            )
+        return spans
 
-        def process_code122(base_i):
-            if not var_122 and not auto_var_122:
+    def record_spans(self, mapping: typing.Union[typing.Dict[str, typing.Any], EntryTable]):
+        """Records the byte offsets of every value the mapping translates. Called after mapping."""
+        paths = [path for path, _ in self.patch_operations(mapping, validate=False)]
+        self.load_spans(self.original_file.read_bytes(), paths)
+
+    @property
+    def plan_file(self) -> pathlib.Path:
+        return self.mapped_file.with_suffix(".plan")
+
+    def load_plan(self, original: str, mapping: typing.Optional[str]) -> typing.Optional[PatchPlan]:
+        """The compiled plan, if it was compiled from this original and mapping."""
+        if mapping is None or not self.plan_file.exists():
+            return None
+        try:
+            plan = PatchPlan.from_bytes(self.plan_file.read_bytes())
+        except ValueError:
+            return None
+        return plan if plan.matches(original, mapping) else None
+
+    def compile_plan(
+        self,
+        raw: bytes,
+        operations: typing.Iterable[typing.Tuple[Path, typing.Any]],
+        mapping: typing.Optional[str] = None,
+    ) -> typing.Optional[PatchPlan]:
+        """Resolves the writes to byte offsets in `raw` and encodes their values.
+
+        Returns:
+            typing.Optional[PatchPlan]: None if a value could not be located.
+        """
+        # Later writes to the same path win.
+        values = dict(operations)
+        original = content_hash(raw)
+        spans = self.load_spans(raw, list(values), digest=original)
+        if spans is None:
+            return None
+        return PatchPlan.compile(
+            original,
+            mapping,
+            [(*spans[path], orjson.dumps(value)) for path, value in values.items()],
+        )
+
+    def write_patched(
+        self,
+        patch_file: pathlib.Path,
+        operations: typing.Iterable[typing.Tuple[Path, typing.Any]],
+        mapping: typing.Optional[str] = None,
+    ):
+        """Writes the patched file by splicing the new values into the original bytes.
+
+        Only the replaced values change. Everything else, including the original formatting, is kept as is.
+        With an `event_filter` the values are spliced into the existing patched file instead, so other events keep their patches.
+        Falls back to patching the parsed document if the values cannot be located.
+
+        Args:
+            patch_file (pathlib.Path): Where to write the patched file.
+            operations (typing.Iterable[typing.Tuple[Path, typing.Any]]): The writes. (See `patch_operations`)
+            mapping (typing.Optional[str], optional): Digest of the mapping the writes come from. If given, the compiled plan is saved for `apply_plan`.
+        """
+        # Later writes to the same path win.
+        values = dict(operations)
+        if self.event_filter is not None and patch_file.exists():
+            raw = patch_file.read_bytes()
+            try:
+                spans = find_spans(raw, list(values))
+            except ValueError:
+                spans = {}
+            if all(path in spans for path in values):
+                patch_file.write_bytes(
+                    splice(
+                        raw,
+                        [(*spans[path], orjson.dumps(value)) for path, value in values.items()],
+                    )
+                )
                 return
-            event = page_list_data[base_i]
-
-            # Sanity check
-            if (
-                event["parameters"][0] != event["parameters"][1]
-                or not event["parameters"][0] in var_122
-            ):
-                if not auto_var_122:
-                    # print("not autovar")
-                    return
-            # String sanity check
-            string_param = event["parameters"][-1]
-            
-            if isinstance(string_param, str):
-                if self.jp_rgx.search(string_param):
-                    text_data = {
-                        "type": "c12_text",
-                        "text": [event["parameters"][-1].strip("'")],
-                        "pointer": [base_i],
-                    }
-                    page_list_events.append(text_data)
-            else:
+            load_document = lambda: orjson.loads(raw)
+        else:
+            raw = self.original_file.read_bytes()
+            plan = self.compile_plan(raw, values.items(), mapping)
+            if plan is not None:
+                if mapping is not None and self.event_filter is None:
+                    self.plan_file.write_bytes(plan.to_bytes())
+                patch_file.write_bytes(plan.execute(raw))
                 return
+            load_document = self.checkout_original
+        self.logger.warning(
+            f"Falling back to re-encoding {self.original_file.name}."
+        )
+        document = load_document()
+        for path, value in values.items():
+            set_path(document, path, value)
+        patch_file.write_bytes(orjson.dumps(document))
+
+    def apply_plan(
+        self,
+        patch_file: pathlib.Path,
+        read_mapping: typing.Callable[[], typing.Any],
+    ):
+        """Patches the original file with the mapping's compiled plan. (`.plan` next to the mapping)
+
+        The plan is reused while both the original file and the mapping are unchanged, so neither is parsed.
+        Otherwise the mapping is read with `read_mapping` and compiled again. The checks of `patch_operations`
+        (e.g. the c12 escapes) only run then. Scoped patches (`event_filter`) are never planned.
+        """
+        mapping = None
+        if self.event_filter is None:
+            raw = self.original_file.read_bytes()
+            mapping = self.store.digest(self.mapped_file)
+            plan = self.load_plan(content_hash(raw), mapping)
+            if plan is not None:
+                patch_file.write_bytes(plan.execute(raw))
+                return
+        data = read_mapping()
+        if data is None:
+            raise Exception("Mapping missing?")
+        self.write_patched(patch_file, self.patch_operations(data), mapping=mapping)
 
-        def process_code320(base_i):
-            event = page_list_data[base_i]
-            if isinstance(event["parameters"][1], str):
-                text_data = {
-                    "type": "text_name_change",
-                    "text": [event["parameters"][1]],
-                    "pointer": [base_i],
-                    "meta": "",
-                }
-                page_list_events.append(text_data)
-
-        def process_code101(base_i):
-            pointer = base_i + 1
-            nx_event = page_list_data[pointer]
-            if self.game_type == "MZ":
-                # MZ has an additional param to code 101, which stores the character name.
-                params101 = page_list_data[base_i]["parameters"]
-                if len(params101) == 5:
-                    chara_name = params101[4]
-                    text_data = {
-                        "type": "text",
-                        "text": [
-                            chara_name,
-                        ],
-                        "pointer": [base_i],
-                        "meta": "101code",
-                    }
-                else:
-                    text_data = {"type": "text", "text": [], "pointer": [], "meta": ""}
-            else:
-                text_data = {"type": "text", "text": [], "pointer": [], "meta": ""}
-            nx_code = nx_event["code"]
-            while nx_code == 401:
-                text_data["text"].append(nx_event["parameters"][0])
-                text_data["pointer"].append(pointer)
-                # text_data.append([pointer, ])
-                pointer += 1
-                nx_event = page_list_data[pointer]
-                nx_code = nx_event["code"]
-            page_list_events.append(text_data)
-
-        def process_code102(base_i):
-            link_words = page_data["parameters"][0]
-            text_data = {"type": "text_choice", "text": [], "pointer": []}
-            if self.game_type == "MZ":
-                # MZ appears to no need processing for 102 codes...
-                bse_event = page_list_data[base_i]
-                text_data["text"] = bse_event["parameters"][0]
-                text_data["pointer"] = [base_i]
-                page_list_events.append(text_data)
-            else:
+    def text_units(self) -> typing.Optional[typing.List[str]]:
+        """The translatable strings of the mapping, in mapping order. One per entry (lines joined with a line break) or field.
+
+        Returns:
+            typing.Optional[typing.List[str]]: None if there is no mapping or the fungler does not list its strings.
+        """
+        return None
+
+    @property
+    def features_file(self) -> pathlib.Path:
+        return self.mapped_file.with_suffix(".features")
+
+    def read_features(self) -> typing.Optional[TextFeatures]:
+        """The text features of `text_units`, if they were computed from the current mapping. (See `MVZHandler.analyze_text`)"""
+        if not self.features_file.exists():
+            return None
+        try:
+            features = TextFeatures.from_bytes(self.features_file.read_bytes())
+        except ValueError:
+            return None
+        digest = self.store.digest(self.mapped_file)
+        if digest is None or features.digest != digest:
+            return None
+        return features
+
+    def write_features(self, features: TextFeatures):
+        features.digest = self.store.digest(self.mapped_file)
+        self.features_file.write_bytes(features.to_bytes())
+
+    def string_units(self) -> typing.Optional[typing.Dict[str, str]]:
+        """The translatable strings of the mapping by string ID. (See `string_id`)
+
+        Returns:
+            typing.Optional[typing.Dict[str, str]]: None if there is no mapping or the fungler does not give its strings IDs.
+        """
+        return None
+
+    def set_units(self, units: typing.Dict[str, str]) -> int:
+        """Sets the text of the strings in `units` by string ID. Entries only take a text with as many lines as they have.
+
+        Returns:
+            int: How many strings were set.
+        """
+        return 0
 
-                pointer = base_i + 1
-                nx_event = page_list_data[pointer]
-                nx_code = nx_event["code"]
-                text_data["pointer"].append(base_i)
-                while len(link_words) > 0 and pointer < t_pages:
-                    if nx_code == 402 and nx_event["parameters"][1] == link_words[0]:
-                        text_data["text"].append(nx_event["parameters"][1])
-                        text_data["pointer"].append(pointer)
-                        link_words.pop(0)
-                    pointer += 1
-                    if pointer > t_pages:
-                        break
-                    nx_event = page_list_data[pointer]
-                    nx_code = nx_event["code"]
-                if len(link_words) > 0:
-                    self.logger.warning(f"trailing link_words. Report to Github.")
-                page_list_events.append(text_data)
-
-        for t_idx in range(t_pages):
-            page_data = page_list_data[t_idx]
-            if page_data["code"] == 101:
-                process_code101(t_idx)
-            elif page_data["code"] == 102:
-                process_code102(t_idx)
-            elif page_data["code"] == 356:
-                process_code356(t_idx)
-            elif page_data["code"] == 122:
-                process_code122(t_idx)
-            elif page_data["code"] == 320:
-                process_code320(t_idx)
-        return page_list_events
+    def keep_translations(
+        self,
+        units: typing.Dict[str, str],
+        sources: typing.Optional[typing.Dict[str, str]] = None,
+    ) -> int:
+        """Puts the text a mapping had before it was remapped (`string_units` of the old mapping) back into the new one.
+
+        Args:
+            units (typing.Dict[str, str]): The strings of the old mapping.
+            sources (typing.Optional[typing.Dict[str, str]]): The source text recorded for the old mapping.
+                Only strings whose source text is unchanged are kept. None keeps every string that still exists.
+
+        Returns:
+            int: How many strings were kept.
+        """
+        current = self.string_units()
+        if not current:
+            return 0
+        return self.set_units(
+            {
+                key: text
+                for key, text in units.items()
+                if key in current
+                and current[key] != text
+                and (sources is None or sources.get(key) == current[key])
+            }
+        )
+
+    def mapping_outdated(self) -> bool:
+        """Whether the existing mapping is in a layout the fungler no longer writes. Checked for mappings without build state."""
+        return False
+
+    @property
+    def sources_file(self) -> pathlib.Path:
+        return self.mapped_file.with_suffix(".sources")
+
+    @property
+    def exported_file(self) -> pathlib.Path:
+        return self.mapped_file.with_suffix(".exported")
+
+    def read_sources(self) -> typing.Optional[typing.Dict[str, str]]:
+        """The source text of every string as it was mapped. None if it was mapped before sources were recorded."""
+        if not self.sources_file.exists():
+            return None
+        return orjson.loads(self.sources_file.read_bytes())
+
+    def record_sources(self, keep: bool = False):
+        """Records the text of every string of a freshly made mapping as its source text. Called after mapping.
+
+        With `keep`, strings that already have a source keep it. (Refreshed mappings keep their translated entries)
+        """
+        units = self.string_units()
+        if units is None:
+            return
+        if keep:
+            sources = self.read_sources() or {}
+            units = {key: sources.get(key, text) for key, text in units.items()}
+        self.sources_file.write_bytes(orjson.dumps(units))
+
+    def record_export(self):
+        """Remembers the source text of every string as exported. Later delta exports hold only what changed since."""
+        sources = self.read_sources()
+        if sources is None:
+            return
+        self.exported_file.write_bytes(
+            orjson.dumps({key: content_hash(text.encode("utf-8")) for key, text in sources.items()})
+        )
+
+    def delta_ids(self) -> typing.Optional[typing.Set[str]]:
+        """The IDs of the strings whose source text is new or changed since the last export.
+
+        Returns:
+            typing.Optional[typing.Set[str]]: None if no source text was recorded for the mapping.
+        """
+        sources = self.read_sources()
+        if sources is None:
+            return None
+        exported = {}
+        if self.exported_file.exists():
+            exported = orjson.loads(self.exported_file.read_bytes())
+        return {
+            key
+            for key, text in sources.items()
+            if exported.get(key) != content_hash(text.encode("utf-8"))
+        }
+
+    @property
+    def command_decoder(self) -> EventCommandDecoder:
+        if self._command_decoder is None:
+            self._command_decoder = get_decoder(self.config)
+        return self._command_decoder
+
+    def parse_page_lists(self, page_list_data: list):
+        """Processes MV/MZ Pages found in maps.json and CommonEvents.json
+
+        The commands are decoded by the handlers registered in `RPGMVZCommands`.
+        With a page cache, identical pages are only decoded once. (See `PageCache`)
+
+        Args:
+            page_list_data (list): A list of pages
+
+        Returns:
+            typing.List[typing.Dict[str, typing.Any]]: The text entries of the page.
+        """
+        if self.pages is None:
+            return self.command_decoder.decode(page_list_data)
+        return self.pages.decode(self.command_decoder, page_list_data)
+
+    def command_pages(self) -> typing.Iterator[typing.Tuple[int, int, list]]:
+        """Yields (event id, page index, command list) for every page that is mapped."""
+        raise NotImplementedError()
+
+    def mapped_page(
+        self, mapping: typing.Dict[str, typing.Any], event_id: int, page_id: int
+    ) -> typing.List[typing.Dict[str, typing.Any]]:
+        """The mapped entries of a page. Empty if the page has none."""
+        raise NotImplementedError()
+
+    def set_mapped_page(
+        self,
+        mapping: typing.Dict[str, typing.Any],
+        event_id: int,
+        page_id: int,
+        entries: typing.List[typing.Dict[str, typing.Any]],
+    ):
+        """Replaces the mapped entries of a page. Events and pages are kept in game order."""
+        raise NotImplementedError()
+
+    def locate_commands(
+        self, codes: typing.FrozenSet[int]
+    ) -> typing.Dict[str, typing.List[int]]:
+        """Finds the given command codes.
+
+        Returns:
+            typing.Dict[str, typing.List[int]]: Code -> `[event, page, offset, event, page, offset, ...]`
+        """
+        located: typing.Dict[str, typing.List[int]] = {}
+        for event_id, page_id, page_list in self.command_pages():
+            page_codes = [command["code"] for command in page_list]
+            if codes.isdisjoint(page_codes):
+                continue
+            for offset, code in enumerate(page_codes):
+                if code in codes:
+                    located.setdefault(str(code), []).extend((event_id, page_id, offset))
+        return located
+
+    def refresh_commands(self, pages: typing.Set[typing.Tuple[int, int]]) -> bool:
+        """Decodes the given pages again and merges them into the existing mapping.
+
+        Entries that are still extracted keep their (possibly translated) text. They are matched on type and pointers.
+
+        Args:
+            pages (typing.Set[typing.Tuple[int, int]]): (event id, page index) pairs to decode.
+
+        Returns:
+            bool: False if there is no mapping to merge into.
+        """
+        mapping = self.read_mapped(mutable=True)
+        if not mapping:
+            return False
+        for event_id, page_id, page_list in self.command_pages():
+            if (event_id, page_id) not in pages:
+                continue
+            existing: typing.Dict[tuple, typing.List[typing.Dict[str, typing.Any]]] = {}
+            for entry in self.mapped_page(mapping, event_id, page_id):
+                existing.setdefault((entry["type"], *entry["pointer"]), []).append(entry)
+            entries = []
+            for entry in self.parse_page_lists(page_list):
+                kept = existing.get((entry["type"], *entry["pointer"]))
+                entries.append(kept.pop(0) if kept else entry)
+            self.set_mapped_page(mapping, event_id, page_id, entries)
+        self.write_mapped(mapping)
+        self.record_spans(mapping)
+        return True
 
     @property
     def original_data(
         self,
     ) -> typing.Union[typing.Dict[str, typing.Any], typing.List[typing.Any]]:
-        if not self._cached_orig_data:
-            self._cached_orig_data = orjson.loads(self.original_file.read_bytes())
+        """The parsed original file. Shared through the document cache, do not modify it."""
+        if self._cached_orig_data is None:
+            self._cached_orig_data = self.documents.get(self.original_file)
         return self._cached_orig_data
+
+    def checkout_original(
+        self,
+    ) -> typing.Union[typing.Dict[str, typing.Any], typing.List[typing.Any]]:
+        """The parsed original file for patching in place.
+
+        The document is taken out of the document cache so the patched copy is never read as the original.
+        """
+        self._cached_orig_data = None
+        return self.documents.take(self.original_file)
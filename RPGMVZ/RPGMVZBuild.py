@@ -0,0 +1,162 @@
+import logging
+import pathlib
+import typing
+
+import orjson
+
+from .RPGMVZManifest import content_hash
+
+
+def config_digest(config: dict, sections: typing.Iterable[str]) -> str:
+    """Hash of the config sections a fungler depends on."""
+    return content_hash(
+        orjson.dumps(
+            {section: config.get(section, {}) for section in sections},
+            option=orjson.OPT_SORT_KEYS,
+        )
+    )
+
+
+class BuildGraph:
+    version = 1
+
+    def __init__(self, graph_file: pathlib.Path, root: pathlib.Path) -> None:
+        """Records the inputs each stage last ran with for every data file.
+
+        A stage only needs to run again for a file when the hashes of its inputs
+        (original json, mapping, export, config sections) differ from the recorded ones.
+
+        Args:
+            graph_file (pathlib.Path): Where the graph is stored. Typically `tl_workspace/build.json`
+            root (pathlib.Path): The project folder. Paths are stored relative to it.
+        """
+        self.graph_file = graph_file
+        self.root = root
+        self.logger = logging.getLogger("DF|Build")
+        self.states: typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]] = {}
+        self.digests: typing.Dict[str, typing.List[typing.Any]] = {}
+        self._changed: typing.Set[typing.Tuple[str, str]] = set()
+        self._changed_digests: typing.Set[str] = set()
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not self.graph_file.exists():
+            return
+        try:
+            data = orjson.loads(self.graph_file.read_bytes())
+        except orjson.JSONDecodeError:
+            self.logger.warning("Build graph is corrupted. Everything will be rebuilt.")
+            return
+        if data.get("version") != self.version:
+            return
+        self.states = data.get("states", {})
+        self.digests = data.get("digests", {})
+
+    def save(self):
+        if not self._dirty:
+            return
+        if not self.graph_file.parent.exists():
+            self.graph_file.parent.mkdir(parents=True, exist_ok=True)
+        self.graph_file.write_bytes(
+            orjson.dumps(
+                {"version": self.version, "states": self.states, "digests": self.digests},
+                option=orjson.OPT_INDENT_2,
+            )
+        )
+        self._dirty = False
+
+    def _key(self, path: pathlib.Path) -> str:
+        try:
+            return path.resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return path.resolve().as_posix()
+
+    def digest(self, path: pathlib.Path) -> typing.Optional[str]:
+        """Content hash of a project file. None if it does not exist.
+
+        The hash is cached against the file's size and mtime.
+        """
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        key = self._key(path)
+        cached = self.digests.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = content_hash(path.read_bytes())
+        self.digests[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        self._changed_digests.add(key)
+        self._dirty = True
+        return digest
+
+    def has_state(self, stage: str, rel: str) -> bool:
+        return rel in self.states.get(stage, {})
+
+    def is_current(
+        self,
+        stage: str,
+        rel: str,
+        inputs: typing.Dict[str, typing.Any],
+        output: pathlib.Path,
+        check_output: bool = False,
+    ) -> bool:
+        """Checks if a stage's output for a file was built from the same inputs.
+
+        Args:
+            stage (str): The stage name.
+            rel (str): The data file, relative to the game's data folder.
+            inputs (typing.Dict[str, typing.Any]): The current input hashes.
+            output (pathlib.Path): The file the stage writes.
+            check_output (bool, optional): Also require the output to be unmodified since it was built. Defaults to False.
+
+        Returns:
+            bool: True if the stage can be skipped.
+        """
+        state = self.states.get(stage, {}).get(rel)
+        if not state or state["inputs"] != inputs:
+            return False
+        if check_output:
+            return self.digest(output) == state["output"]
+        return output.exists() == (state["output"] is not None)
+
+    def output_unchanged(self, stage: str, rel: str, output: pathlib.Path) -> bool:
+        """Whether a stage's output for a file is still the file it wrote, whatever its inputs were."""
+        state = self.states.get(stage, {}).get(rel)
+        return bool(state) and state["output"] is not None and self.digest(output) == state["output"]
+
+    def mark(
+        self,
+        stage: str,
+        rel: str,
+        inputs: typing.Dict[str, typing.Any],
+        output: pathlib.Path,
+    ):
+        """Records that a stage was built for a file."""
+        self.states.setdefault(stage, {})[rel] = {
+            "inputs": inputs,
+            "output": self.digest(output),
+        }
+        self._changed.add((stage, rel))
+        self._dirty = True
+
+    def pop_changes(self) -> typing.Dict[str, typing.Any]:
+        """Returns and clears the changes since the last call. Used to send worker updates to the parent."""
+        changes = {
+            "states": [
+                [stage, rel, self.states[stage][rel]] for stage, rel in self._changed
+            ],
+            "digests": {key: self.digests[key] for key in self._changed_digests},
+        }
+        self._changed = set()
+        self._changed_digests = set()
+        return changes
+
+    def update(self, changes: typing.Dict[str, typing.Any]):
+        if not changes["states"] and not changes["digests"]:
+            return
+        for stage, rel, state in changes["states"]:
+            self.states.setdefault(stage, {})[rel] = state
+        self.digests.update(changes["digests"])
+        self._dirty = True
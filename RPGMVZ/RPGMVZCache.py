@@ -0,0 +1,140 @@
+import collections
+import logging
+import pathlib
+import threading
+import typing
+
+import orjson
+
+
+class DocumentCache:
+    def __init__(self, budget: int = 256 * 1024 * 1024) -> None:
+        """Project level cache of parsed json documents with LRU eviction.
+
+        Documents are keyed on their path and are reparsed when the file's size or mtime changes.
+
+        `get` returns a shared document that must not be modified.
+        `take` hands the document over to the caller (It is removed from the cache), so it can be modified in place.
+
+        The cache can be shared between threads.
+
+        Args:
+            budget (int, optional): Approximate memory budget, measured on the size of the source files. Defaults to 256MB.
+        """
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger("DF|Cache")
+        self._docs: typing.OrderedDict[
+            typing.Tuple[str, str], typing.Tuple[typing.Tuple[int, int], int, typing.Any]
+        ] = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        # Don't ship parsed documents to worker processes.
+        state = self.__dict__.copy()
+        state["_docs"] = collections.OrderedDict()
+        state["size"] = 0
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _stamp(path: pathlib.Path) -> typing.Tuple[int, int]:
+        stat = path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def _lookup(self, key: typing.Tuple[str, str], stamp: typing.Tuple[int, int]):
+        cached = self._docs.get(key)
+        if cached is None:
+            return None
+        if cached[0] != stamp:
+            self._drop(key)
+            return None
+        return cached
+
+    def _drop(self, key: typing.Tuple[str, str]):
+        cached = self._docs.pop(key, None)
+        if cached:
+            self.size -= cached[1]
+        return cached
+
+    def get(
+        self,
+        path: pathlib.Path,
+        loader: typing.Callable[[bytes], typing.Any] = orjson.loads,
+        variant: str = "",
+    ) -> typing.Any:
+        """Returns the parsed document. The result is shared and must be treated as read only.
+
+        Args:
+            path (pathlib.Path): The json file.
+            loader (typing.Callable[[bytes], typing.Any], optional): Parses the raw bytes. Defaults to orjson.loads.
+            variant (str, optional): Cache key for documents loaded with a different loader. Defaults to "".
+        """
+        key = (str(path), variant)
+        stamp = self._stamp(path)
+        with self._lock:
+            cached = self._lookup(key, stamp)
+            if cached is not None:
+                self.hits += 1
+                self._docs.move_to_end(key)
+                return cached[2]
+            self.misses += 1
+        raw = path.read_bytes()
+        document = loader(raw)
+        self.put(path, document, len(raw), variant=variant, stamp=stamp)
+        return document
+
+    def take(
+        self,
+        path: pathlib.Path,
+        loader: typing.Callable[[bytes], typing.Any] = orjson.loads,
+        variant: str = "",
+    ) -> typing.Any:
+        """Returns the parsed document for modification.
+
+        The document is removed from the cache so the modified copy is never handed out to other readers.
+        """
+        key = (str(path), variant)
+        stamp = self._stamp(path)
+        with self._lock:
+            cached = self._lookup(key, stamp)
+            if cached is not None:
+                self.hits += 1
+                self._drop(key)
+                return cached[2]
+            self.misses += 1
+        return loader(path.read_bytes())
+
+    def put(
+        self,
+        path: pathlib.Path,
+        document: typing.Any,
+        cost: int,
+        variant: str = "",
+        stamp: typing.Optional[typing.Tuple[int, int]] = None,
+    ):
+        """Stores a document that was parsed (or written) elsewhere."""
+        if cost > self.budget:
+            return
+        key = (str(path), variant)
+        if stamp is None:
+            stamp = self._stamp(path)
+        with self._lock:
+            self._drop(key)
+            self._docs[key] = (stamp, cost, document)
+            self.size += cost
+            while self.size > self.budget and self._docs:
+                _, evicted = self._docs.popitem(last=False)
+                self.size -= evicted[1]
+
+    def discard(self, path: pathlib.Path):
+        """Drops every cached variant of a file."""
+        with self._lock:
+            for key in [key for key in self._docs if key[0] == str(path)]:
+                self._drop(key)
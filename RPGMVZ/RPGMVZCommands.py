@@ -0,0 +1,381 @@
+import logging
+import operator
+import re
+import typing
+
+import orjson
+
+Entry = typing.Dict[str, typing.Any]
+Handler = typing.Callable[["EventCommandDecoder", list, int, typing.List[Entry]], None]
+
+# Event command code -> handler. Handlers are bound to a decoder, which holds the precompiled config they need.
+command_handlers: typing.Dict[int, Handler] = {}
+# Predicates deciding if a code is decoded for a project. Codes without one are always decoded.
+command_enabled: typing.Dict[int, typing.Callable[["EventCommandDecoder"], bool]] = {}
+# `[Events]` keys that change what a code decodes to.
+command_config: typing.Dict[int, typing.Tuple[str, ...]] = {}
+
+
+def command(
+    code: int,
+    enabled: typing.Optional[typing.Callable[["EventCommandDecoder"], bool]] = None,
+    config: typing.Tuple[str, ...] = (),
+):
+    """Registers a handler for an event command code.
+
+    The handler is called as `handler(decoder, page_list, index, entries)` and appends the text entries it finds to `entries`.
+
+    Args:
+        code (int): The event command code.
+        enabled (typing.Optional[typing.Callable[[EventCommandDecoder], bool]], optional): Decides from the decoder's config if the code is decoded at all. Defaults to None (always).
+        config (typing.Tuple[str, ...], optional): The `[Events]` keys the handler (or `enabled`) reads. Defaults to ().
+    """
+
+    def register(handler: Handler) -> Handler:
+        command_handlers[code] = handler
+        if enabled is not None:
+            command_enabled[code] = enabled
+        if config:
+            command_config[code] = config
+        return handler
+
+    return register
+
+
+jp_rgx = re.compile(r"[一-龠]+|[ぁ-ゔ]+|[ァ-ヴー]+", flags=re.UNICODE)
+dtext_rgx = re.compile(r"D_TEXT (.+) (\d+)")
+dtext_rgx_fallback = re.compile(r"D_TEXT (.+)")
+_code = operator.itemgetter("code")
+_choice_codes = frozenset((102, 402, 403, 404))
+
+
+def choice_branches(page_list: list) -> typing.Dict[int, typing.List[int]]:
+    """Pairs every Show Choices (102) of a page with its When [choice] branches (402), in one pass.
+
+    A 102 shares its indent with its 402/403 branches and the closing 404. The commands inside a branch are one level deeper,
+    so a stack of the open 102s tells nested menus apart without comparing choice text.
+
+    Returns:
+        typing.Dict[int, typing.List[int]]: Index of each 102 -> indexes of its 402s, in page order.
+    """
+    branches: typing.Dict[int, typing.List[int]] = {}
+    # (indent, index) of the open 102s, innermost last.
+    stack: typing.List[typing.Tuple[int, int]] = []
+    for idx, event in enumerate(page_list):
+        code = event["code"]
+        if code not in _choice_codes:
+            continue
+        indent = event.get("indent", 0)
+        # Menus left open (no 404) end with the first choice command at their indent or above.
+        while stack and (stack[-1][0] > indent or (code == 102 and stack[-1][0] == indent)):
+            stack.pop()
+        if code == 102:
+            branches[idx] = []
+            stack.append((indent, idx))
+        elif stack and stack[-1][0] == indent:
+            if code == 402:
+                branches[stack[-1][1]].append(idx)
+            elif code == 404:
+                stack.pop()
+    return branches
+
+
+class EventCommandDecoder:
+    def __init__(self, config: dict) -> None:
+        """Extracts text entries from event command lists (Map, CommonEvents and Troop pages).
+
+        The config is read once and the dispatch table only holds the codes that are enabled for the project.
+
+        Args:
+            config (dict): Configuration for the project
+        """
+        events = config.get("Events", {})
+        self.game_type = config["General"].get("type", "MV")
+        self.logger = logging.getLogger("DF|MVZ")
+        self.dtext = events.get("dtext", False)
+        self.var_122 = events.get("code_122", None)
+        self.auto_var_122 = events.get("auto_code_122", None)
+        if self.var_122 is None or self.auto_var_122 is None:
+            raise Exception("code_122/auto_code_122 is missing.")
+        self.black_122 = set(events.get("black_code_122", []))
+        # Off unless set, so configs written before it existed keep their mappings (and positional exports) as they were.
+        self.scroll_text = events.get("scroll_text", False)
+        self.comments = events.get("comments", False)
+        # "Plugin:Command:argument" -> translated
+        self.plugin_args: typing.Dict[typing.Tuple[str, str], typing.List[str]] = {}
+        for plugin_arg in events.get("plugin_command_args", []):
+            plugin, plugin_command, arg = plugin_arg.split(":", 2)
+            self.plugin_args.setdefault((plugin, plugin_command), []).append(arg)
+
+        self.dispatch: typing.Dict[int, Handler] = {
+            code: handler
+            for code, handler in command_handlers.items()
+            if code not in command_enabled or command_enabled[code](self)
+        }
+        self.codes = frozenset(self.dispatch)
+        self.key = decoder_key(config)
+        # `choice_branches` of the page being decoded.
+        self._branches_page: typing.Optional[list] = None
+        self._branches: typing.Dict[int, typing.List[int]] = {}
+
+    def wants(self, page_list: list) -> bool:
+        """Checks if a page's command list has any command the decoder handles."""
+        return not self.codes.isdisjoint(map(_code, page_list))
+
+    def decode(self, page_list: list) -> typing.List[Entry]:
+        """Returns the text entries of a page's command list, in command order."""
+        entries: typing.List[Entry] = []
+        if not self.wants(page_list):
+            return entries
+        dispatch = self.dispatch
+        self._branches_page = None
+        for idx, event in enumerate(page_list):
+            handler = dispatch.get(event["code"])
+            if handler is not None:
+                handler(self, page_list, idx, entries)
+        self._branches_page = None
+        return entries
+
+    def menu_branches(self, page_list: list, base_i: int) -> typing.List[int]:
+        """The When [choice] branches (402) of the Show Choices at `base_i`.
+
+        A menu is scanned on its own up to its closing 404, which only looks at the commands of that menu.
+        Once a nested menu turns up, the whole page is paired by `choice_branches` instead.
+        """
+        if self._branches_page is page_list:
+            return self._branches.get(base_i, [])
+        indent = page_list[base_i].get("indent", 0)
+        branches = []
+        for idx in range(base_i + 1, len(page_list)):
+            event = page_list[idx]
+            code = event["code"]
+            if code not in _choice_codes:
+                continue
+            at = event.get("indent", 0)
+            if at > indent:
+                return self.choice_branches(page_list).get(base_i, [])
+            if at < indent or code == 102 or code == 404:
+                # Menus left open (no 404) end with the next choice command at their indent or above.
+                break
+            if code == 402:
+                branches.append(idx)
+        return branches
+
+    def choice_branches(self, page_list: list) -> typing.Dict[int, typing.List[int]]:
+        """`choice_branches` of the page being decoded. Worked out once per page, on its first 102."""
+        if self._branches_page is not page_list:
+            self._branches = choice_branches(page_list)
+            self._branches_page = page_list
+        return self._branches
+
+
+def decoder_config(config: dict) -> typing.Dict[str, typing.Any]:
+    """The parts of a config the decoder reads."""
+    return {"type": config["General"].get("type", "MV"), "events": config.get("Events", {})}
+
+
+def affected_codes(
+    old: typing.Dict[str, typing.Any], new: typing.Dict[str, typing.Any]
+) -> typing.Optional[typing.Set[int]]:
+    """The codes that may decode differently between two `decoder_config`s.
+
+    Returns None if the change is not limited to codes (e.g. the game type changed).
+    """
+    if old["type"] != new["type"]:
+        return None
+    changed = {
+        key
+        for key in old["events"].keys() | new["events"].keys()
+        if old["events"].get(key) != new["events"].get(key)
+    }
+    known = set()
+    for keys in command_config.values():
+        known.update(keys)
+    if changed - known:
+        return None
+    return {code for code, keys in command_config.items() if changed.intersection(keys)}
+
+
+def decoder_key(config: dict) -> bytes:
+    """The parts of a config that change what the decoder extracts."""
+    return orjson.dumps(
+        [config["General"].get("type", "MV"), config.get("Events", {})],
+        option=orjson.OPT_SORT_KEYS,
+    )
+
+
+_decoders: typing.Dict[bytes, EventCommandDecoder] = {}
+
+
+def get_decoder(config: dict) -> EventCommandDecoder:
+    """The decoder for a config. Decoders are shared by every fungler with the same config."""
+    key = decoder_key(config)
+    decoder = _decoders.get(key)
+    if decoder is None:
+        decoder = _decoders[key] = EventCommandDecoder(config)
+    return decoder
+
+
+def _collect(page_list: list, pointer: int, code: int, text_data: Entry):
+    # Follow up lines (405, 408) directly after the command.
+    text, pointers = text_data["text"], text_data["pointer"]
+    end = len(page_list)
+    while pointer < end:
+        event = page_list[pointer]
+        if event["code"] != code:
+            break
+        text.append(event["parameters"][0])
+        pointers.append(pointer)
+        pointer += 1
+
+
+@command(101)
+def show_text(decoder: EventCommandDecoder, page_list: list, base_i: int, entries: typing.List[Entry]):
+    text: typing.List[str] = []
+    pointers: typing.List[int] = []
+    meta = ""
+    if decoder.game_type == "MZ":
+        # MZ has an additional param to code 101, which stores the character name.
+        params101 = page_list[base_i]["parameters"]
+        if len(params101) == 5:
+            text, pointers, meta = [params101[4]], [base_i], "101code"
+    # `_collect`, inlined. Show Text is the most common command with text.
+    pointer, end = base_i + 1, len(page_list)
+    while pointer < end:
+        event = page_list[pointer]
+        if event["code"] != 401:
+            break
+        text.append(event["parameters"][0])
+        pointers.append(pointer)
+        pointer += 1
+    entries.append({"type": "text", "text": text, "pointer": pointers, "meta": meta})
+
+
+@command(102)
+def show_choices(decoder: EventCommandDecoder, page_list: list, base_i: int, entries: typing.List[Entry]):
+    text_data = {"type": "text_choice", "text": [], "pointer": []}
+    if decoder.game_type == "MZ":
+        # MZ appears to no need processing for 102 codes...
+        text_data["text"] = list(page_list[base_i]["parameters"][0])
+        text_data["pointer"] = [base_i]
+        entries.append(text_data)
+        return
+    choices = page_list[base_i]["parameters"][0]
+    branches = decoder.menu_branches(page_list, base_i)
+    text_data["text"] = [page_list[pointer]["parameters"][1] for pointer in branches]
+    text_data["pointer"] = [base_i, *branches]
+    if len(branches) != len(choices):
+        decoder.logger.warning(
+            f"Show Choices at command {base_i} has {len(choices)} choices but {len(branches)} branches. Report to Github."
+        )
+    entries.append(text_data)
+
+
+@command(105, enabled=lambda decoder: decoder.scroll_text, config=("scroll_text",))
+def scroll_text(decoder: EventCommandDecoder, page_list: list, base_i: int, entries: typing.List[Entry]):
+    text_data = {"type": "text", "text": [], "pointer": [], "meta": "105code"}
+    _collect(page_list, base_i + 1, 405, text_data)
+    if text_data["text"]:
+        entries.append(text_data)
+
+
+@command(108, enabled=lambda decoder: decoder.comments, config=("comments",))
+def comment(decoder: EventCommandDecoder, page_list: list, base_i: int, entries: typing.List[Entry]):
+    text_data = {
+        "type": "text",
+        "text": [page_list[base_i]["parameters"][0]],
+        "pointer": [base_i],
+        "meta": "108code",
+    }
+    _collect(page_list, base_i + 1, 408, text_data)
+    entries.append(text_data)
+
+
+@command(
+    122,
+    enabled=lambda decoder: bool(decoder.var_122 or decoder.auto_var_122),
+    config=("code_122", "auto_code_122", "black_code_122"),
+)
+def control_variables(decoder: EventCommandDecoder, page_list: list, base_i: int, entries: typing.List[Entry]):
+    params = page_list[base_i]["parameters"]
+    if params[0] in decoder.black_122:
+        return
+    # Sanity check
+    if params[0] != params[1] or not params[0] in decoder.var_122:
+        if not decoder.auto_var_122:
+            return
+    # String sanity check
+    string_param = params[-1]
+    if isinstance(string_param, str) and jp_rgx.search(string_param):
+        entries.append(
+            {
+                "type": "c12_text",
+                "text": [string_param.strip("'")],
+                "pointer": [base_i],
+            }
+        )
+
+
+@command(320)
+def change_name(decoder: EventCommandDecoder, page_list: list, base_i: int, entries: typing.List[Entry]):
+    params = page_list[base_i]["parameters"]
+    if isinstance(params[1], str):
+        entries.append(
+            {
+                "type": "text_name_change",
+                "text": [params[1]],
+                "pointer": [base_i],
+                "meta": "",
+            }
+        )
+
+
+@command(356, enabled=lambda decoder: decoder.dtext, config=("dtext",))
+def plugin_command_mv(decoder: EventCommandDecoder, page_list: list, base_i: int, entries: typing.List[Entry]):
+    params = page_list[base_i]["parameters"]
+    if len(params) > 1:
+        return
+    dtext_param = params[0]
+    if not dtext_param.startswith("D_TEXT") or dtext_param.startswith("D_TEXT_SETTING"):
+        return
+    if dtext_param.strip() == "D_TEXT":
+        return
+    fi = dtext_rgx.findall(dtext_param)
+    fallback = False
+    if not fi:
+        fi = dtext_rgx_fallback.findall(dtext_param)
+        if not fi:
+            decoder.logger.info("Regex failed to match DText.")
+            return
+        fi = [[fi[0], "_"]]
+        fallback = True
+    text_data = {
+        "type": "d_text",
+        "text": [fi[0][0]],
+        "pointer": [base_i],
+        "meta": dtext_rgx.sub(f"D_TEXT {{DTEXT}} {fi[0][1]}", dtext_param),
+    }
+    if fallback:
+        text_data["meta"] = f"D_TEXT {{DTEXT}}"
+    entries.append(text_data)
+
+
+@command(
+    357, enabled=lambda decoder: bool(decoder.plugin_args), config=("plugin_command_args",)
+)
+def plugin_command_mz(decoder: EventCommandDecoder, page_list: list, base_i: int, entries: typing.List[Entry]):
+    params = page_list[base_i]["parameters"]
+    args = decoder.plugin_args.get((params[0], params[1]))
+    if not args or len(params) < 4 or not isinstance(params[3], dict):
+        return
+    for arg in args:
+        value = params[3].get(arg)
+        if isinstance(value, str) and value:
+            entries.append(
+                {
+                    "type": "plugin_arg",
+                    "text": [value],
+                    "pointer": [base_i],
+                    "meta": arg,
+                }
+            )
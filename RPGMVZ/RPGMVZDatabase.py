@@ -0,0 +1,538 @@
+import pathlib
+import typing
+
+import orjson
+
+from .RPGMVZBase import MVZFungler, split_entries
+from .RPGMVZEntries import string_id
+from .RPGMVZLines import Section
+from .RPGMVZScan import set_path
+
+Record = typing.Dict[str, typing.Any]
+
+
+class DatabaseMVFungler(MVZFungler):
+    # Translatable fields of each record, in export order. Values that are not strings are left alone.
+    fields: typing.Tuple[str, ...] = ("name",)
+    # Key of the battle event pages of each record (Troops). Decoded like map event pages. None if there are none.
+    event_pages: typing.Optional[str] = None
+    # Mappings of the old per-file funglers: the key holding the records and where each field is in an old record.
+    # (An empty path when the record was the text itself) See `upgrade_legacy`.
+    legacy_key: typing.Optional[str] = None
+    legacy_fields: typing.Dict[str, tuple] = {}
+    # Old NestedText exports: the fields in the order they were exported and, for exports that listed every record
+    # under a single key split on `<>`, that key. Exports without it were keyed on record ID. (See `upgrade_legacy_export`)
+    legacy_export: typing.Tuple[str, ...] = ()
+    legacy_section: typing.Optional[str] = None
+
+    @property
+    def mapping_version(self) -> str:
+        return "|".join([*self.fields, self.event_pages or ""])
+
+    def command_pages(self):
+        if not self.event_pages:
+            return
+        records = self.original_data
+        if not isinstance(records, list):
+            raise Exception(f"Expected {self.original_file.name} to be a list.")
+        for idx, record in enumerate(records):
+            if not record:
+                continue
+            for page_idx, page in enumerate(record.get(self.event_pages) or []):
+                page_list_data = page.get("list", [])
+                if not page_list_data or page_list_data[0]["code"] == 0:
+                    continue
+                yield idx, page_idx, page_list_data
+
+    def mapped_page(self, mapping, event_id, page_id):
+        return mapping.get("events", {}).get(str(event_id), {}).get(str(page_id), [])
+
+    def set_mapped_page(self, mapping, event_id, page_id, entries):
+        events = mapping.setdefault("events", {})
+        pages = events.get(str(event_id), {})
+        pages[str(page_id)] = entries
+        events[str(event_id)] = {
+            key: pages[key] for key in sorted(pages, key=int) if pages[key]
+        }
+        mapping["events"] = {
+            key: events[key] for key in sorted(events, key=int) if events[key]
+        }
+
+    def create_maps(self):
+        """Maps every record in one pass. `records` holds the field values of each record (None for fields that are not text)."""
+        records = self.original_data
+        if not isinstance(records, list):
+            raise Exception(f"Expected {self.original_file.name} to be a list.")
+        fields = self.fields
+        mapping: typing.Dict[str, typing.Any] = {
+            "type": self.fungler_type,
+            "fields": list(fields),
+            "records": {},
+        }
+        for idx, record in enumerate(records):
+            if not record:
+                continue
+            values = [
+                value if isinstance(value, str) else None
+                for value in map(record.get, fields)
+            ]
+            if any(values):
+                mapping["records"][str(idx)] = values
+        if self.event_pages:
+            events: typing.Dict[str, typing.Dict[str, list]] = {}
+            for idx, page_idx, page_list_data in self.command_pages():
+                entries = self.parse_page_lists(page_list_data)
+                if entries:
+                    events.setdefault(str(idx), {})[str(page_idx)] = entries
+            mapping["events"] = events
+        self.write_mapped(mapping)
+        return True
+
+    def upgrade_legacy(self, mapping: typing.Dict[str, typing.Any]) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """Converts a mapping written by the old per-file funglers (`{"actors": {...}}`, `{"item": {...}}`...).
+
+        The text of every field, imported translations included, is carried over as it is.
+
+        Returns:
+            typing.Optional[typing.Dict[str, typing.Any]]: None if the mapping is not in the old layout.
+        """
+        legacy = mapping.get(self.legacy_key) if self.legacy_key and "fields" not in mapping else None
+        if not isinstance(legacy, dict):
+            return None
+        records: typing.Dict[str, list] = {}
+        for idx, record in legacy.items():
+            values = []
+            for field in self.fields:
+                value = record if field in self.legacy_fields else None
+                for key in self.legacy_fields.get(field, ()):
+                    try:
+                        value = value[key]
+                    except (KeyError, IndexError, TypeError):
+                        value = None
+                        break
+                values.append(value if isinstance(value, str) else None)
+            if any(value is not None for value in values):
+                records[idx] = values
+        return {"type": self.fungler_type, "fields": list(self.fields), "records": records}
+
+    def mapping_outdated(self) -> bool:
+        mapping = self.read_mapped()
+        return bool(mapping) and mapping.get("fields") != list(self.fields)
+
+    def read_records(self, mutable: bool = False) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """Reads the mapping. None if it is missing or was mapped with other fields.
+
+        Mappings in the layout of the old per-file funglers are converted and written back first. (See `upgrade_legacy`)
+        """
+        mapping = self.read_mapped(mutable=mutable)
+        if not mapping:
+            return None
+        upgraded = self.upgrade_legacy(mapping)
+        if upgraded is not None:
+            self.write_mapped(upgraded)
+            self.logger.info(f"Converted {self.mapped_file.name} from the old mapping layout. Translations are kept.")
+            mapping = self.read_mapped(mutable=mutable)
+        if mapping.get("fields") != list(self.fields):
+            self.logger.error(
+                f"{self.mapped_file.name} was mapped with other fields. Map it again with --overwrite. (Translations are kept)"
+            )
+            return None
+        return mapping
+
+    def patch_operations(self, mapping, validate=True):
+        fields = mapping["fields"]
+        for idx, values in mapping["records"].items():
+            for field, value in zip(fields, values):
+                if value is not None:
+                    yield (int(idx), field), value
+        for idx, pages in mapping.get("events", {}).items():
+            for page_idx, entries in pages.items():
+                page_list = (int(idx), self.event_pages, int(page_idx), "list")
+                for text_data in entries:
+                    yield from self.command_operations(page_list, text_data, validate)
+
+    def apply_maps(self, patch_file: pathlib.Path):
+        mapping = self.read_records()
+        if mapping is None:
+            # Keep the file in the patched game, untranslated.
+            self.logger.error(f"Skipped patching {self.original_file.name}. Its mapping could not be read.")
+            patch_file.write_bytes(self.original_file.read_bytes())
+            return False
+        # Most records are usually translated. Re-encoding is faster than splicing every value. (See `write_patched`)
+        document = self.checkout_original()
+        for path, value in self.patch_operations(mapping):
+            set_path(document, path, value)
+        patch_file.write_bytes(orjson.dumps(document))
+        return True
+
+    def text_units(self):
+        mapping = self.read_records()
+        if mapping is None:
+            return None
+        units = [
+            value
+            for values in mapping["records"].values()
+            for value in values
+            if value is not None
+        ]
+        for pages in mapping.get("events", {}).values():
+            for entries in pages.values():
+                units.extend("\n".join(text_data["text"]) for text_data in entries)
+        return units
+
+    def string_units(self):
+        # Read as it is, so the strings of a mapping made with other fields can still be carried over. (See `keep_translations`)
+        mapping = self.read_mapped()
+        if not mapping:
+            return None
+        mapping = self.upgrade_legacy(mapping) or mapping
+        if "records" not in mapping:
+            return None
+        stem = self.original_file.stem
+        units = {}
+        for idx, record in self.export_records(mapping, entries=True).items():
+            for field, value in record.items():
+                if isinstance(value, str):
+                    units[string_id(stem, idx, field)] = value
+                    continue
+                for text, _, key in value:
+                    units[key] = "\n".join(text)
+        return units
+
+    def set_units(self, units):
+        mapping = self.read_records(mutable=True)
+        if mapping is None:
+            return 0
+        stem = self.original_file.stem
+        count = 0
+        for idx, values in mapping["records"].items():
+            for pos, field in enumerate(mapping["fields"]):
+                text = units.get(string_id(stem, idx, field))
+                if text is not None and values[pos] is not None:
+                    values[pos] = text
+                    count += 1
+        for idx, pages in mapping.get("events", {}).items():
+            for page_idx, page in pages.items():
+                for text_data in page:
+                    text = units.get(self._entry_id(stem, idx, page_idx, text_data))
+                    if text is not None and text.count("\n") + 1 == len(text_data["text"]):
+                        text_data["text"] = text.split("\n")
+                        count += 1
+        if count:
+            self.write_mapped(mapping)
+        return count
+
+    def _entry_id(self, stem: str, idx: str, page_idx: str, text_data: typing.Dict[str, typing.Any]) -> str:
+        # Entries are identified by their first command.
+        return string_id(stem, idx, page_idx, text_data["pointer"][0] if text_data["pointer"] else 0)
+
+    def export_records(self, mapping: typing.Dict[str, typing.Any], entries: bool = False) -> typing.Dict[str, Record]:
+        """Record ID -> {field: text}. Event pages are exported as lines under `event_pages`, each entry ending with `<>` (`<>c` for choices).
+
+        With `entries`, event pages are a list of (text lines, is choice, string ID) instead. (See `RPGMVZLines`)
+        """
+        stem = self.original_file.stem
+        exported: typing.Dict[str, Record] = {}
+        for idx, values in mapping["records"].items():
+            exported[idx] = {
+                field: value
+                for field, value in zip(mapping["fields"], values)
+                if value is not None
+            }
+        for idx, pages in mapping.get("events", {}).items():
+            lines = exported.setdefault(idx, {}).setdefault(self.event_pages, [])
+            for page_idx, page in pages.items():
+                for text_data in page:
+                    choice = text_data["type"] == "text_choice"
+                    if entries:
+                        lines.append((text_data["text"], choice, self._entry_id(stem, idx, page_idx, text_data)))
+                        continue
+                    lines.extend(text_data["text"])
+                    lines.append("<>c" if choice else "<>")
+        return {idx: exported[idx] for idx in sorted(exported, key=int)}
+
+    def import_records(self, mapping: typing.Dict[str, typing.Any], exported: typing.Dict[str, typing.Any]) -> bool:
+        """Copies the exported text back into the mapping. Returns False on the first mismatch."""
+        fields = mapping["fields"]
+        for idx, values in mapping["records"].items():
+            record = exported.get(idx)
+            if not isinstance(record, dict):
+                self.logger.error(f"Mismatch import for {self.export_file.name}. Record {idx} is missing.")
+                return False
+            for pos, field in enumerate(fields):
+                if values[pos] is None:
+                    continue
+                text = record.get(field)
+                if not isinstance(text, str):
+                    self.logger.error(
+                        f"Mismatch import for {self.export_file.name}. Record {idx} is missing `{field}`."
+                    )
+                    return False
+                values[pos] = text
+        for idx, pages in mapping.get("events", {}).items():
+            record = exported.get(idx)
+            lines = record.get(self.event_pages) if isinstance(record, dict) else None
+            if isinstance(lines, list) and all(isinstance(line, tuple) for line in lines):
+                # Already grouped into entries. (Lines exports)
+                groups = [text for text, _, _ in lines]
+            elif isinstance(lines, list) and all(isinstance(line, str) for line in lines):
+                groups = split_entries(lines)
+            else:
+                self.logger.error(
+                    f"Mismatch import for {self.export_file.name}. Record {idx} is missing `{self.event_pages}`."
+                )
+                return False
+            entries = [text_data for page in pages.values() for text_data in page]
+            if len(groups) != len(entries) or any(
+                len(text) != len(text_data["text"]) for text, text_data in zip(groups, entries)
+            ):
+                self.logger.error(
+                    f"Mismatch import for {self.export_file.name}. Record {idx} does not match the mapped event pages."
+                )
+                return False
+            for text, text_data in zip(groups, entries):
+                text_data["text"] = text
+        return True
+
+    def export_map(self, format="nested") -> bool:
+        mapping = self.read_records()
+        if mapping is None:
+            return False
+        if format == "lines":
+            exported = self.export_records(mapping, entries=True)
+            if self.export_ids is not None:
+                exported = self._only_ids(exported, self.export_ids)
+            return self.export_lines(exported)
+        exported = self.export_records(mapping)
+        if format == "nested":
+            return self.export_nested(exported)
+        elif format == "xlsx":
+            lines = []
+            for record in exported.values():
+                for key, value in record.items():
+                    lines.extend(value if key == self.event_pages else [value])
+                lines.append("<>")
+            return self.export_excel({self.fungler_type: lines})
+        raise Exception(f"Unknown format: {format}")
+
+    def import_map(self, format="nested") -> bool:
+        mapping = self.read_records(mutable=True)
+        if mapping is None:
+            return False
+        if format == "nested":
+            exported = self.upgrade_legacy_export(mapping, self.import_nested(dict))
+        elif format == "lines":
+            data = self.import_lines()
+            if not data or not self.import_record_lines(mapping, data):
+                return False
+            self.write_mapped(mapping)
+            return True
+        elif format == "xlsx":
+            sheets = self.import_excel(dict)
+            exported = self._unflatten(mapping, sheets.get(self.fungler_type, [])) if sheets else None
+        else:
+            raise Exception(f"Unknown format: {format}")
+        if not exported or not self.import_records(mapping, exported):
+            return False
+        self.write_mapped(mapping)
+        return True
+
+    def import_record_lines(self, mapping: typing.Dict[str, typing.Any], data: typing.Dict[str, Section]) -> bool:
+        """Imports a lines export by record and field, and event page entries by string ID.
+
+        Records, fields and entries left out of the export keep their text. Ones that do not fit the mapping are
+        reported and skipped. Event pages of records whose entries have no IDs are imported in order as before.
+
+        Returns:
+            bool: False if nothing could be imported.
+        """
+        fields = mapping["fields"]
+        records = mapping["records"]
+        events = mapping.get("events", {})
+        stem = self.original_file.stem
+        failed = []
+        imported = 0
+        for idx, record in data.items():
+            if not isinstance(record, dict) or (idx not in records and idx not in events):
+                failed.append(f"{stem}:{idx} (Not in the mapping)")
+                continue
+            values = records.get(idx)
+            for field, value in record.items():
+                if field == self.event_pages and idx in events:
+                    continue
+                pos = fields.index(field) if field in fields else None
+                if pos is None or values is None or values[pos] is None or not isinstance(value, str):
+                    failed.append(f"{string_id(stem, idx, field)} (Not in the mapping)")
+                    continue
+                values[pos] = value
+                imported += 1
+            entries = record.get(self.event_pages)
+            if idx not in events or entries is None:
+                continue
+            if isinstance(entries, str) or not entries:
+                failed.append(f"{string_id(stem, idx, self.event_pages)} (Not entries)")
+                continue
+            mapped = {
+                self._entry_id(stem, idx, page_idx, text_data): text_data
+                for page_idx, page in events[idx].items()
+                for text_data in page
+            }
+            if any(key is None for _, _, key in entries):
+                # No IDs. Every entry of the record has to be there, in order.
+                if len(entries) != len(mapped) or any(
+                    len(text) != len(text_data["text"]) for (text, _, _), text_data in zip(entries, mapped.values())
+                ):
+                    failed.append(f"{string_id(stem, idx, self.event_pages)} (Does not match the mapped event pages)")
+                    continue
+                for (text, _, _), text_data in zip(entries, mapped.values()):
+                    text_data["text"] = text
+                imported += len(entries)
+                continue
+            for text, _, key in entries:
+                text_data = mapped.get(key)
+                if text_data is None:
+                    failed.append(f"{key} (Not in the mapping)")
+                elif len(text) != len(text_data["text"]):
+                    failed.append(f"{key} (Expecting {len(text_data['text'])} lines. Got {len(text)})")
+                else:
+                    text_data["text"] = text
+                    imported += 1
+        total = sum(value is not None for values in records.values() for value in values)
+        total += sum(len(page) for pages in events.values() for page in pages.values())
+        self.partial_import = bool(failed) or imported != total
+        if failed:
+            self.logger.error(
+                f"{len(failed)} strings of {self.export_file.name} were not imported: {', '.join(failed)}"
+            )
+        return imported > 0 or not failed
+
+    def _only_ids(self, exported: typing.Dict[str, Record], ids: typing.Set[str]) -> typing.Dict[str, Record]:
+        """The fields and event page entries of a lines export whose string ID is in `ids`."""
+        stem = self.original_file.stem
+        kept: typing.Dict[str, Record] = {}
+        for idx, record in exported.items():
+            fields = {}
+            for field, value in record.items():
+                if isinstance(value, str):
+                    if string_id(stem, idx, field) in ids:
+                        fields[field] = value
+                    continue
+                entries = [entry for entry in value if entry[2] in ids]
+                if entries:
+                    fields[field] = entries
+            if fields:
+                kept[idx] = fields
+        return kept
+
+    def upgrade_legacy_export(
+        self, mapping: typing.Dict[str, typing.Any], exported: typing.Optional[typing.Dict[str, typing.Any]]
+    ) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """Reads a NestedText export of the old per-file funglers as record ID -> {field: text}. Other exports are returned as they are.
+
+        Fields the old export did not have keep the text of the mapping. The export then no longer matches the mapping,
+        so `partial_import` is set and it is exported again.
+        """
+        if not exported or not self.legacy_export:
+            return exported
+        if self.legacy_section:
+            section = exported.get(self.legacy_section)
+            if len(exported) != 1 or not isinstance(section, list):
+                return exported
+            # Records were exported in ID order, leaving out the ones without a name.
+            name = mapping["fields"].index("name")
+            ids = [idx for idx in sorted(mapping["records"], key=int) if mapping["records"][idx][name]]
+            records = dict(zip(ids, split_entries(section)))
+        elif any(isinstance(record, dict) for record in exported.values()):
+            return exported
+        else:
+            records = {
+                idx: [record] if isinstance(record, str) else record for idx, record in exported.items()
+            }
+        upgraded = self.export_records(mapping)
+        for idx, values in records.items():
+            if isinstance(values, list):
+                upgraded.setdefault(idx, {}).update(zip(self.legacy_export, values))
+        self.logger.info(f"Read {self.export_file.name} as an export of the old layout.")
+        self.partial_import = True
+        return upgraded
+
+    def _unflatten(self, mapping: typing.Dict[str, typing.Any], lines: list) -> typing.Dict[str, Record]:
+        """Rebuilds the nested export from the lines of an xlsx export."""
+        exported = self.export_records(mapping)
+        lines = iter(lines)
+        for record in exported.values():
+            for key, value in record.items():
+                if key == self.event_pages:
+                    record[key] = [next(lines, None) for _ in value]
+                else:
+                    record[key] = next(lines, None)
+            next(lines, None)
+        return exported
+
+
+class ItemMVFungler(DatabaseMVFungler):
+    """Items.json, Weapons.json and Armors.json"""
+
+    fungler_type = "items"
+    fields = ("name", "description", "note")
+    legacy_key = "item"
+    legacy_fields = {"name": ("name",), "description": ("desc",), "note": ("note",)}
+    legacy_export = ("name", "description", "note")
+
+
+class EnemyMVFungler(DatabaseMVFungler):
+    fungler_type = "enemy"
+    fields = ("name",)
+    legacy_key = "enemy"
+    legacy_fields = {"name": ()}
+    legacy_export = ("name",)
+
+
+class ActorMVFungler(DatabaseMVFungler):
+    fungler_type = "actors"
+    fields = ("name", "nickname", "profile", "note")
+    legacy_key = "actors"
+    legacy_fields = {"name": ("name",), "nickname": ("nickname",), "profile": ("profile",), "note": ("note",)}
+    legacy_export = ("name", "note", "nickname", "profile")
+    legacy_section = "Actors"
+
+
+class ClassesMVFungler(DatabaseMVFungler):
+    fungler_type = "classes"
+    fields = ("name",)
+    legacy_key = "classes"
+    legacy_fields = {"name": ()}
+
+
+class SkillsMVfungler(DatabaseMVFungler):
+    fungler_type = "skill"
+    fields = ("name", "description", "message1", "message2")
+    legacy_key = "skills"
+    legacy_fields = {
+        "name": ("name",),
+        "description": ("desc",),
+        "message1": ("msgs", 0),
+        "message2": ("msgs", 1),
+    }
+    legacy_export = ("name", "message1", "message2", "description")
+    legacy_section = "Skills"
+
+
+class StatesMVFungler(DatabaseMVFungler):
+    fungler_type = "states"
+    fields = ("name", "message1", "message2", "message3", "message4")
+
+
+class TroopsMVFungler(DatabaseMVFungler):
+    fungler_type = "troops"
+    config_sections = ("General", "Events")
+    indexed_commands = True
+    fields = ("name",)
+    event_pages = "pages"
+
+
+class MapInfosMVFungler(DatabaseMVFungler):
+    """MapInfos.json. Map names as shown in the editor. (The in game name is the map's `displayName`)"""
+
+    fungler_type = "mapinfos"
+    fields = ("name",)
@@ -0,0 +1,249 @@
+import array
+import struct
+import typing
+
+import orjson
+
+Entry = typing.Dict[str, typing.Any]
+
+# Binary mapping files start with this. Json mappings start with "{".
+MAGIC = b"DFET"
+_header = struct.Struct("<4sBI")
+_itemsize = array.array("I").itemsize
+
+
+def _array(typecode: str, raw: bytes) -> array.array:
+    values = array.array(typecode)
+    values.frombytes(raw)
+    return values
+
+
+def string_id(file: str, *where: typing.Union[int, str]) -> str:
+    """Stable ID of an exported string: its data file (without suffix), then where it is in the file.
+
+    Event entries are `file:event:page:pointer` (`Map001:3:0:12`, the pointer being the entry's first command),
+    database fields `file:record:field` (`Actors:1:name`).
+    """
+    return ":".join([file, *map(str, where)])
+
+
+class EntryTable:
+    version = 1
+    # Columns stored as unsigned 32 bit ints, in file order.
+    columns = ("event", "page", "kind", "meta", "text_at", "pointer_at", "pointers")
+
+    def __init__(self, paged: bool = True) -> None:
+        """Struct of arrays holding the entries of an event mapping (Maps and CommonEvents).
+
+        Entry `i` is described by `event[i]`, `page[i]`, `kind[i]` (index into `kinds`) and `meta[i]` (index into `metas`).
+        Its text is `text[text_at[i]:text_at[i + 1]]` and its pointers are `pointers[pointer_at[i]:pointer_at[i + 1]]`.
+
+        Text is one list shared by every entry and pointers are a single `array("I")`, so a mapping costs a
+        handful of objects instead of a few per entry. The json mapping (`to_mapping`/`from_mapping`) is kept as an import/export view.
+
+        Args:
+            paged (bool, optional): Events have pages (Maps) instead of a single list (CommonEvents). Defaults to True.
+        """
+        self.paged = paged
+        self.header: typing.Dict[str, typing.Any] = {}
+        self.kinds: typing.List[str] = []
+        self.metas: typing.List[str] = []
+        self.text: typing.List[str] = []
+        self.event = array.array("I")
+        self.page = array.array("I")
+        self.kind = array.array("I")
+        self.meta = array.array("I")
+        self.text_at = array.array("I", [0])
+        self.pointer_at = array.array("I", [0])
+        self.pointers = array.array("I")
+        self._kind_ids: typing.Dict[str, int] = {}
+        self._meta_ids: typing.Dict[str, int] = {}
+        # Rows changed by `set_text`. Only tracked for tables a store can write back row by row. (See `SQLiteStore`)
+        self.edited: typing.Optional[typing.Set[int]] = None
+        self.revision = 0
+
+    def __len__(self) -> int:
+        return len(self.event)
+
+    def _intern(self, table: typing.List[str], ids: typing.Dict[str, int], value: str) -> int:
+        idx = ids.get(value)
+        if idx is None:
+            idx = ids[value] = len(table)
+            table.append(value)
+        return idx
+
+    def append(self, event: int, page: int, entry: Entry):
+        self.event.append(event)
+        self.page.append(page)
+        self.kind.append(self._intern(self.kinds, self._kind_ids, entry["type"]))
+        # Some entries (c12_text, text_choice) have no meta. Keep them apart from an empty meta.
+        meta = entry.get("meta")
+        self.meta.append(0 if meta is None else self._intern(self.metas, self._meta_ids, meta) + 1)
+        self.text.extend(entry["text"])
+        self.text_at.append(len(self.text))
+        self.pointers.extend(entry["pointer"])
+        self.pointer_at.append(len(self.pointers))
+
+    def rows(self) -> typing.Iterator[typing.Tuple[int, int, int, Entry]]:
+        """Yields (row, event id, page index, entry) in mapping order. The entries are built on the fly."""
+        for idx, (event_id, page_id) in enumerate(zip(self.event, self.page)):
+            yield idx, event_id, page_id, self.entry(idx)
+
+    def events(self) -> typing.Dict[str, typing.List[int]]:
+        """Event id (as mapping key) -> its rows, in mapping order."""
+        grouped: typing.Dict[str, typing.List[int]] = {}
+        for idx, event_id in enumerate(self.event):
+            grouped.setdefault(str(event_id), []).append(idx)
+        return grouped
+
+    def texts(self) -> typing.List[str]:
+        """The text of every row, lines joined with a line break."""
+        text, text_at = self.text, self.text_at
+        return ["\n".join(text[text_at[idx] : text_at[idx + 1]]) for idx in range(len(self))]
+
+    def ids(self, file: str) -> typing.List[str]:
+        """The string ID of every row. (See `string_id`)"""
+        pointers, pointer_at = self.pointers, self.pointer_at
+        ids = []
+        for idx in range(len(self)):
+            start, end = pointer_at[idx], pointer_at[idx + 1]
+            pointer = pointers[start] if end > start else 0
+            ids.append(string_id(file, self.event[idx], self.page[idx], pointer))
+        return ids
+
+    def text_count(self, idx: int) -> int:
+        return self.text_at[idx + 1] - self.text_at[idx]
+
+    def set_text(self, idx: int, text: typing.List[str]):
+        """Replaces the text of a row. The number of lines cannot change."""
+        start, end = self.text_at[idx], self.text_at[idx + 1]
+        if len(text) != end - start:
+            raise ValueError(f"Expected {end - start} lines. Got {len(text)}.")
+        if self.text[start:end] == text:
+            return
+        self.text[start:end] = text
+        if self.edited is not None:
+            self.edited.add(idx)
+
+    def entry(self, idx: int) -> Entry:
+        entry = {
+            "type": self.kinds[self.kind[idx]],
+            "text": self.text[self.text_at[idx] : self.text_at[idx + 1]],
+            "pointer": self.pointers[self.pointer_at[idx] : self.pointer_at[idx + 1]].tolist(),
+        }
+        if self.meta[idx]:
+            entry["meta"] = self.metas[self.meta[idx] - 1]
+        return entry
+
+    @classmethod
+    def from_mapping(
+        cls, mapping: typing.Dict[str, typing.Any], paged: typing.Optional[bool] = None
+    ) -> "EntryTable":
+        """Builds the table from a json mapping. Maps have `{event: {page: [entries]}}`, CommonEvents `{event: [entries]}`.
+
+        Args:
+            mapping (typing.Dict[str, typing.Any]): The json mapping.
+            paged (typing.Optional[bool], optional): If the events have pages. Defaults to None (Worked out from the mapping).
+        """
+        events = mapping.get("events", {})
+        if paged is None:
+            paged = not any(isinstance(pages, list) for pages in events.values())
+        table = cls(paged=paged)
+        table.header = {key: value for key, value in mapping.items() if key != "events"}
+        for event_id, pages in events.items():
+            if not paged:
+                pages = {"0": pages}
+            for page_id, entries in pages.items():
+                for entry in entries:
+                    table.append(int(event_id), int(page_id), entry)
+        return table
+
+    def to_mapping(self) -> typing.Dict[str, typing.Any]:
+        """The json mapping view of the table."""
+        events: typing.Dict[str, typing.Any] = {}
+        kinds, metas, text, pointers = self.kinds, self.metas, self.text, self.pointers
+        text_at, pointer_at, meta = self.text_at, self.pointer_at, self.meta
+        for idx, (event_id, page_id, kind) in enumerate(zip(self.event, self.page, self.kind)):
+            entry = {
+                "type": kinds[kind],
+                "text": text[text_at[idx] : text_at[idx + 1]],
+                "pointer": pointers[pointer_at[idx] : pointer_at[idx + 1]].tolist(),
+            }
+            if meta[idx]:
+                entry["meta"] = metas[meta[idx] - 1]
+            if self.paged:
+                events.setdefault(str(event_id), {}).setdefault(str(page_id), []).append(entry)
+            else:
+                events.setdefault(str(event_id), []).append(entry)
+        mapping = dict(self.header)
+        mapping["events"] = events
+        return mapping
+
+    def to_bytes(self) -> bytes:
+        """Binary encoding: magic, version, header length, json header, the columns and the text as one utf-8 blob.
+
+        The header holds the mapping's other keys, the kind and meta tables and the length of every column.
+        """
+        blob = "".join(self.text).encode("utf-8")
+        lengths = array.array("I", map(len, self.text))
+        columns = [getattr(self, name) for name in self.columns] + [lengths]
+        header = orjson.dumps(
+            {
+                "paged": self.paged,
+                "mapping": self.header,
+                "kinds": self.kinds,
+                "metas": self.metas,
+                "sizes": [len(column) for column in columns],
+                "text": len(blob),
+            }
+        )
+        return b"".join(
+            [_header.pack(MAGIC, self.version, len(header)), header]
+            + [column.tobytes() for column in columns]
+            + [blob]
+        )
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "EntryTable":
+        magic, version, header_size = _header.unpack_from(raw)
+        if magic != MAGIC or version != cls.version:
+            raise ValueError("Not a binary mapping.")
+        offset = _header.size
+        header = orjson.loads(raw[offset : offset + header_size])
+        offset += header_size
+        table = cls(paged=header["paged"])
+        table.header = header["mapping"]
+        table.kinds = header["kinds"]
+        table.metas = header["metas"]
+        table._kind_ids = {kind: idx for idx, kind in enumerate(table.kinds)}
+        table._meta_ids = {meta: idx for idx, meta in enumerate(table.metas)}
+        columns = []
+        for size in header["sizes"]:
+            end = offset + size * _itemsize
+            columns.append(_array("I", raw[offset:end]))
+            offset = end
+        *columns, lengths = columns
+        for name, column in zip(cls.columns, columns):
+            setattr(table, name, column)
+        blob = raw[offset : offset + header["text"]].decode("utf-8")
+        text = []
+        start = 0
+        for length in lengths:
+            text.append(blob[start : start + length])
+            start += length
+        table.text = text
+        return table
+
+
+def load_mapping(raw: bytes) -> typing.Any:
+    """Parses a mapping file that is either json or a binary `EntryTable`."""
+    if raw[:4] == MAGIC:
+        return EntryTable.from_bytes(raw).to_mapping()
+    return orjson.loads(raw)
+
+
+def load_table(raw: bytes, paged: typing.Optional[bool] = None) -> EntryTable:
+    """Parses a mapping file that is either json or a binary `EntryTable` into a table."""
+    if raw[:4] == MAGIC:
+        return EntryTable.from_bytes(raw)
+    return EntryTable.from_mapping(orjson.loads(raw), paged=paged)
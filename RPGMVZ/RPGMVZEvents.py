@@ -1,350 +1,313 @@
 import pathlib
-import re
 import nestedtext
 
 import orjson
 from .RPGMVZBase import MVZFungler
+from .RPGMVZEntries import EntryTable
+from .RPGMVZLines import KeyedEntries
+from .RPGMVZScan import load_map_without_tiles
 
 
 class CommonEventMVFungler(MVZFungler):
     fungler_type = "common_event"
+    config_sections = ("General", "Events")
+    scoped_events = True
+    indexed_commands = True
+    compact_mapping = True
+    paged_mapping = False
 
-    def create_maps(self):
-        mapping = self.read_mapped(create=True)
-        if not mapping:
-            raise Exception("Mapping failed to create?")
-        mapping["events"] = {}
-        mapping = {"type": "common_event", "events": {}}
+    def command_pages(self):
         if not isinstance(self.original_data, list):
             raise Exception("Wrong type?")
-        # events = []
         for idx, event in enumerate(
             self.original_data,
         ):
             if not event:
                 continue
-            # pages = []
             page_list_data = event.get("list", [])
             if not page_list_data:
                 continue
             if page_list_data[0]["code"] == 0:
                 continue
-            page_list_events = self.parse_page_lists(page_list_data)
-            if page_list_events:
-                mapping["events"][str(idx)] = page_list_events
-        if mapping["events"]:
-            self.mapped_file.write_bytes(
-                orjson.dumps(mapping, option=orjson.OPT_INDENT_2)
-            )
+            # Common events have a single page.
+            yield idx, 0, page_list_data
 
-    def apply_maps(self, patch_file: pathlib.Path):
-        mapping = self.read_mapped(create=False)
-        if not mapping:
-            raise Exception("Mapping failed to read?")
+    def mapped_page(self, mapping, event_id, page_id):
+        return mapping["events"].get(str(event_id), [])
+
+    def set_mapped_page(self, mapping, event_id, page_id, entries):
+        events = mapping["events"]
+        events[str(event_id)] = entries
+        mapping["events"] = {
+            key: events[key] for key in sorted(events, key=int) if events[key]
+        }
+
+    def create_maps(self):
+        if not self.read_mapped(create=True):
+            raise Exception("Mapping failed to create?")
+        mapping = EntryTable(paged=False)
+        mapping.header = {"type": "common_event"}
+        # events = []
+        for idx, _, page_list_data in self.command_pages():
+            for text_data in self.parse_page_lists(page_list_data):
+                mapping.append(idx, 0, text_data)
+        if len(mapping):
+            self.write_mapped(mapping)
+            self.record_spans(mapping)
+
+    def patch_operations(self, mapping, validate=True):
         old_map = self.original_data
         if not old_map or not isinstance(old_map, list):
             raise Exception("original_data failed to read?")
-        for idx, map_event in mapping["events"].items():
-            for text_data in map_event:
-                if text_data["type"] == "text":
-                    for txt_idx, ptr in enumerate(text_data["pointer"]):
-                        if txt_idx == 0 and "101code" in text_data["meta"]:
-                            txt_event = old_map[int(idx)]["list"][ptr]
-                            txt_event["parameters"][4] = text_data["text"][txt_idx]
-                        else:
-                            txt_event = old_map[int(idx)]["list"][ptr]
-                            txt_event["parameters"][0] = text_data["text"][txt_idx]
-                            old_map[int(idx)]["list"][ptr] = txt_event
-                elif text_data["type"] == "text_name_change":
-                    ptr = text_data["pointer"][0]
-                    txt_event = old_map[int(idx)]["list"][ptr]
-                    txt_event["parameters"][1] = text_data["text"][0]
-                    old_map[int(idx)]["list"][ptr] = txt_event
-                elif text_data["type"] == "text_choice":
-                    # Note for MZ that this for loop should not execute since the list is empty.
-                    for txt_idx, ptr in enumerate(text_data["pointer"][1:]):
-                        txt_event = old_map[int(idx)]["list"][ptr]
-                        txt_event["parameters"][1] = text_data["text"][txt_idx]
-                        old_map[int(idx)]["list"][ptr] = txt_event
-                    zero_ptr = text_data["pointer"][0]
-                    txt_event = old_map[int(idx)]["list"][zero_ptr]
-                    txt_event["parameters"][0] = text_data["text"]
-                    old_map[int(idx)]["list"][zero_ptr] = txt_event
-                # D_TEXT
-                elif text_data["type"] == "d_text":
-                    d_pointer = text_data["pointer"][0]
-                    formatted = text_data["meta"].format(DTEXT=text_data["text"][0])
-                    txt_event = old_map[int(idx)]["list"][d_pointer]
-                    txt_event["parameters"][0] = formatted
-                    old_map[int(idx)]["list"][d_pointer] = txt_event
-                elif text_data["type"] == "c12_text":
-                    c12_pointer = text_data["pointer"][0]
-                    txt_event = old_map[int(idx)]["list"][c12_pointer]
-                    has_wrong_escape = False
-                    for rgx_match in re.finditer("'", text_data["text"][0]):
-                        if text_data["text"][0][rgx_match.start() - 1] != "\\":
-                            self.logger.warning(
-                                f"\"{text_data['text'][0]}\" does not have an escape sequence for >'<. Refusing to use it. File name: {patch_file.name}"
-                            )
-                            has_wrong_escape = True
-                            break
-                    if not has_wrong_escape:
-                        txt_event["parameters"][-1] = f"'{text_data['text'][0]}'"
-                        old_map[int(idx)]["list"][c12_pointer] = txt_event
-        patch_file.write_bytes(orjson.dumps(old_map, option=orjson.OPT_INDENT_2))
+        if not isinstance(mapping, EntryTable):
+            mapping = EntryTable.from_mapping(mapping, paged=False)
+        for _, idx, _, text_data in mapping.rows():
+            if self.event_filter is not None and str(idx) not in self.event_filter:
+                continue
+            yield from self.command_operations((idx, "list"), text_data, validate)
+
+    def apply_maps(self, patch_file: pathlib.Path):
+        self.apply_plan(patch_file, self.read_table)
+
+    def text_units(self):
+        mapping = self.read_table()
+        return None if mapping is None else mapping.texts()
+
+    def string_units(self):
+        mapping = self.read_table()
+        if mapping is None:
+            return None
+        return dict(zip(mapping.ids(self.original_file.stem), mapping.texts()))
+
+    def set_units(self, units):
+        mapping = self.read_table(mutable=True)
+        if mapping is None:
+            return 0
+        count = 0
+        for row, key in enumerate(mapping.ids(self.original_file.stem)):
+            text = units.get(key)
+            if text is not None and text.count("\n") + 1 == mapping.text_count(row):
+                mapping.set_text(row, text.split("\n"))
+                count += 1
+        if count:
+            self.write_mapped(mapping)
+        return count
 
     def export_map(self, format="nested") -> bool:
-        mapping = self.read_mapped()
-        if not mapping:
+        mapping = self.read_table()
+        if mapping is None:
             return False
         if format == "nested":
             # print(self.mapped_file)
             z = {}
-            for evidx, event in mapping["events"].items():
-                events = []
-                for text_data in event:
-                    events.extend(text_data["text"])
-                    if text_data["type"] == "text_choice":
-                        # hack to work around detection of <>
-                        events.append("<>c")
-                    else:
-                        events.append("<>")
-                z[evidx] = events
+            for _, evidx, _, text_data in mapping.rows():
+                events = z.setdefault(str(evidx), [])
+                events.extend(text_data["text"])
+                if text_data["type"] == "text_choice":
+                    # hack to work around detection of <>
+                    events.append("<>c")
+                else:
+                    events.append("<>")
             return self.export_nested(z)
         elif format == "xlsx":
             z = {}
-            for evidx, event in mapping["events"].items():
-                events = []
-                for text_data in event:
-                    events.extend(text_data["text"])
-                    events.append("<>")
-                z[evidx] = events
+            for _, evidx, _, text_data in mapping.rows():
+                events = z.setdefault(str(evidx), [])
+                events.extend(text_data["text"])
+                events.append("<>")
             return self.export_excel(z)
+        elif format == "lines":
+            z = {}
+            ids = mapping.ids(self.original_file.stem)
+            for row, evidx, _, text_data in mapping.rows():
+                if self.export_ids is not None and ids[row] not in self.export_ids:
+                    continue
+                z.setdefault(str(evidx), []).append(
+                    (text_data["text"], text_data["type"] == "text_choice", ids[row])
+                )
+            return self.export_lines(z)
         else:
             raise Exception(f"Unknown format: {format}")
 
     def import_map(self, format="nested") -> bool:
-        mapping = self.read_mapped()
+        mapping = self.read_table(mutable=True)
         if mapping is None:
             return False
-        if format == "nested":
-            nesttext_data = self.import_nested(dict)
-        elif format == "xlsx":
-            nesttext_data = self.import_excel(dict)
-        else:
-            raise Exception(f"Unknown format: {format}")
-        if not nesttext_data:
+        parsed_events = self.import_events(format)
+        if not parsed_events:
             return False
-        parsed_events = {}
-        for event_idx, lines in nesttext_data.items():
-            reconstruct_events = []
-            event_data = []
-            for line in lines:
-                if line.startswith("<>") and len(line) in [2, 3]:
-                    reconstruct_events.append(event_data)
-                    event_data = []
-                else:
-                    event_data.append(line)
-            parsed_events[event_idx] = reconstruct_events
-        for k, map_events in mapping["events"].items():
-            if len(map_events) != len(parsed_events[k]):
+        if isinstance(parsed_events, KeyedEntries):
+            if not self.import_by_id(mapping, parsed_events):
+                return False
+            self.write_mapped(mapping)
+            return True
+        for k, rows in mapping.events().items():
+            if self.event_filter is not None and k not in self.event_filter:
+                continue
+            if len(rows) != len(parsed_events[k]):
                 self.logger.error(
-                    f"Mismatched key size: {k}. Expecting: {len(map_events)}. Got: {len(parsed_events[k])}"
+                    f"Mismatched key size: {k}. Expecting: {len(rows)}. Got: {len(parsed_events[k])}"
                 )
                 return False
-            for idx, event in enumerate(map_events):
-                if len(event["text"]) != len(parsed_events[k][idx]):
+            for idx, row in enumerate(rows):
+                if mapping.text_count(row) != len(parsed_events[k][idx]):
                     self.logger.error(
-                        f"Mismatched key size: {event}. Expecting: {len(event['text'])}. Got: {len(parsed_events[k][idx])}"
+                        f"Mismatched key size: {mapping.entry(row)}. Expecting: {mapping.text_count(row)}. Got: {len(parsed_events[k][idx])}"
                     )
                     return False
-                event["text"] = parsed_events[k][idx]
-                map_events[idx] = event
-            mapping["events"][k] = map_events
-        self.mapped_file.write_bytes(orjson.dumps(mapping, option=orjson.OPT_INDENT_2))
+                mapping.set_text(row, parsed_events[k][idx])
+        self.write_mapped(mapping)
         return True
 
 
 class MapsMVFungler(MVZFungler):
     fungler_type = "maps"
+    config_sections = ("General", "Events")
+    scoped_events = True
+    indexed_commands = True
+    compact_mapping = True
 
-    def apply_maps(self, patch_file: pathlib.Path):
-        old_map = self.original_data
-        if not isinstance(old_map, dict):
+    @property
+    def map_events_data(self):
+        """The original map without the tile `data` array. Enough for mapping."""
+        return self.documents.get(
+            self.original_file, loader=load_map_without_tiles, variant="notiles"
+        )
+
+    def patch_operations(self, mapping, validate=True):
+        if not isinstance(mapping, EntryTable):
+            mapping = EntryTable.from_mapping(mapping, paged=True)
+        for _, evnt_id, page_code_idx, trans in mapping.rows():
+            if self.event_filter is not None and str(evnt_id) not in self.event_filter:
+                continue
+            page_list = ("events", evnt_id, "pages", page_code_idx, "list")
+            yield from self.command_operations(page_list, trans, validate)
+        if self.event_filter is None:
+            yield ("displayName",), mapping.header["name"]
+
+    def read_patch_mapping(self):
+        if not isinstance(self.map_events_data, dict):
             raise Exception("Maps in wrong format?")
-        mapping = self.read_mapped()
-        if not mapping:
-            raise Exception("Mapping missing?")
-        old_events = old_map["events"]
-        for evnt_id, page_maps in mapping["events"].items():
-            evnt_id = int(evnt_id)
+        return self.read_table()
 
-            event_data = old_events[evnt_id]
-            for page_code_idx, page in page_maps.items():
-                page_code_idx = int(page_code_idx)
-                # Get thge current page_data
-                page_data = old_events[evnt_id]["pages"][page_code_idx]
-                for trans in page:
-                    if trans["type"] == "text":
-                        for txt_idx, ptr in enumerate(trans["pointer"]):
-                            if txt_idx == 0 and "101code" in trans["meta"]:
-                                text_event = page_data["list"][ptr]
-                                text_event["parameters"][4] = trans["text"][txt_idx]
-                                page_data["list"][ptr] = text_event
-                            else:
-                                text_event = page_data["list"][ptr]
-                                text_event["parameters"][0] = trans["text"][txt_idx]
-                                page_data["list"][ptr] = text_event
-                    elif trans["type"] == "text_name_change":
-                        ptr = trans["pointer"][0]
-                        text_event = page_data["list"][ptr]
-                        text_event["parameters"][1] = trans["text"][0]
-                        page_data["list"][ptr] = text_event
-                    elif trans["type"] == "text_choice":
-                        # For Code 402
-                        for txt_idx, ptr in enumerate(trans["pointer"][1:]):
-                            text_event = page_data["list"][ptr]
-                            text_event["parameters"][1] = trans["text"][txt_idx]
-                            page_data["list"][ptr] = text_event
-                            # print(events[page_idx], ptr, trans[txt_idx])
-                        # Write back to code 102
-                        text_event = old_events[evnt_id]["pages"][page_code_idx][
-                            "list"
-                        ][trans["pointer"][0]]
-                        text_event["parameters"][0] = trans["text"]
-                        page_data["list"][trans["pointer"][0]] = text_event
-                    elif trans["type"] == "d_text":
-                        d_pointer = trans["pointer"][0]
-                        formatted = trans["meta"].format(DTEXT=trans["text"][0])
-                        txt_event = page_data["list"][d_pointer]
-                        txt_event["parameters"][0] = formatted
-                        page_data["list"][d_pointer] = txt_event
-                    elif trans["type"] == "c12_text":
-                        c12_pointer = trans["pointer"][0]
-                        txt_event = page_data["list"][c12_pointer]
-                        has_wrong_escape = False
-                        for rgx_match in re.finditer("'", trans["text"][0]):
-                            if trans["text"][0][rgx_match.start() - 1] != "\\":
-                                self.logger.warning(
-                                    f"\"{trans['text'][0]}\" does not have an escape sequence for >'<. Refusing to use it."
-                                )
-                                has_wrong_escape = True
-                                break
-                        if not has_wrong_escape:
-                            txt_event["parameters"][4] = f"'{trans['text'][0]}'"
-                            page_data["list"][c12_pointer] = txt_event
-                # Set back the page data
-                old_events[evnt_id]["pages"][page_code_idx] = page_data
-            old_events[evnt_id] = event_data
-        old_map["events"] = old_events
-        old_map["displayName"] = mapping["name"]
-        patch_file.write_bytes(orjson.dumps(old_map, option=orjson.OPT_INDENT_2))
+    def apply_maps(self, patch_file: pathlib.Path):
+        self.apply_plan(patch_file, self.read_patch_mapping)
         return True
 
-        # return super().apply_maps(map_file)
+    def text_units(self):
+        mapping = self.read_table()
+        return None if mapping is None else mapping.texts()
+
+    def string_units(self):
+        mapping = self.read_table()
+        if mapping is None:
+            return None
+        return dict(zip(mapping.ids(self.original_file.stem), mapping.texts()))
+
+    def set_units(self, units):
+        mapping = self.read_table(mutable=True)
+        if mapping is None:
+            return 0
+        count = 0
+        for row, key in enumerate(mapping.ids(self.original_file.stem)):
+            text = units.get(key)
+            if text is not None and text.count("\n") + 1 == mapping.text_count(row):
+                mapping.set_text(row, text.split("\n"))
+                count += 1
+        if count:
+            self.write_mapped(mapping)
+        return count
 
     def export_map(self, format="nested") -> bool:
-        mapping = self.read_mapped()
-        if not mapping:
+        mapping = self.read_table()
+        if mapping is None:
             return False
         if format == "nested":
             # print(self.mapped_file)
             z = {}
-            for evidx, event in mapping["events"].items():
-                events = []
-                for page_idx, page_events in event.items():
-                    # print(page)
-                    # for _, text_data in page:
-                    for event in page_events:
-                        # print(text_data)
-                        events.extend(event["text"])
-                        if event["type"] == "text_choice":
-                            # hack to work around detection of <>
-                            events.append("<>c")
-                        else:
-                            events.append("<>")
-                z[evidx] = events
+            for _, evidx, _, event in mapping.rows():
+                events = z.setdefault(str(evidx), [])
+                events.extend(event["text"])
+                if event["type"] == "text_choice":
+                    # hack to work around detection of <>
+                    events.append("<>c")
+                else:
+                    events.append("<>")
             self.export_nested(z)
             return True
         elif format == "xlsx":
             z = {}
-            for evidx, event in mapping["events"].items():
-                events = []
-                for page_idx, text_data in event.items():
-                    # print(page)
-                    # for _, text_data in page:
-                    for event in events:
-                        # print(text_data)
-                        events.extend(event["text"])
-                        events.append("<>")
-                z[evidx] = events
+            for _, evidx, _, event in mapping.rows():
+                events = z.setdefault(str(evidx), [])
+                events.extend(event["text"])
+                events.append("<>")
             self.export_excel(z)
             return True
+        elif format == "lines":
+            z = {}
+            ids = mapping.ids(self.original_file.stem)
+            for row, evidx, _, event in mapping.rows():
+                if self.export_ids is not None and ids[row] not in self.export_ids:
+                    continue
+                z.setdefault(str(evidx), []).append(
+                    (event["text"], event["type"] == "text_choice", ids[row])
+                )
+            self.export_lines(z)
+            return True
         else:
             raise Exception(f"{format} Not Supported")
 
     def import_map(self, format="nested") -> bool:
-        mapping = self.read_mapped()
+        mapping = self.read_table(mutable=True)
         if mapping is None:
             return False
-        if format == "nested":
-            nesttext_data = self.import_nested(dict)
-            if not nesttext_data:
-                return False
-        elif format == "xlsx":
-            nesttext_data = self.import_excel(dict)
-            if not nesttext_data:
-                return False
-        else:
+        if format not in ("nested", "xlsx", "lines"):
             print(format, "Not Supported.")
             return False
-        parsed_events = {}
-        for event_idx, lines in nesttext_data.items():
-            reconstruct_events = []
-            event_data = []
-            for line in lines:
-                if line.startswith("<>") and len(line) in [2, 3]:
-                    reconstruct_events.append(event_data)
-                    event_data = []
-                else:
-                    event_data.append(line)
-            parsed_events[event_idx] = reconstruct_events
+        parsed_events = self.import_events(format)
+        if not parsed_events:
+            return False
+        if isinstance(parsed_events, KeyedEntries):
+            if not self.import_by_id(mapping, parsed_events):
+                return False
+            self.write_mapped(mapping)
+            return True
 
-        for evidx, map_event in mapping["events"].items():
+        for evidx, rows in mapping.events().items():
+            if self.event_filter is not None and evidx not in self.event_filter:
+                continue
+            if evidx not in parsed_events:
+                self.logger.error(f"Mismatch import for events. Event {evidx} is missing.")
+                self.logger.error(self.export_file.name)
+                return False
             events: list = parsed_events[evidx]
-            # idx = 0
-            for pgidx, page in map_event.items():
-                for idx, text_data in enumerate(page):
-                    if len(events[0]) != len(text_data["text"]):
-                        self.logger.error(
-                            "Mismatch import for events. Text data does not match reconstructed events"
-                        )
-                        self.logger.error(events[0])
-                        self.logger.error(text_data["text"])
-                        self.logger.error(self.export_file.name)
-                        return False
-                    self.logger.debug(f"{text_data['text']} {events[0]}")
-                    text_data["text"] = events[0]
-                    events.pop(0)
-                    page[idx] = text_data
-                    # idx += 1
-                map_event[pgidx] = page
-            mapping["events"][evidx] = map_event
+            # Pages follow each other in the export.
+            for row in rows:
+                if not events:
+                    self.logger.error(
+                        f"Mismatch import for events. Event {evidx} has less entries than the mapping."
+                    )
+                    self.logger.error(self.export_file.name)
+                    return False
+                if len(events[0]) != mapping.text_count(row):
+                    self.logger.error(
+                        "Mismatch import for events. Text data does not match reconstructed events"
+                    )
+                    self.logger.error(events[0])
+                    self.logger.error(mapping.entry(row)["text"])
+                    self.logger.error(self.export_file.name)
+                    return False
+                mapping.set_text(row, events.pop(0))
             if len(events) != 0:
                 self.logger.error("Mismatch import for events.")
                 self.logger.error(len(events))
                 self.logger.error(self.export_file.name)
                 return False
-        self.mapped_file.write_bytes(orjson.dumps(mapping, option=orjson.OPT_INDENT_2))
+        self.write_mapped(mapping)
         return True
 
-    def create_maps(self):
-        mapping = self.read_mapped(create=True)
-        if not mapping:
-            raise Exception("Mapping missing?")
-        mapping["events"] = {}
-        map_data = self.original_data
-        # events = []
+    def command_pages(self):
+        map_data = self.map_events_data
         if not isinstance(map_data, dict):
             raise Exception("Maps in wrong format?")
         for evidx, event in enumerate(
@@ -352,21 +315,40 @@ class MapsMVFungler(MVZFungler):
         ):
             if not event:
                 continue
-            pages = {}
             for idx, page in enumerate(event.get("pages", [])):
                 page_list_data = page.get("list", [])
                 if not page_list_data:
                     continue
                 if page_list_data[0]["code"] == 0:
                     continue
-                page_list_events = self.parse_page_lists(page_list_data)
-                if page_list_events:
-                    pages[str(idx)] = page_list_events
+                yield evidx, idx, page_list_data
+
+    def mapped_page(self, mapping, event_id, page_id):
+        return mapping["events"].get(str(event_id), {}).get(str(page_id), [])
 
-            if pages:
-                mapping["events"][str(evidx)] = pages
-        mapping["name"] = map_data["displayName"]
-        if mapping["events"] or mapping["name"]:
-            self.mapped_file.write_bytes(
-                orjson.dumps(mapping, option=orjson.OPT_INDENT_2)
-            )
+    def set_mapped_page(self, mapping, event_id, page_id, entries):
+        events = mapping["events"]
+        pages = events.get(str(event_id), {})
+        pages[str(page_id)] = entries
+        events[str(event_id)] = {
+            key: pages[key] for key in sorted(pages, key=int) if pages[key]
+        }
+        mapping["events"] = {
+            key: events[key] for key in sorted(events, key=int) if events[key]
+        }
+
+    def create_maps(self):
+        if not self.read_mapped(create=True):
+            raise Exception("Mapping missing?")
+        mapping = EntryTable(paged=True)
+        map_data = self.map_events_data
+        # events = []
+        if not isinstance(map_data, dict):
+            raise Exception("Maps in wrong format?")
+        for evidx, idx, page_list_data in self.command_pages():
+            for text_data in self.parse_page_lists(page_list_data):
+                mapping.append(evidx, idx, text_data)
+        mapping.header = {"type": self.fungler_type, "name": map_data["displayName"]}
+        if len(mapping) or mapping.header["name"]:
+            self.write_mapped(mapping)
+            self.record_spans(mapping)
@@ -0,0 +1,215 @@
+import array
+import re
+import struct
+import typing
+
+import orjson
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Features files start with this.
+MAGIC = b"DFTF"
+_header = struct.Struct("<4sBI")
+
+# Code point ranges (inclusive) matched by `jp_rgx`: Kanji, Hiragana, Katakana and the prolonged sound mark.
+JAPANESE_RANGES = ((0x4E00, 0x9FA0), (0x3041, 0x3094), (0x30A1, 0x30F4), (0x30FC, 0x30FC))
+# Characters that make a backslash a control code. (\V[n], \N[n], \C[n], \G, \{, \., \|, \! ...)
+ESCAPE_SYMBOLS = "{}\\$.|!<>^"
+
+_japanese = re.compile(
+    "[" + "".join(f"{chr(start)}-{chr(end)}" for start, end in JAPANESE_RANGES) + "]"
+)
+_escape = re.compile(r"\\[A-Za-z" + re.escape(ESCAPE_SYMBOLS) + "]")
+_escape_points = [ord(char) for char in "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz" + ESCAPE_SYMBOLS]
+
+
+class TextFeatures:
+    version = 1
+    # Columns in file order, with their array typecode.
+    columns = (
+        ("japanese", "I"),
+        ("characters", "I"),
+        ("lines", "I"),
+        ("max_line", "I"),
+        ("escapes", "I"),
+    )
+
+    def __init__(self, digest: typing.Optional[str] = None) -> None:
+        """Text features of the strings of a mapping, one row per string. (See `MVZFungler.text_units`)
+
+        - `japanese`: Japanese characters (Kanji, Kana and ー, as `jp_rgx` matches them)
+        - `characters`: Characters that are not line breaks
+        - `lines`: Line count
+        - `max_line`: Length of the longest line
+        - `escapes`: Control codes (A backslash followed by a letter or one of `ESCAPE_SYMBOLS`)
+
+        Args:
+            digest (typing.Optional[str], optional): Digest of the mapping the strings come from. Defaults to None.
+        """
+        self.digest = digest
+        for name, typecode in self.columns:
+            setattr(self, name, array.array(typecode))
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def has_japanese(self, idx: int) -> bool:
+        return self.japanese[idx] > 0
+
+    def japanese_ratio(self, idx: int) -> float:
+        return self.japanese[idx] / self.characters[idx] if self.characters[idx] else 0.0
+
+    def has_escapes(self, idx: int) -> bool:
+        return self.escapes[idx] > 0
+
+    def row(self, idx: int) -> typing.Dict[str, typing.Any]:
+        return {
+            "has_japanese": self.has_japanese(idx),
+            "japanese_ratio": self.japanese_ratio(idx),
+            "lines": self.lines[idx],
+            "max_line": self.max_line[idx],
+            "has_escapes": self.has_escapes(idx),
+        }
+
+    def slice(self, start: int, end: int, digest: typing.Optional[str] = None) -> "TextFeatures":
+        features = TextFeatures(digest)
+        for name, _ in self.columns:
+            setattr(features, name, getattr(self, name)[start:end])
+        return features
+
+    def summary(self) -> typing.Dict[str, int]:
+        return {
+            "strings": len(self),
+            "japanese": sum(1 for count in self.japanese if count),
+            "escapes": sum(1 for count in self.escapes if count),
+            "max_line": max(self.max_line, default=0),
+        }
+
+    def to_bytes(self) -> bytes:
+        header = orjson.dumps({"digest": self.digest, "count": len(self)})
+        return b"".join(
+            [_header.pack(MAGIC, self.version, len(header)), header]
+            + [getattr(self, name).tobytes() for name, _ in self.columns]
+        )
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "TextFeatures":
+        if len(raw) < _header.size:
+            raise ValueError("Not a features file.")
+        magic, version, header_size = _header.unpack_from(raw)
+        if magic != MAGIC or version != cls.version:
+            raise ValueError("Not a features file.")
+        offset = _header.size
+        header = orjson.loads(raw[offset : offset + header_size])
+        offset += header_size
+        features = cls(header["digest"])
+        for name, typecode in cls.columns:
+            column = array.array(typecode)
+            end = offset + header["count"] * column.itemsize
+            column.frombytes(raw[offset:end])
+            setattr(features, name, column)
+            offset = end
+        return features
+
+
+def _analyze_python(strings: typing.Sequence[str]) -> TextFeatures:
+    features = TextFeatures()
+    for string in strings:
+        lines = string.split("\n")
+        features.japanese.append(len(_japanese.findall(string)))
+        features.characters.append(len(string) - len(lines) + 1)
+        features.lines.append(len(lines))
+        features.max_line.append(max(map(len, lines)))
+        features.escapes.append(len(_escape.findall(string)))
+    return features
+
+
+# Code point (up to U+FFFF) -> flags. Everything above is none of these.
+_JAPANESE, _BACKSLASH, _NEWLINE, _ESCAPED = 1, 2, 4, 8
+
+
+def _flag_table():
+    table = numpy.zeros(0x10000, dtype=numpy.uint8)
+    for start, end in JAPANESE_RANGES:
+        table[start : end + 1] |= _JAPANESE
+    table[0x5C] |= _BACKSLASH
+    table[0x0A] |= _NEWLINE
+    table[_escape_points] |= _ESCAPED
+    return table
+
+
+_flags = _flag_table() if numpy is not None else None
+
+
+def _analyze_numpy(strings: typing.Sequence[str]) -> TextFeatures:
+    count = len(strings)
+    if not count:
+        return TextFeatures()
+    lengths = numpy.fromiter(map(len, strings), dtype=numpy.int64, count=count)
+    ends = numpy.cumsum(lengths)
+    starts = ends - lengths
+    filled = numpy.flatnonzero(lengths)
+    # Every string's code points, back to back, looked up in the flag table.
+    points = numpy.frombuffer("".join(strings).encode("utf-32-le"), dtype=numpy.uint32)
+    flags = _flags.take(numpy.minimum(points, 0xFFFF))
+
+    japanese = numpy.zeros(count, dtype=numpy.uint32)
+    if len(filled):
+        # Empty strings have nothing to add. Every other segment starts at its own string.
+        japanese[filled] = numpy.add.reduceat(flags & _JAPANESE, starts[filled], dtype=numpy.uint32)
+
+    # Line breaks and backslashes are rare. Work on their positions only.
+    newline_at = numpy.flatnonzero(flags & _NEWLINE)
+    newline_owner = numpy.searchsorted(ends, newline_at, side="right")
+    breaks = numpy.bincount(newline_owner, minlength=count)
+
+    # A control code is a backslash and the character after it, in the same string. In a run of backslashes
+    # a pair of backslashes is taken first, so only backslashes at an even offset into their run can start one.
+    backslash_at = numpy.flatnonzero(flags & _BACKSLASH)
+    owner = numpy.searchsorted(ends, backslash_at, side="right")
+    run_start = numpy.ones(len(backslash_at), dtype=bool)
+    run_start[1:] = (backslash_at[1:] != backslash_at[:-1] + 1) | (owner[1:] != owner[:-1])
+    run_from = backslash_at[
+        numpy.maximum.accumulate(numpy.where(run_start, numpy.arange(len(backslash_at)), 0))
+    ]
+    follows = backslash_at + 1
+    escape = ((backslash_at - run_from) % 2 == 0) & (follows < ends[owner])
+    escape[escape] = (flags[follows[escape]] & _ESCAPED) > 0
+    escapes = numpy.bincount(owner[escape], minlength=count)
+
+    # Every line ends on a line break or at the end of its string. Sort the line ends by string, then position.
+    line_ends = numpy.concatenate([newline_at, ends])
+    owners = numpy.concatenate([newline_owner, numpy.arange(count)])
+    order = numpy.lexsort((line_ends, owners))
+    line_ends, owners = line_ends[order], owners[order]
+    first = numpy.ones(len(owners), dtype=bool)
+    first[1:] = owners[1:] != owners[:-1]
+    line_starts = numpy.empty_like(line_ends)
+    line_starts[first] = starts
+    line_starts[~first] = line_ends[numpy.flatnonzero(~first) - 1] + 1
+    max_line = numpy.maximum.reduceat(line_ends - line_starts, numpy.flatnonzero(first))
+
+    features = TextFeatures()
+    for name, values in [
+        ("japanese", japanese),
+        ("characters", lengths - breaks),
+        ("lines", breaks + 1),
+        ("max_line", max_line),
+        ("escapes", escapes),
+    ]:
+        setattr(features, name, array.array("I", values.astype(numpy.uint32).tobytes()))
+    return features
+
+
+def analyze(strings: typing.Sequence[str]) -> TextFeatures:
+    """Computes the `TextFeatures` of many strings at once.
+
+    With numpy, all strings are checked in a few vectorized passes over their joined code points.
+    Without it, each string is checked with regexes. Both give the same features.
+    """
+    if numpy is None:
+        return _analyze_python(strings)
+    return _analyze_numpy(strings)
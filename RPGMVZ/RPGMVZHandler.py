@@ -1,16 +1,60 @@
+import fnmatch
 import logging
 import pathlib
 import shutil
+import time
 import typing
+import nestedtext
 import orjson
 
-from .RPGMVZItems import ItemMVFungler
-from .RPGMVZEnemy import EnemyMVFungler
+from .RPGMVZDatabase import (
+    ActorMVFungler,
+    ClassesMVFungler,
+    EnemyMVFungler,
+    ItemMVFungler,
+    MapInfosMVFungler,
+    SkillsMVfungler,
+    StatesMVFungler,
+    TroopsMVFungler,
+)
 from .RPGMVZEvents import CommonEventMVFungler, MapsMVFungler
 from .RPGMVZSystem import SystemMVfungler
-from .RPMMVZActors import ActorMVFungler
-from .RPGMVZClasses import ClassesMVFungler
-from .RPMMVZSkills import SkillsMVfungler
+from .RPGMVZBase import EXCEL_COLUMNS, MVZFungler
+from .RPGMVZBuild import BuildGraph, config_digest
+from .RPGMVZCache import DocumentCache
+from .RPGMVZCommands import affected_codes, command_config, decoder_config
+from .RPGMVZFeatures import analyze
+from .RPGMVZIndex import CommandIndex
+from .RPGMVZJobs import run_units
+from .RPGMVZManifest import ProjectManifest
+from .RPGMVZMirror import GameMirror
+from .RPGMVZPages import PageCache
+from .RPGMVZPipeline import pipeline
+from .RPGMVZScan import load_map_without_tiles
+from .RPGMVZStore import FileStore, MappingStore, SQLiteStore
+from .RPGMVZWatch import FolderWatcher
+from .RPGMVZXlsx import XlsxReader, XlsxStream, pick_texts
+
+funglers: typing.Dict[str, typing.Type[MVZFungler]] = {
+    cls.__name__: cls
+    for cls in (
+        ActorMVFungler,
+        ItemMVFungler,
+        EnemyMVFungler,
+        CommonEventMVFungler,
+        ClassesMVFungler,
+        SkillsMVfungler,
+        MapsMVFungler,
+        SystemMVfungler,
+        StatesMVFungler,
+        TroopsMVFungler,
+        MapInfosMVFungler,
+    )
+}
+
+# Export format -> suffix of the export files.
+# `delta` is a lines export of the strings that are new or changed since the last export. (See `MVZHandler.export`)
+export_suffixes = {"nested": ".nt.txt", "lines": ".lines.txt", "xlsx": ".xlsx", "delta": ".delta.lines.txt"}
 
 
 class MVZHandler:
@@ -23,6 +67,16 @@ class MVZHandler:
         self.game_type = self.config["General"].get("type", "MV")
         self.logger = logging.getLogger("MVZ|Handler")
         self._project_folders: typing.Optional[typing.Dict] = None
+        self._manifest: typing.Optional[ProjectManifest] = None
+        self._data_files: typing.Optional[typing.List[pathlib.Path]] = None
+        self._build: typing.Optional[BuildGraph] = None
+        self._pages: typing.Optional[PageCache] = None
+        self._commands: typing.Optional[CommandIndex] = None
+        self._store: typing.Optional[MappingStore] = None
+        self._config_digests: typing.Dict[typing.Tuple[str, ...], str] = {}
+        self.documents = DocumentCache(
+            int(self.config["General"].get("document_cache_mb", 256)) * 1024 * 1024
+        )
 
     @property
     def game_folder(self):
@@ -74,10 +128,26 @@ class MVZHandler:
             return {}
         return self._project_folders
 
-    def resolve_file(
-        self, orig_file: pathlib.Path, map_file: pathlib.Path, export_file: pathlib.Path
-    ):
-        content = orjson.loads(orig_file.read_bytes())
+    def classify(
+        self, orig_file: pathlib.Path, raw: bytes
+    ) -> typing.Optional[str]:
+        """Works out which fungler handles a data file.
+
+        Args:
+            orig_file (pathlib.Path): The game's data file.
+            raw (bytes): The content of the file.
+
+        Returns:
+            typing.Optional[str]: The fungler's class name. None if the file is not handled.
+        """
+        if orig_file.name.startswith("Map"):
+            # Maps only need their events. Skip the tile data.
+            content = load_map_without_tiles(raw)
+            self.documents.put(orig_file, content, len(raw), variant="notiles")
+        else:
+            content = orjson.loads(raw)
+            # Keep it around for the fungler.
+            self.documents.put(orig_file, content, len(raw))
         # print("[Check]", file_url.name)
         if isinstance(content, list):
             if len(content) < 2:
@@ -87,48 +157,73 @@ class MVZHandler:
             weapon_tests = ["description", "name", "note"]
             # event_tests = ["characterIndex", "characterName", "name", "note", "profile"]
             if sum([act_test in actor_tests for act_test in item]) == len(actor_tests):
-                return ActorMVFungler(orig_file, map_file, export_file, self.config)
+                return ActorMVFungler.__name__
             if (
                 sum([weapon_test in weapon_tests for weapon_test in item])
                 == len(weapon_tests)
                 and "weapon" in orig_file.name.lower()
             ):
-                return ItemMVFungler(orig_file, map_file, export_file, self.config)
+                return ItemMVFungler.__name__
             if (
                 sum([weapon_test in weapon_tests for weapon_test in item])
                 == len(weapon_tests)
                 and "item" in orig_file.name.lower()
             ):
-                return ItemMVFungler(orig_file, map_file, export_file, self.config)
+                return ItemMVFungler.__name__
             if (
                 sum([weapon_test in weapon_tests for weapon_test in item])
                 == len(weapon_tests)
                 and "armors" in orig_file.name.lower()
             ):
-                return ItemMVFungler(orig_file, map_file, export_file, self.config)
+                return ItemMVFungler.__name__
             if "enemies" in orig_file.name.lower():
-                return EnemyMVFungler(orig_file, map_file, export_file, self.config)
+                return EnemyMVFungler.__name__
             if "commonevents" in orig_file.name.lower():
-                return CommonEventMVFungler(
-                    orig_file, map_file, export_file, self.config
-                )
+                return CommonEventMVFungler.__name__
             if "classes" in orig_file.name.lower():
-                return ClassesMVFungler(
-                    orig_file, map_file, export_file, self.config
-                )
+                return ClassesMVFungler.__name__
             if "skills" in orig_file.name.lower():
-                return SkillsMVfungler(
-                    orig_file, map_file, export_file, self.config
-                )
+                return SkillsMVfungler.__name__
+            if "states" in orig_file.name.lower():
+                return StatesMVFungler.__name__
+            if "troops" in orig_file.name.lower():
+                return TroopsMVFungler.__name__
+            if "mapinfos" in orig_file.name.lower():
+                return MapInfosMVFungler.__name__
 
             # else:
             #     print()
         elif isinstance(content, dict):
             if "Map" in orig_file.name and content.get("events"):
-                return MapsMVFungler(orig_file, map_file, export_file, self.config)
+                return MapsMVFungler.__name__
             if content.get("armorTypes"):
-                return SystemMVfungler(orig_file, map_file, export_file, self.config)
+                return SystemMVfungler.__name__
         # Events stuff
+        return None
+
+    def resolve_file(
+        self, orig_file: pathlib.Path, map_file: pathlib.Path, export_file: pathlib.Path
+    ) -> typing.Optional[MVZFungler]:
+        entry = self.manifest.resolve(orig_file, self.classify)
+        if not entry["fungler"]:
+            return None
+        return funglers[entry["fungler"]](
+            orig_file,
+            map_file,
+            export_file,
+            self.config,
+            documents=self.documents,
+            pages=self.pages,
+            store=self.store,
+        )
+
+    @property
+    def manifest(self) -> ProjectManifest:
+        if self._manifest is None:
+            self._manifest = ProjectManifest(
+                self.game_folder["tl_root"] / "manifest.json", self.game_folder["data"]
+            )
+        return self._manifest
 
     @property
     def mapping_files(
@@ -139,7 +234,7 @@ class MVZHandler:
         if not self.game_folder:
             return []
         tl_folder = self.game_folder["tl_root"] / "data"
-        for json_file in self.game_folder["data"].rglob("*.json"):
+        for json_file in self.data_files:
             rel = json_file.relative_to(self.game_folder["data"])
             map_file = tl_folder / rel
             yield map_file
@@ -154,37 +249,251 @@ class MVZHandler:
             return []
         export_folder = self.game_folder["export"] / "data"
         # export_folder = export_folder / rel
-        for json_file in self.game_folder["data"].rglob("*.json"):
+        for json_file in self.data_files:
             rel = json_file.relative_to(self.game_folder["data"])
             export_file = (export_folder / rel).with_suffix(".nt.txt")
             yield export_file
 
-    def create_maps(self, replace: bool = False):
-        # folders:typing.Dict[str, pathlib.Path], config_dict
+    @property
+    def data_files(self) -> typing.List[pathlib.Path]:
+        """All json files in the game's data folder, in a stable order.
+
+        The folder is only scanned once per handler.
+        """
         if not self.game_folder:
-            return
+            return []
+        if self._data_files is None:
+            self._data_files = sorted(self.game_folder["data"].rglob("*.json"))
+        return self._data_files
+
+    @property
+    def build(self) -> BuildGraph:
+        if self._build is None:
+            self._build = BuildGraph(
+                self.game_folder["tl_root"] / "build.json", self.game_folder["tl_root"]
+            )
+        return self._build
+
+    @property
+    def commands(self) -> CommandIndex:
+        if self._commands is None:
+            self._commands = CommandIndex(self.game_folder["tl_root"] / "commands.json")
+        return self._commands
+
+    @property
+    def store(self) -> MappingStore:
+        """Where the mappings are kept. Files in `tl_workspace/data` unless `store = "sqlite"` is set."""
+        if self._store is None:
+            store = self.config["General"].get("store", "files")
+            if store == "sqlite":
+                self._store = SQLiteStore(
+                    self.game_folder["tl_root"] / "project.db",
+                    self.game_folder["tl_root"] / "data",
+                )
+            elif store == "files":
+                self._store = FileStore(
+                    self.documents, self.config["General"].get("mapping_format", "json")
+                )
+            else:
+                raise Exception(f"Unknown store: {store}. Expected one of [files, sqlite]")
+        return self._store
+
+    def mapping_digest(self, map_file: pathlib.Path) -> typing.Optional[str]:
+        """Build input for a mapping. None if there is no mapping."""
+        if self.store.digest_files:
+            return self.build.digest(map_file)
+        return self.store.digest(map_file)
+
+    @property
+    def pages(self) -> typing.Optional[PageCache]:
+        """Decoded event pages shared by every map in the project. None unless `page_cache` is set.
+
+        Persisted if `persist_page_cache` is also set.
+        """
+        if self._pages is None and self.config["General"].get("page_cache", False):
+            cache_file = None
+            if self.config["General"].get("persist_page_cache", False):
+                cache_file = self.game_folder["tl_root"] / "pages.json"
+            self._pages = PageCache(cache_file)
+        return self._pages
+
+    def build_inputs(self, cls: MVZFungler, **files: pathlib.Path) -> typing.Dict[str, typing.Any]:
+        """The input hashes for a data file: the original json, the config sections its fungler uses and any project files passed in."""
+        rel = self.manifest.rel(cls.original_file)
+        sections = tuple(cls.config_sections)
+        if sections not in self._config_digests:
+            self._config_digests[sections] = config_digest(self.config, sections)
+        inputs = {
+            "orig": self.manifest.entries[rel]["hash"],
+            "config": self._config_digests[sections],
+        }
+        if cls.mapping_version is not None:
+            inputs["version"] = cls.mapping_version
+        for name, path in files.items():
+            # `map` is the mapping, which may not be a file. (See `mapping_digest`)
+            inputs[name] = self.mapping_digest(path) if name == "map" else self.build.digest(path)
+        return inputs
+
+    def _stage_unit(self, json_file: pathlib.Path, stage: str, *args):
+        getattr(self, stage)(json_file, *args)
+        return {
+            "manifest": self.manifest.pop_changes(),
+            "build": self.build.pop_changes(),
+            "pages": self.pages.pop_changes() if self.pages else None,
+            "commands": self.commands.pop_changes(),
+        }
+
+    def select_files(
+        self, only: typing.Optional[typing.List[str]] = None
+    ) -> typing.List[pathlib.Path]:
+        """Data files matching any of the `only` patterns. All data files if there are none.
+
+        A pattern is a file name (`Map012.json`), a path relative to the data folder or a glob of either (`Map01*.json`).
+        Globs are plain `fnmatch` patterns: `Map*.json` also matches `MapInfos.json`. `Map[0-9]*.json` only matches maps.
+        """
+        if not only:
+            return self.data_files
+        selected = []
+        for json_file in self.data_files:
+            rel = self.manifest.rel(json_file)
+            if any(
+                fnmatch.fnmatchcase(json_file.name, pattern)
+                or fnmatch.fnmatchcase(rel, pattern)
+                for pattern in only
+            ):
+                selected.append(json_file)
+        if not selected:
+            self.logger.warning(f"No data files match: {', '.join(only)}")
+        return selected
+
+    def run_stage(
+        self,
+        stage: str,
+        *args,
+        jobs: int = 1,
+        files: typing.Optional[typing.List[pathlib.Path]] = None,
+    ):
+        """Runs a per-file stage method over the data files and saves the manifest and build graph afterwards.
+
+        Runs over every data file unless `files` is given.
+        """
+        if files is None:
+            files = self.data_files
+            self.manifest.retain(self.manifest.rel(json_file) for json_file in files)
+        for report in run_units(
+            self._stage_unit, files, jobs, self.logger, stage, *args
+        ):
+            if report:
+                self.manifest.update(report["manifest"])
+                self.build.update(report["build"])
+                if report["pages"]:
+                    self.pages.update(report["pages"])
+                self.commands.update(report["commands"])
+        self.manifest.save()
+        self.build.save()
+        self.commands.save()
+        if self.pages:
+            self.pages.save()
+
+    def _map_file(self, json_file: pathlib.Path, replace: bool, force: bool):
         tl_folder = self.game_folder["tl_root"] / "data"
         export_folder = self.game_folder["export"]
-        for json_file in self.game_folder["data"].rglob("*.json"):
-            rel = json_file.relative_to(self.game_folder["data"])
+        rel = json_file.relative_to(self.game_folder["data"])
 
-            map_file = tl_folder / rel
-            export_file = (export_folder / rel).with_suffix(".nt.txt")
-            cls = self.resolve_file(json_file, map_file, export_file)
-            if cls:
-                self.logger.debug(f"Dumping: {rel.name}")
-                if not (tl_folder / rel).parent.exists():
-                    (tl_folder / rel).parent.mkdir(parents=True, exist_ok=True)
-                # print( (tl_folder / rel).exists())
-                if (tl_folder / rel).exists():
-                    if not replace:
-                        self.logger.debug(f"Skip dump for: {rel.name}")
-                        continue
-                    else:
-                        cls.create_maps()
-                else:
-                    cls.create_maps()
+        map_file = tl_folder / rel
+        export_file = (export_folder / rel).with_suffix(".nt.txt")
+        cls = self.resolve_file(json_file, map_file, export_file)
+        if cls:
+            self.logger.debug(f"Dumping: {rel.name}")
+            if not (tl_folder / rel).parent.exists():
+                (tl_folder / rel).parent.mkdir(parents=True, exist_ok=True)
+            inputs = self.build_inputs(cls)
+            # print( (tl_folder / rel).exists())
+            if self.store.exists(map_file) and not force and not replace:
+                if not self.build.has_state("map", rel.as_posix()) and not cls.mapping_outdated():
+                    # Mapped before the build graph existed. Keep it unless it is in an old layout.
+                    self.build.mark("map", rel.as_posix(), inputs, map_file)
+                if self.build.is_current("map", rel.as_posix(), inputs, map_file):
+                    self.logger.debug(f"Skip dump for: {rel.name}")
+                    return
+                if self._refresh_map(cls, rel.as_posix(), inputs):
+                    self.build.mark("map", rel.as_posix(), inputs, map_file)
+                    return
+                self.logger.warning(
+                    f"Mapping for {rel.name} is out of date. Use --overwrite to remap it."
+                )
+                return
+            # Remapping keeps the translations of strings whose source is unchanged. (See `keep_translations`)
+            units, sources = None, None
+            if self.store.exists(map_file):
+                units, sources = cls.string_units(), cls.read_sources()
+            cls.create_maps()
+            cls.record_sources()
+            if units:
+                kept = cls.keep_translations(units, sources)
+                if kept:
+                    self.logger.info(f"Kept {kept} translated strings of {rel.name}")
+            self.build.mark("map", rel.as_posix(), inputs, map_file)
+            if cls.indexed_commands:
+                self.commands.record(
+                    rel.as_posix(),
+                    inputs["orig"],
+                    decoder_config(self.config),
+                    cls.locate_commands(frozenset(command_config)),
+                )
+
+    def _refresh_map(self, cls: MVZFungler, rel: str, inputs: typing.Dict[str, typing.Any]) -> bool:
+        """Brings a mapping up to date with the `[Events]` config by decoding only the pages the change affects.
+
+        Only possible when the original file is unchanged since it was indexed. Translations already imported are kept.
+
+        Returns:
+            bool: True if the mapping is up to date.
+        """
+        if not cls.indexed_commands:
+            return False
+        record = self.commands.get(rel)
+        if not record or record["orig"] != inputs["orig"]:
+            return False
+        config = decoder_config(self.config)
+        codes = affected_codes(record["config"], config)
+        if codes is None:
+            return False
+        pages = self.commands.pages(rel, codes)
+        if pages:
+            if not cls.refresh_commands(pages):
+                return False
+            cls.record_sources(keep=True)
+            self.logger.info(
+                f"Refreshed {len(pages)} pages of {cls.original_file.name} for codes {sorted(codes)}"
+            )
+        self.commands.record(rel, record["orig"], config, record["codes"])
+        return True
+
+    def create_maps(self, replace: bool = False, jobs: int = 1, force: bool = False):
+        """Creates the mappings for the game's data files.
+
+        Without `replace` or `force`, existing mappings are kept. Ones whose original file or config sections changed
+        since they were mapped are refreshed when only `[Events]` options changed, and reported as out of date otherwise.
+        `replace` (`--overwrite`) recreates every mapping, as does `force`.
+        """
+        # folders:typing.Dict[str, pathlib.Path], config_dict
+        if not self.game_folder:
+            return
+        self.run_stage("_map_file", replace, force, jobs=jobs)
+        self._log_pages()
+        self._dump_scripts(replace)
 
+    def _log_pages(self):
+        if not self.pages:
+            return
+        stats = self.pages.stats
+        if stats["decoded"] or stats["duplicates"]:
+            self.logger.info(
+                f"Event pages: {stats['decoded']} decoded, {stats['duplicates']} duplicates reused"
+            )
+
+    def _dump_scripts(self, replace: bool):
         tl_folder = self.game_folder["tl_root"] / "script"
         for script_file in self.game_folder["scripts"].rglob("*.js"):
             rel = script_file.relative_to(self.game_folder["scripts"])
@@ -204,113 +513,378 @@ class MVZHandler:
         # Marking folder / I hope someone doesn't delete this...
         (self.game_folder["tl_root"] / ".TLPROJECT").touch()
 
-    def export(self, replace: bool = False,format:str="nested"):
-        """Exports the translatable components into the project folder"""
+    def _export_file(
+        self, json_file: pathlib.Path, replace: bool, format: str, force: bool
+    ):
+        tl_folder = self.game_folder["tl_root"] / "data"
+        export_folder = self.game_folder["export"] / "data"
+        rel = json_file.relative_to(self.game_folder["data"])
+
+        map_file = tl_folder / rel
+        export_file: pathlib.Path = export_folder / rel
+        if format in export_suffixes:
+            export_file = export_file.with_suffix(export_suffixes[format])
+        cls = self.resolve_file(json_file, map_file, export_file)
+        if cls:
+            if self.store.exists(map_file) and replace:
+                pass
+                # logger.info(f"Skip dump for: {rel.name}")
+            elif format == "delta":
+                if self.store.exists(map_file):
+                    self._export_delta(cls, rel)
+            else:
+                inputs = {"map": self.mapping_digest(map_file)}
+                stage = f"export:{format}"
+                if not force and self.build.is_current(
+                    stage, rel.as_posix(), inputs, export_file
+                ):
+                    self.logger.debug(f"Export up to date: {rel.name}")
+                    return
+                self.logger.info(f"Exporting: {rel.name}")
+                if not (export_folder / rel).parent.exists():
+                    (export_folder / rel).parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    if self.store.exists(map_file):
+                        cls.export_map(format=format)
+                        self.build.mark(stage, rel.as_posix(), inputs, export_file)
+                        cls.record_export()
+                        if format == "nested":
+                            orig_export = export_file.with_suffix(".ORIG.nt.txt")
+                            if export_file.exists() and not orig_export.exists():
+                                self.logger.info("Creating original copy...")
+                                shutil.copy(export_file, orig_export)
+                except NotImplementedError:
+                    self.logger.warning(f"TODO: {rel.name}")
+
+    def _export_delta(self, cls: MVZFungler, rel: pathlib.Path):
+        ids = cls.delta_ids()
+        if ids is None and cls.string_units() is None:
+            self.logger.debug(f"No string IDs for {rel.name}. Skipped.")
+            return
+        if ids is None:
+            self.logger.warning(
+                f"No source text recorded for {rel.name}. Exporting every string. Map it again with --overwrite to export changes only."
+            )
+        elif not ids:
+            # An older delta would otherwise be imported again over edits made since.
+            if cls.export_file.exists():
+                cls.export_file.unlink()
+                self.logger.info(f"No new strings: {rel.name}. Removed its old delta export.")
+            else:
+                self.logger.info(f"No new strings: {rel.name}")
+            return
+        self.logger.info(f"Exporting: {rel.name}" if ids is None else f"Exporting {len(ids)} strings of {rel.name}")
+        cls.export_file.parent.mkdir(parents=True, exist_ok=True)
+        cls.export_ids = ids
+        try:
+            if cls.export_map(format="lines"):
+                cls.record_export()
+        except NotImplementedError:
+            self.logger.warning(f"TODO: {rel.name}")
+        finally:
+            cls.export_ids = None
+
+    def export(
+        self,
+        replace: bool = False,
+        format: str = "nested",
+        jobs: int = 1,
+        force: bool = False,
+    ):
+        """Exports the translatable components into the project folder
+
+        Files whose mapping did not change since the last export are skipped unless `force` is set.
+
+        The `delta` format only exports the strings whose source text is new or changed since the file was last
+        exported (in any format), as a lines export with string IDs. Import it with `import_maps(format="delta")`.
+        """
         if not self.game_folder:
             return
+        self.run_stage("_export_file", replace, format, force, jobs=jobs)
+
+    def export_workbook(
+        self, only: typing.Optional[typing.List[str]] = None
+    ) -> typing.Optional[pathlib.Path]:
+        """Exports every mapping as one sheet of a single `export/project.xlsx`, after an `Index` sheet listing the files.
+
+        The workbook is streamed one sheet at a time, so only the mapping being exported is kept in memory.
+
+        Returns:
+            typing.Optional[pathlib.Path]: The workbook. None if there is no game folder.
+        """
+        if not self.game_folder:
+            return None
         tl_folder = self.game_folder["tl_root"] / "data"
         export_folder = self.game_folder["export"] / "data"
-        for json_file in self.game_folder["data"].rglob("*.json"):
-            rel = json_file.relative_to(self.game_folder["data"])
+        workbook_file = self.game_folder["export"] / "project.xlsx"
+        workbook_file.parent.mkdir(parents=True, exist_ok=True)
+        index = []
+        with XlsxStream(workbook_file) as workbook:
+            for json_file in self.select_files(only):
+                rel = json_file.relative_to(self.game_folder["data"])
+                cls = self.resolve_file(
+                    json_file, tl_folder / rel, (export_folder / rel).with_suffix(".xlsx")
+                )
+                if not cls or not self.store.exists(cls.mapped_file):
+                    continue
+                cls.workbook = workbook
+                sheets = len(workbook.sheets)
+                try:
+                    cls.export_map(format="xlsx")
+                except NotImplementedError:
+                    self.logger.warning(f"TODO: {rel.name}")
+                    continue
+                if len(workbook.sheets) > sheets:
+                    name, rows = workbook.sheets[-1]
+                    # The header is not a row of text.
+                    index.append([name, rel.as_posix(), rows - 1])
+            sheet = workbook.add_sheet("Index", position=0)
+            sheet.write_row(["Sheet", "File", "Rows"])
+            sheet.write_rows(index)
+        self.logger.info(f"Exported {len(index)} files to {workbook_file}")
+        self.manifest.save()
+        return workbook_file
 
-            map_file = tl_folder / rel
-            export_file: pathlib.Path = export_folder / rel
-            if format == "xlsx":
-                export_file = export_file.with_suffix(".xlsx")
-            elif format == "nested":
-                export_file = export_file.with_suffix(".nt.txt")
-            cls = self.resolve_file(json_file, map_file, export_file)
-            if cls:
-                if (tl_folder / rel).exists() and replace:
-                    pass
-                    # logger.info(f"Skip dump for: {rel.name}")
-                else:
-                    self.logger.info(f"Exporting: {rel.name}")
-                    if not (export_folder / rel).parent.exists():
-                        (export_folder / rel).parent.mkdir(parents=True, exist_ok=True)
-                    try:
-                        if map_file.exists():
-                            cls.export_map(format=format)
-                            if format == "nested":
-                                orig_export = export_file.with_suffix(".ORIG.nt.txt")
-                                if export_file.exists() and not orig_export.exists():
-                                    self.logger.info("Creating original copy...")
-                                    shutil.copy(export_file, orig_export)
-                    except NotImplementedError:
-                        self.logger.warning(f"TODO: {rel.name}")
-
-    def import_maps(self):
-        """imports the translatable components into the project folder"""
+    def _import_file(
+        self,
+        json_file: pathlib.Path,
+        force: bool,
+        events: typing.Optional[typing.List[int]] = None,
+        format: str = "nested",
+    ) -> bool:
+        tl_folder = self.game_folder["tl_root"] / "data"
+        export_folder = self.game_folder["export"] / "data"
+        rel = json_file.relative_to(self.game_folder["data"])
+
+        map_file = tl_folder / rel
+        export_file: pathlib.Path = export_folder / rel
+        export_file = export_file.with_suffix(export_suffixes[format])
+        cls = self.resolve_file(json_file, map_file, export_file)
+        if cls and not self.scope_events(cls, events):
+            return False
+        if cls:
+            if (export_file).exists():
+                inputs = self.build_inputs(cls, map=map_file, export=export_file)
+                if not force and self.build.is_current(
+                    "import", rel.as_posix(), inputs, map_file
+                ):
+                    self.logger.debug(f"Import up to date: {rel.name}")
+                    return True
+                stage = f"export:{format}"
+                if (
+                    not force
+                    and self.build.output_unchanged(stage, rel.as_posix(), export_file)
+                    and not self.build.is_current(stage, rel.as_posix(), {"map": inputs["map"]}, export_file)
+                ):
+                    # Written from an older mapping and never edited. (e.g. the mapping was imported from the workbook since)
+                    self.logger.info(
+                        f"Skipped {export_file.name}: it is older than its mapping and was not edited. Export it again or use --force."
+                    )
+                    return True
+                try:
+                    if cls.import_map(format="lines" if format == "delta" else format):
+                        if cls.event_filter is not None:
+                            # Only part of the export made it into the mapping. Leave the build state alone.
+                            return True
+                        mapped = {"map": self.mapping_digest(map_file)}
+                        self.build.mark("import", rel.as_posix(), {**inputs, **mapped}, map_file)
+                        if cls.partial_import or format == "delta":
+                            # The mapping holds more than the export did. It still has to be exported again.
+                            return True
+                        # The export is what the mapping now holds. No need to export it again.
+                        self.build.mark(f"export:{format}", rel.as_posix(), mapped, export_file)
+                        return True
+                except NotImplementedError:
+                    self.logger.warning(f"TODO: {rel.name}")
+        return False
+
+    def import_maps(
+        self,
+        jobs: int = 1,
+        force: bool = False,
+        only: typing.Optional[typing.List[str]] = None,
+        events: typing.Optional[typing.List[int]] = None,
+        format: str = "nested",
+    ):
+        """imports the translatable components into the project folder
+
+        Files whose export and mapping did not change since the last import are skipped unless `force` is set.
+
+        Args:
+            only (typing.Optional[typing.List[str]], optional): Only import data files matching these names or globs. Defaults to None.
+            events (typing.Optional[typing.List[int]], optional): Only import these event IDs of maps and common events. Other files are skipped. Defaults to None.
+            format (str, optional): Export format to import from. `nested` (.nt.txt), `lines` (.lines.txt), `delta` (.delta.lines.txt) or `xlsx`. Defaults to "nested".
+        """
         if not self.game_folder:
             return
+        files = self.select_files(only) if only else None
+        self.run_stage("_import_file", force, events, format, jobs=jobs, files=files)
+
+    def import_workbook(self, only: typing.Optional[typing.List[str]] = None) -> int:
+        """Imports the sheets of `export/project.xlsx` (See `export_workbook`) into their mappings.
+
+        The workbook is read one sheet at a time. The `Index` sheet tells which data file each sheet belongs to.
+
+        Returns:
+            int: Number of files imported.
+        """
+        if not self.game_folder:
+            return 0
+        workbook_file = self.game_folder["export"] / "project.xlsx"
+        if not workbook_file.exists():
+            self.logger.error(f"{workbook_file} not found. Export it with `export --workbook` first.")
+            return 0
         tl_folder = self.game_folder["tl_root"] / "data"
+        selected = {self.manifest.rel(json_file) for json_file in self.select_files(only)}
+        imported = 0
+        with XlsxReader(workbook_file) as workbook:
+            if "Index" not in workbook.sheets:
+                self.logger.error(f"{workbook_file.name} has no Index sheet.")
+                return 0
+            index = {
+                values[0]: values[1]
+                for values in list(workbook.rows("Index"))[1:]
+                if len(values) > 1 and values[0] and values[1]
+            }
+            for sheet_name, rel in index.items():
+                if rel not in selected:
+                    continue
+                if sheet_name not in workbook.sheets:
+                    self.logger.error(f"{workbook_file.name} is missing the sheet of {rel}: {sheet_name}")
+                    continue
+                json_file = self.game_folder["data"] / rel
+                cls = self.resolve_file(
+                    json_file, tl_folder / rel, workbook_file
+                )
+                if not cls or not self.store.exists(cls.mapped_file):
+                    continue
+                sections = pick_texts(
+                    workbook.rows(sheet_name), EXCEL_COLUMNS[::-1], key="Section"
+                )
+                sections.pop(None, None)
+                cls.workbook_sections = sections
+                inputs = self.build_inputs(cls, map=cls.mapped_file, export=workbook_file)
+                try:
+                    if cls.import_map(format="xlsx"):
+                        imported += 1
+                        mapped = {"map": self.mapping_digest(cls.mapped_file)}
+                        self.build.mark("import", rel, {**inputs, **mapped}, cls.mapped_file)
+                    else:
+                        self.logger.error(f"Unable to import {rel} from {workbook_file.name}")
+                except NotImplementedError:
+                    self.logger.warning(f"TODO: {rel}")
+        self.logger.info(f"Imported {imported} files from {workbook_file}")
+        self.manifest.save()
+        self.build.save()
+        return imported
+
+    def scope_events(
+        self, cls: MVZFungler, events: typing.Optional[typing.List[int]]
+    ) -> bool:
+        """Limits a fungler to some event IDs. Returns False if the fungler has no events to limit to."""
+        if not events:
+            return True
+        if not cls.scoped_events:
+            return False
+        cls.event_filter = {str(event) for event in events}
+        return True
+
+    def _patch_file(
+        self,
+        json_file: pathlib.Path,
+        patched_folder: pathlib.Path,
+        force: bool,
+        events: typing.Optional[typing.List[int]] = None,
+    ):
+        tl_folder: pathlib.Path = self.game_folder["tl_root"] / "data"
         export_folder = self.game_folder["export"] / "data"
-        for json_file in self.game_folder["data"].rglob("*.json"):
-            rel = json_file.relative_to(self.game_folder["data"])
+        data_rel = (
+            self.game_folder["data"]
+            .resolve()
+            .relative_to(self.game_file.parent.resolve())
+        )
+        rel = json_file.relative_to(self.game_folder["data"])
 
-            map_file = tl_folder / rel
-            export_file: pathlib.Path = export_folder / rel
-            export_file = export_file.with_suffix(".nt.txt")
-            cls = self.resolve_file(json_file, map_file, export_file)
-            if cls:
-                if (export_file).exists():
-                    try:
-                        cls.import_map()
-                    except NotImplementedError:
-                        self.logger.warning(f"TODO: {rel.name}")
-
-    def patch(self, skip_copy:bool=True):
+        map_file = tl_folder / rel
+        export_file: pathlib.Path = export_folder / rel
+        export_file = export_file.with_suffix(".nt.txt")
+        patch_file = patched_folder / data_rel / rel
+        # print(patch_file)
+        cls = self.resolve_file(json_file, map_file, export_file)
+        # print(patch_file, "patching", map_file)
+        if cls and not self.scope_events(cls, events):
+            return
+        if cls:
+            if self.store.exists(map_file):
+                inputs = self.build_inputs(cls, map=map_file)
+                if not force and self.build.is_current(
+                    "patch", rel.as_posix(), inputs, patch_file, check_output=True
+                ):
+                    self.logger.debug(f"Patch up to date: {rel.name}")
+                    return
+                if patch_file.is_symlink() or (
+                    patch_file.exists() and patch_file.stat().st_nlink > 1
+                ):
+                    # Linked to the original game. Don't write through it.
+                    patch_file.unlink()
+                try:
+                    result = cls.apply_maps(patch_file)
+                    if result is not False and cls.event_filter is None:
+                        self.build.mark("patch", rel.as_posix(), inputs, patch_file)
+                except NotImplementedError:
+                    self.logger.warning(f"TODO: {rel.name}")
+
+    def patch(
+        self,
+        skip_copy: bool = True,
+        jobs: int = 1,
+        force: bool = False,
+        only: typing.Optional[typing.List[str]] = None,
+        events: typing.Optional[typing.List[int]] = None,
+    ):
         """Patches a game.
 
-        To be more precise, it creates a copy of the entire game directory and then patches over it.
+        To be more precise, it creates a mirror of the entire game directory and then patches over it.
+        Assets are linked instead of copied where possible (See `[Patch] mirror` in the config).
 
         This ensures that the original game being translated doesn't get overwritten by it.
+
+        Only files whose original, mapping or config changed since they were last patched are rewritten unless `force` is set.
+
+        `only` and `events` limit the patch to some data files and event IDs (See `import_maps`).
+        When limited to events, the rest of the patched file is kept as is. Scripts are only copied on an unlimited patch.
         """
 
         
 
         if not self.game_folder:
             return
-        tl_folder: pathlib.Path = self.game_folder["tl_root"] / "data"
+        patched_folder = self._mirror(skip_copy)
+        files = self.select_files(only) if only else None
+        self.run_stage("_patch_file", patched_folder, force, events, jobs=jobs, files=files)
+        if files is None and not events:
+            self._patch_scripts(patched_folder, force)
+
+    def _mirror(self, skip_copy: bool) -> pathlib.Path:
+        """Creates or updates the mirror of the game folder that gets patched."""
         patched_folder: pathlib.Path = self.game_folder["patch"].resolve()
         do_copy = False
         if not patched_folder.is_dir() or not skip_copy:
             do_copy = True
         if do_copy:
-            if not self.game_folder["patch"].is_dir():
-                self.game_folder["patch"].mkdir(parents=True, exist_ok=True)
-            for item in self.game_file.parent.iterdir():
-                if item.resolve() == self.game_folder["tl_root"]:
-                    continue
-                if item.is_file():
-                    rel = item.relative_to(self.game_file.parent)
-                    shutil.copy(item, self.game_folder["patch"] / rel)
-                elif item.is_dir():
-                    rel = item.relative_to(self.game_file.parent)
-                    shutil.copytree(item, self.game_folder["patch"] / rel)
-
-        export_folder = self.game_folder["export"] / "data"
-        data_rel = (
-            self.game_folder["data"]
-            .resolve()
-            .relative_to(self.game_file.parent.resolve())
-        )
-        for json_file in self.game_folder["data"].rglob("*.json"):
-            rel = json_file.relative_to(self.game_folder["data"])
+            mirror = GameMirror(
+                self.game_file.parent,
+                patched_folder,
+                self.game_folder["tl_root"] / "mirror.json",
+                exclude=[self.game_folder["tl_root"]],
+                copy_folders=[self.game_folder["data"], self.game_folder["scripts"]],
+                mode=self.config.get("Patch", {}).get("mirror", "auto"),
+            )
+            stats = mirror.sync()
+            self.logger.info(f"Mirrored game folder: {stats}")
+        return patched_folder
 
-            map_file = tl_folder / rel
-            export_file: pathlib.Path = export_folder / rel
-            export_file = export_file.with_suffix(".nt.txt")
-            patch_file = patched_folder / data_rel / rel
-            # print(patch_file)
-            cls = self.resolve_file(json_file, map_file, export_file)
-            # print(patch_file, "patching", map_file)
-            if cls:
-                if map_file.exists():
-                    try:
-                        cls.apply_maps(patch_file)
-                    except NotImplementedError:
-                        self.logger.warning(f"TODO: {rel.name}")
+    def _patch_scripts(self, patched_folder: pathlib.Path, force: bool):
         script_rel = (
             self.game_folder["scripts"]
             .resolve()
@@ -322,5 +896,236 @@ class MVZHandler:
             patch_file = patched_folder / script_rel / rel
             # print(patch_file, nsp)
             if patch_file.exists():
+                if not force and not patch_file.is_symlink():
+                    nsp_stat, patch_stat = nsp.stat(), patch_file.stat()
+                    if (
+                        nsp_stat.st_size == patch_stat.st_size
+                        and nsp_stat.st_mtime_ns == patch_stat.st_mtime_ns
+                    ):
+                        continue
                 patch_file.unlink()
-            shutil.copy(nsp, patch_file)
+            shutil.copy2(nsp, patch_file)
+
+    def analyze_text(
+        self, only: typing.Optional[typing.List[str]] = None, force: bool = False
+    ) -> typing.Dict[str, typing.Dict[str, int]]:
+        """Computes the text features of the mapped strings and stores them as `.features` next to each mapping.
+
+        The strings of every mapping are analyzed together in one batch. (See `RPGMVZFeatures.analyze`)
+        Mappings whose features are still current are skipped unless `force` is set.
+
+        Returns:
+            typing.Dict[str, typing.Dict[str, int]]: Data file (relative to the data folder) -> `TextFeatures.summary`
+        """
+        if not self.game_folder:
+            return {}
+        tl_folder = self.game_folder["tl_root"] / "data"
+        export_folder = self.game_folder["export"] / "data"
+        summaries: typing.Dict[str, typing.Dict[str, int]] = {}
+        pending: typing.List[typing.Tuple[str, MVZFungler, int, int]] = []
+        strings: typing.List[str] = []
+        for json_file in self.select_files(only):
+            rel = json_file.relative_to(self.game_folder["data"])
+            cls = self.resolve_file(
+                json_file, tl_folder / rel, (export_folder / rel).with_suffix(".nt.txt")
+            )
+            if not cls or not self.store.exists(cls.mapped_file):
+                continue
+            features = None if force else cls.read_features()
+            if features is not None:
+                summaries[rel.as_posix()] = features.summary()
+                continue
+            units = cls.text_units()
+            if units is None:
+                continue
+            pending.append((rel.as_posix(), cls, len(strings), len(strings) + len(units)))
+            strings.extend(units)
+        if pending:
+            self.logger.info(f"Analyzing {len(strings)} strings of {len(pending)} mappings")
+            features = analyze(strings)
+            for rel, cls, start, end in pending:
+                part = features.slice(start, end)
+                cls.write_features(part)
+                summaries[rel] = part.summary()
+        self.manifest.save()
+        return dict(sorted(summaries.items()))
+
+    def _run_extract(
+        self, json_file: pathlib.Path, translate: bool, force: bool
+    ) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        tl_folder = self.game_folder["tl_root"] / "data"
+        export_folder = self.game_folder["export"] / "data"
+        rel = json_file.relative_to(self.game_folder["data"])
+
+        map_file = tl_folder / rel
+        export_file = (export_folder / rel).with_suffix(".nt.txt")
+        self._map_file(json_file, False, force)
+        if not self.store.exists(map_file):
+            return None
+        job = {"file": json_file, "fungler": None, "export": None}
+        if export_file.exists():
+            # Pick up edits made to the export since the last import.
+            self._import_file(json_file, force)
+        if not translate:
+            return job
+        cls = self.resolve_file(json_file, map_file, export_file)
+        if cls:
+            cls.stage_exports = True
+            try:
+                if cls.export_map(format="nested"):
+                    job["fungler"] = cls
+                    job["export"] = cls.staged_export
+            except NotImplementedError:
+                self.logger.warning(f"TODO: {rel.name}")
+        return job
+
+    def _run_translate(
+        self,
+        job: typing.Dict[str, typing.Any],
+        translate: typing.Callable[[str, typing.Any], typing.Any],
+        write_exports: bool,
+    ) -> typing.Dict[str, typing.Any]:
+        cls: typing.Optional[MVZFungler] = job["fungler"]
+        if cls is None or not job["export"]:
+            return job
+        orig_export = cls.export_file.with_suffix(".ORIG.nt.txt")
+        original = None
+        if write_exports and not orig_export.exists():
+            # Translators may work in place. Keep the original text for the copy.
+            original = nestedtext.dumps(job["export"])
+        job["export"] = translate(cls.export_file.name, job["export"])
+        if job["export"] is not None and original is not None:
+            orig_export.parent.mkdir(parents=True, exist_ok=True)
+            orig_export.write_text(original, encoding="utf-8")
+        return job
+
+    def _run_import(
+        self, job: typing.Dict[str, typing.Any], write_exports: bool
+    ) -> typing.Dict[str, typing.Any]:
+        cls: typing.Optional[MVZFungler] = job["fungler"]
+        if cls is None or not job["export"]:
+            return job
+        cls.staged_export = job["export"]
+        if not cls.import_map():
+            return job
+        if write_exports or cls.export_file.exists():
+            # An export left on disk would undo the translation on the next import.
+            cls.stage_exports = False
+            cls.export_file.parent.mkdir(parents=True, exist_ok=True)
+            cls.export_nested(job["export"])
+            rel = self.manifest.rel(job["file"])
+            inputs = self.build_inputs(cls, map=cls.mapped_file, export=cls.export_file)
+            mapped = {"map": inputs["map"]}
+            self.build.mark("import", rel, inputs, cls.mapped_file)
+            self.build.mark("export:nested", rel, mapped, cls.export_file)
+        return job
+
+    def _run_patch(
+        self, job: typing.Dict[str, typing.Any], patched_folder: pathlib.Path, force: bool
+    ) -> typing.Dict[str, typing.Any]:
+        self._patch_file(job["file"], patched_folder, force)
+        return job
+
+    def run(
+        self,
+        translate: typing.Optional[typing.Callable[[str, typing.Any], typing.Any]] = None,
+        write_exports: bool = False,
+        skip_copy: bool = True,
+        force: bool = False,
+        depth: int = 4,
+    ):
+        """Maps, translates, imports and patches every data file in a single pass.
+
+        Each file streams through the stages on its own. A file is patched as soon as it is done,
+        while later files are still being mapped or translated. Exports are kept in memory.
+
+        Args:
+            translate (typing.Optional[typing.Callable[[str, typing.Any], typing.Any]], optional): Called with the export file name and the nested export. Returns the translated export or None to leave it as is. Defaults to None (No translation).
+            write_exports (bool, optional): Also write the translated exports to the export folder. Exports that already exist are always updated. Defaults to False.
+            skip_copy (bool, optional): Don't refresh the mirror of the game folder if it exists. Defaults to True.
+            force (bool, optional): Rebuild every stage regardless of the build graph. Defaults to False.
+            depth (int, optional): How many files can wait between two stages. Defaults to 4.
+        """
+        if not self.game_folder:
+            return
+        patched_folder = self._mirror(skip_copy)
+        self._dump_scripts(False)
+
+        stages: typing.List[typing.Callable[[typing.Any], typing.Any]] = [
+            lambda json_file: self._run_extract(json_file, translate is not None, force)
+        ]
+        if translate is not None:
+            stages.append(lambda job: self._run_translate(job, translate, write_exports))
+            stages.append(lambda job: self._run_import(job, write_exports))
+        stages.append(lambda job: self._run_patch(job, patched_folder, force))
+
+        def label(item) -> str:
+            json_file = item if isinstance(item, pathlib.Path) else item["file"]
+            return json_file.name
+
+        files = self.data_files
+        self.manifest.retain(self.manifest.rel(json_file) for json_file in files)
+        done = 0
+        for job in pipeline(files, stages, self.logger, depth=depth, label=label):
+            done += 1
+            self.logger.debug(f"[{done}/{len(files)}] Done: {job['file'].name}")
+        self._patch_scripts(patched_folder, force)
+        self._log_pages()
+        self.manifest.save()
+        self.build.save()
+        self.commands.save()
+        if self.pages:
+            self.pages.save()
+
+    def watch(self, debounce: float = 0.3, interval: float = 0.2, polling: bool = False):
+        """Watches the nested exports and re-imports and re-patches a file whenever its export is saved.
+
+        Only the saved file is processed. Import errors are logged and leave the patched file as it was.
+
+        Args:
+            debounce (float, optional): Seconds an export must be left alone before it is imported. Defaults to 0.3.
+            interval (float, optional): Seconds between checks. Defaults to 0.2.
+            polling (bool, optional): Poll the export folder even if `watchdog` is installed. Defaults to False.
+        """
+        if not self.game_folder:
+            return
+        patched_folder = self._mirror(True)
+        export_folder = self.game_folder["export"] / "data"
+        sources: typing.Dict[pathlib.Path, pathlib.Path] = {}
+        for json_file in self.data_files:
+            rel = json_file.relative_to(self.game_folder["data"])
+            sources[(export_folder / rel).with_suffix(".nt.txt").resolve()] = json_file
+
+        watcher = FolderWatcher(
+            export_folder, ".nt.txt", debounce=debounce, interval=interval, polling=polling
+        )
+        self.logger.info(f"Watching {export_folder} for changes. Press Ctrl+C to stop.")
+        try:
+            for export_file in watcher.watch():
+                json_file = sources.get(export_file.resolve())
+                if json_file is None:
+                    # .ORIG copies and exports without a data file.
+                    continue
+                start = time.perf_counter()
+                try:
+                    imported = self._import_file(json_file, False)
+                    if imported:
+                        self._patch_file(json_file, patched_folder, False)
+                except Exception as e:
+                    self.logger.exception(e)
+                    imported = False
+                if not imported:
+                    self.logger.error(
+                        f"Import failed for {export_file.name}. The patched file was not updated."
+                    )
+                    continue
+                self.manifest.save()
+                self.build.save()
+                self.logger.info(
+                    f"Patched {json_file.name} in {(time.perf_counter() - start) * 1000:.0f}ms"
+                )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.manifest.save()
+            self.build.save()
@@ -0,0 +1,94 @@
+import logging
+import pathlib
+import typing
+
+import orjson
+
+
+class CommandIndex:
+    version = 1
+
+    def __init__(self, index_file: pathlib.Path) -> None:
+        """Records where the config dependent event commands are in each data file.
+
+        For every file: the hash of the original json, the decoder config it was mapped with
+        and the locations of each indexed code, stored flat as `[event, page, offset, event, page, offset, ...]`.
+
+        A change to `[Events]` then only needs the pages holding the affected codes to be decoded again.
+
+        Args:
+            index_file (pathlib.Path): Where the index is stored. Typically `tl_workspace/commands.json`
+        """
+        self.index_file = index_file
+        self.logger = logging.getLogger("DF|Index")
+        self.files: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+        self._changed: typing.Set[str] = set()
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not self.index_file.exists():
+            return
+        try:
+            data = orjson.loads(self.index_file.read_bytes())
+        except orjson.JSONDecodeError:
+            self.logger.warning("Command index is corrupted. Config changes will need a full remap.")
+            return
+        if data.get("version") != self.version:
+            return
+        self.files = data.get("files", {})
+
+    def save(self):
+        if not self._dirty:
+            return
+        if not self.index_file.parent.exists():
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        self.index_file.write_bytes(
+            orjson.dumps({"version": self.version, "files": self.files})
+        )
+        self._dirty = False
+
+    def get(self, rel: str) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        return self.files.get(rel)
+
+    def record(
+        self,
+        rel: str,
+        orig: str,
+        config: typing.Dict[str, typing.Any],
+        codes: typing.Dict[str, typing.List[int]],
+    ):
+        """Records the command locations of a data file.
+
+        Args:
+            rel (str): The data file, relative to the game's data folder.
+            orig (str): Content hash of the original json.
+            config (typing.Dict[str, typing.Any]): The `decoder_config` the file was mapped with.
+            codes (typing.Dict[str, typing.List[int]]): Code -> flat locations. (See `MVZFungler.locate_commands`)
+        """
+        self.files[rel] = {"orig": orig, "config": config, "codes": codes}
+        self._changed.add(rel)
+        self._dirty = True
+
+    def pages(
+        self, rel: str, codes: typing.Iterable[int]
+    ) -> typing.Set[typing.Tuple[int, int]]:
+        """The (event, page) pairs holding any of the codes."""
+        located = self.files[rel]["codes"]
+        pages = set()
+        for code in codes:
+            flat = located.get(str(code), [])
+            pages.update(zip(flat[0::3], flat[1::3]))
+        return pages
+
+    def pop_changes(self) -> typing.Dict[str, typing.Any]:
+        """Returns and clears the changes since the last call. Used to send worker updates to the parent."""
+        changes = {rel: self.files[rel] for rel in self._changed}
+        self._changed = set()
+        return changes
+
+    def update(self, changes: typing.Dict[str, typing.Any]):
+        if not changes:
+            return
+        self.files.update(changes)
+        self._dirty = True
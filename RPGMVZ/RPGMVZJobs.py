@@ -0,0 +1,101 @@
+import concurrent.futures
+import logging
+import pathlib
+import traceback
+import typing
+
+
+class _RecordCollector(logging.Handler):
+    """Holds on to log records emitted by a work unit so the parent can replay them."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: typing.List[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Format early. Args may not survive pickling back to the parent.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+
+def _init_worker(level: int):
+    # Workers never write logs themselves. Everything is sent back to the parent.
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(level)
+
+
+def _run_unit(func: typing.Callable, item: pathlib.Path, args: tuple):
+    collector = _RecordCollector()
+    root = logging.getLogger()
+    root.addHandler(collector)
+    error = None
+    result = None
+    try:
+        result = func(item, *args)
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        root.removeHandler(collector)
+    return result, error, collector.records
+
+
+def run_units(
+    func: typing.Callable,
+    items: typing.List[pathlib.Path],
+    jobs: int,
+    logger: logging.Logger,
+    *args,
+) -> typing.List[typing.Any]:
+    """Runs `func(item, *args)` for every item. Each item is a separate work unit.
+
+    With `jobs` > 1 the units are spread over a process pool. Log records and
+    errors from the workers are replayed in the parent in the same order as `items`.
+    A unit that raises is logged and the others still run, whatever the number of jobs.
+
+    Args:
+        func (typing.Callable): The function to run. Must be picklable (e.g. a bound method of a picklable object)
+        items (typing.List[pathlib.Path]): The data files to process.
+        jobs (int): Number of worker processes. 1 runs everything in this process.
+        logger (logging.Logger): Logger for reporting failed units.
+
+    Returns:
+        typing.List[typing.Any]: The results for each item. None for failed units.
+    """
+    if jobs <= 1 or len(items) <= 1:
+        results = []
+        for item in items:
+            try:
+                results.append(func(item, *args))
+            except Exception:
+                logger.error(f"Failed processing: {item.name}\n{traceback.format_exc()}")
+                results.append(None)
+        return results
+    results = []
+    chunksize = max(1, len(items) // (jobs * 4))
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(logging.getLogger().getEffectiveLevel(),),
+    ) as pool:
+        for item, (result, error, records) in zip(
+            items,
+            pool.map(
+                _run_unit,
+                [func] * len(items),
+                items,
+                [args] * len(items),
+                chunksize=chunksize,
+            ),
+        ):
+            for record in records:
+                logging.getLogger(record.name).handle(record)
+            if error:
+                logger.error(f"Failed processing: {item.name}\n{error}")
+            results.append(result)
+    return results
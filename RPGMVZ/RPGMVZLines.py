@@ -0,0 +1,211 @@
+import re
+import typing
+
+# Text lines of one entry, whether it is a choice and its string ID. (None if the export has no IDs)
+Entry = typing.Tuple[typing.List[str], bool, typing.Optional[str]]
+# A section is a list of entries (events) or a record of fields, each a text or a list of entries.
+Section = typing.Union[typing.List[Entry], typing.Dict[str, typing.Union[str, typing.List[Entry]]]]
+
+HEADER = (
+    "<># DataFumbler lines export. Text lines are kept as they are.\n"
+    "<># <>= starts a section, <>: a field, <> ends an entry (<>c a choice). <>| in front of a line that starts with <>.\n"
+    "<># The ID after <> tells where the entry goes. Entries can be left out to import only some of them.\n"
+)
+
+# Every line starting with `<>` is structure. Text lines starting with `<>` are escaped as `<>|`.
+# Matched with the line break in front (The text gets one added), which is much faster to search for than `^`.
+_structure = re.compile(r"\n<>([^\n]*)")
+
+
+class KeyedEntries(dict):
+    """String ID -> text lines of an entry. Imported by ID instead of by position. (See `keyed_entries`)"""
+
+
+class LinesError(Exception):
+    def __init__(self, message: str, lineno: int) -> None:
+        super().__init__(f"{message} (line {lineno})")
+        self.lineno = lineno
+
+
+def _text_lines(text: str) -> typing.List[str]:
+    return ["<>|" + line if line.startswith("<>") else line for line in text.split("\n")]
+
+
+def _entries_lines(entries: typing.List[Entry], out: typing.List[str]) -> None:
+    for lines, choice, key in entries:
+        for line in lines:
+            out.append("<>|" + line if line.startswith("<>") else line)
+        end = "<>c" if choice else "<>"
+        out.append(f"{end} {key}" if key else end)
+
+
+def dumps(data: typing.Dict[str, Section]) -> str:
+    """Writes sections of entries (events) or records of fields (database files) as lines. (See `loads`)"""
+    out = [HEADER.rstrip("\n")]
+    for key, section in data.items():
+        out.append(f"<>= {key}")
+        if isinstance(section, dict):
+            for field, value in section.items():
+                out.append(f"<>: {field}")
+                if isinstance(value, str):
+                    out.extend(_text_lines(value))
+                else:
+                    _entries_lines(value, out)
+        else:
+            _entries_lines(section, out)
+    out.append("")
+    return "\n".join(out)
+
+
+def _unmark(lines: typing.List[str]) -> typing.List[str]:
+    return [
+        line[3:] if line.startswith("<>|") else line
+        for line in lines
+        if not line.startswith("<>#")
+    ]
+
+
+def _lineno(raw: str, pos: int) -> int:
+    # Line number of the line starting at `pos` in the text with the extra line break in front.
+    return raw.count("\n", 0, pos)
+
+
+def loads(raw: str) -> typing.Dict[str, Section]:
+    """Parses a lines export in a single pass.
+
+    Only the structure lines are looked at one by one. The text between them is split into lines as a whole,
+    so entries come out already grouped and no second pass over the lines is needed.
+    A field is text unless the first structure line after it ends an entry. Comments (`<>#`) are skipped.
+
+    Raises:
+        LinesError: On text outside of an entry, fields outside of a record or unknown structure lines.
+    """
+    if raw.startswith("\ufeff"):
+        raw = raw[1:]
+    if "\r" in raw:
+        raw = raw.replace("\r\n", "\n")
+    # Every line, the first one included, starts after a line break and ends with one.
+    raw = "\n" + raw if raw.endswith("\n") else "\n" + raw + "\n"
+    data: typing.Dict[str, Section] = {}
+    section: typing.Optional[str] = None
+    # Where entries go: the entries of the section or of the current field.
+    entries: typing.Optional[typing.List[Entry]] = None
+    record: typing.Optional[typing.Dict[str, typing.Any]] = None
+    # A field that has neither text nor entries yet.
+    field: typing.Optional[str] = None
+    # The text since the last structure line starts here and has escaped lines or comments if `marked`.
+    start = 1
+    marked = False
+    for match in _structure.finditer(raw):
+        rest = match.group(1)
+        if rest[:1] in ("|", "#"):
+            marked = True
+            continue
+        # The text ends at the line break in front of the structure line. (If there is text)
+        end = match.start()
+        lines = raw[start:end].split("\n") if end >= start else []
+        if marked:
+            lines = _unmark(lines)
+            marked = False
+        text_start, start = start, match.end() + 1
+        if not rest or rest[0] == " " or rest == "c" or rest[:2] == "c ":
+            if entries is None:
+                raise LinesError("Entry outside of a section", _lineno(raw, end + 1))
+            choice = rest[:1] == "c"
+            key = rest[2 if choice else 1 :].strip()
+            entries.append((lines, choice, key or None))
+            field = None
+            continue
+        kind, _, key = rest.partition(" ")
+        if kind not in ("=", ":"):
+            raise LinesError(f"Unknown line: <>{rest}", _lineno(raw, end + 1))
+        if field is not None:
+            record[field] = "\n".join(lines)
+            field = None
+        elif any(line.strip() for line in lines):
+            raise LinesError("Text outside of an entry", _lineno(raw, text_start))
+        if kind == "=":
+            section = key
+            record = None
+            entries = data[key] = []
+        else:
+            if section is None:
+                raise LinesError("Field outside of a section", _lineno(raw, end + 1))
+            if record is None:
+                if data[section]:
+                    raise LinesError(f"Section {section} has both entries and fields", _lineno(raw, end + 1))
+                record = data[section] = {}
+            field = key
+            entries = record[key] = []
+    end = len(raw) - 1
+    lines = raw[start:end].split("\n") if end >= start else []
+    if marked:
+        lines = _unmark(lines)
+    if field is not None:
+        record[field] = "\n".join(lines)
+    elif any(line.strip() for line in lines):
+        raise LinesError("Text outside of an entry", _lineno(raw, start))
+    return data
+
+
+def _flat(entries: typing.List[Entry]) -> typing.List[str]:
+    lines: typing.List[str] = []
+    for text, choice, _ in entries:
+        lines.extend(text)
+        lines.append("<>c" if choice else "<>")
+    return lines
+
+
+def _grouped(lines: typing.List[str]) -> typing.List[Entry]:
+    entries: typing.List[Entry] = []
+    text: typing.List[str] = []
+    for line in lines:
+        if line in ("<>", "<>c"):
+            entries.append((text, line == "<>c", None))
+            text = []
+        else:
+            text.append(line)
+    return entries
+
+
+def to_nested(data: typing.Dict[str, Section]) -> typing.Dict[str, typing.Any]:
+    """The NestedText layout of the same export: entries as lines ending with `<>` (`<>c` for choices)."""
+    nested: typing.Dict[str, typing.Any] = {}
+    for key, section in data.items():
+        if isinstance(section, dict):
+            nested[key] = {
+                field: value if isinstance(value, str) else _flat(value)
+                for field, value in section.items()
+            }
+        else:
+            nested[key] = _flat(section)
+    return nested
+
+
+def from_nested(nested: typing.Dict[str, typing.Any]) -> typing.Dict[str, Section]:
+    """Reverses `to_nested`."""
+    data: typing.Dict[str, Section] = {}
+    for key, section in nested.items():
+        if isinstance(section, dict):
+            data[key] = {
+                field: value if isinstance(value, str) else _grouped(value)
+                for field, value in section.items()
+            }
+        else:
+            data[key] = _grouped(section)
+    return data
+
+
+def keyed_entries(data: typing.Dict[str, Section]) -> typing.Optional[KeyedEntries]:
+    """The entries of every section (and field) by string ID. None unless every entry has an ID."""
+    keyed = KeyedEntries()
+    for section in data.values():
+        lists = [section] if isinstance(section, list) else [
+            value for value in section.values() if not isinstance(value, str)
+        ]
+        for entries in lists:
+            for lines, _, key in entries:
+                if key is None:
+                    return None
+                keyed[key] = lines
+    return keyed if keyed else None
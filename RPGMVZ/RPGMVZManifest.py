@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import os
+import pathlib
+import typing
+
+import orjson
+
+
+def content_hash(raw: bytes) -> str:
+    """Hash used to tell if a file's content changed."""
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class ProjectManifest:
+    version = 1
+
+    def __init__(self, manifest_file: pathlib.Path, data_folder: pathlib.Path) -> None:
+        """Persistent record of the game's data files.
+
+        Stores the relative path, size, mtime, content hash and the resolved fungler for each data file.
+        A file is only read and classified again when its `stat()` no longer matches the record.
+
+        Args:
+            manifest_file (pathlib.Path): Where the manifest is stored. Typically `tl_workspace/manifest.json`
+            data_folder (pathlib.Path): The game's data folder.
+        """
+        self.manifest_file = manifest_file
+        self.data_folder = data_folder
+        self.logger = logging.getLogger("DF|Manifest")
+        self.entries: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+        self._changed: typing.Set[str] = set()
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not self.manifest_file.exists():
+            return
+        try:
+            data = orjson.loads(self.manifest_file.read_bytes())
+        except orjson.JSONDecodeError:
+            self.logger.warning("Manifest is corrupted. Rebuilding.")
+            return
+        if data.get("version") != self.version:
+            return
+        self.entries = data.get("files", {})
+
+    def save(self):
+        if not self._dirty:
+            return
+        if not self.manifest_file.parent.exists():
+            self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        self.manifest_file.write_bytes(
+            orjson.dumps(
+                {"version": self.version, "files": self.entries},
+                option=orjson.OPT_INDENT_2,
+            )
+        )
+        self._dirty = False
+
+    def rel(self, json_file: pathlib.Path) -> str:
+        return json_file.relative_to(self.data_folder).as_posix()
+
+    def lookup(
+        self, json_file: pathlib.Path, stat: typing.Optional[os.stat_result] = None
+    ) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """Returns the recorded entry if the file's stat still matches it."""
+        entry = self.entries.get(self.rel(json_file))
+        if not entry:
+            return None
+        if stat is None:
+            stat = json_file.stat()
+        if entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime_ns:
+            return None
+        return entry
+
+    def record(
+        self,
+        json_file: pathlib.Path,
+        stat: os.stat_result,
+        digest: str,
+        fungler: typing.Optional[str],
+    ) -> typing.Dict[str, typing.Any]:
+        rel = self.rel(json_file)
+        entry = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": digest,
+            "fungler": fungler,
+        }
+        self.entries[rel] = entry
+        self._changed.add(rel)
+        self._dirty = True
+        return entry
+
+    def resolve(
+        self,
+        json_file: pathlib.Path,
+        classify: typing.Callable[[pathlib.Path, bytes], typing.Optional[str]],
+    ) -> typing.Dict[str, typing.Any]:
+        """Gets the manifest entry for a data file, classifying it if needed.
+
+        Args:
+            json_file (pathlib.Path): The game's data file.
+            classify (typing.Callable[[pathlib.Path, bytes], typing.Optional[str]]): Called with the raw bytes for new or modified files. Returns the fungler name or None.
+
+        Returns:
+            typing.Dict[str, typing.Any]: The manifest entry.
+        """
+        stat = json_file.stat()
+        entry = self.lookup(json_file, stat)
+        if entry:
+            return entry
+        raw = json_file.read_bytes()
+        digest = content_hash(raw)
+        old = self.entries.get(self.rel(json_file))
+        if old and old["hash"] == digest:
+            # Touched but not modified.
+            return self.record(json_file, stat, digest, old["fungler"])
+        return self.record(json_file, stat, digest, classify(json_file, raw))
+
+    def pop_changes(self) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        """Returns and clears the entries changed since the last call. Used to send worker updates to the parent."""
+        changes = {rel: self.entries[rel] for rel in self._changed}
+        self._changed = set()
+        return changes
+
+    def update(self, changes: typing.Dict[str, typing.Dict[str, typing.Any]]):
+        if not changes:
+            return
+        self.entries.update(changes)
+        self._dirty = True
+
+    def retain(self, rels: typing.Iterable[str]):
+        """Drops entries for data files that no longer exist."""
+        rels = set(rels)
+        for rel in list(self.entries):
+            if rel not in rels:
+                del self.entries[rel]
+                self._dirty = True
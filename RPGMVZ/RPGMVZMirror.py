@@ -0,0 +1,184 @@
+import errno
+import logging
+import os
+import pathlib
+import shutil
+import typing
+
+import orjson
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl request for a reflink clone on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+mirror_modes = ["auto", "reflink", "hardlink", "symlink", "copy"]
+
+
+def _reflink(source: pathlib.Path, target: pathlib.Path):
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform")
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            target.unlink()
+            raise
+
+
+def _hardlink(source: pathlib.Path, target: pathlib.Path):
+    os.link(source, target)
+
+
+def _symlink(source: pathlib.Path, target: pathlib.Path):
+    os.symlink(source.resolve(), target)
+
+
+def _copy(source: pathlib.Path, target: pathlib.Path):
+    shutil.copy2(source, target)
+
+
+_methods: typing.Dict[str, typing.Callable[[pathlib.Path, pathlib.Path], None]] = {
+    "reflink": _reflink,
+    "hardlink": _hardlink,
+    "symlink": _symlink,
+    "copy": _copy,
+}
+
+
+class GameMirror:
+    version = 1
+
+    def __init__(
+        self,
+        source: pathlib.Path,
+        target: pathlib.Path,
+        manifest_file: pathlib.Path,
+        exclude: typing.List[pathlib.Path],
+        copy_folders: typing.List[pathlib.Path],
+        mode: str = "auto",
+    ) -> None:
+        """Keeps a mirror of the game folder for patching.
+
+        Files are reflinked, hardlinked or symlinked where the filesystem allows it, falling back to a copy.
+        Files inside `copy_folders` (data & scripts) are always copied since the patcher writes over them.
+
+        A manifest of the source files' size and mtime is kept so later syncs only replace files that changed.
+
+        Args:
+            source (pathlib.Path): The game folder.
+            target (pathlib.Path): The mirror folder. Typically `tl_workspace/patched`
+            manifest_file (pathlib.Path): Where the mirror manifest is stored.
+            exclude (typing.List[pathlib.Path]): Folders in the source to skip (the project folder).
+            copy_folders (typing.List[pathlib.Path]): Folders in the source that must be real copies.
+            mode (str, optional): One of `mirror_modes`. Defaults to "auto".
+        """
+        if mode not in mirror_modes:
+            raise Exception(f"Unknown mirror mode: {mode}. Expected one of {mirror_modes}")
+        self.source = source.resolve()
+        self.target = target.resolve()
+        self.manifest_file = manifest_file
+        self.exclude = [folder.resolve() for folder in exclude]
+        self.copy_folders = [
+            folder.resolve().relative_to(self.source) for folder in copy_folders
+        ]
+        self.mode = mode
+        self.logger = logging.getLogger("DF|Mirror")
+        self.entries: typing.Dict[str, typing.List[typing.Any]] = {}
+        # Methods that failed once are not tried again.
+        self._failed: typing.Set[str] = set()
+        self.load()
+
+    def load(self):
+        if not self.manifest_file.exists():
+            return
+        try:
+            data = orjson.loads(self.manifest_file.read_bytes())
+        except orjson.JSONDecodeError:
+            return
+        if data.get("version") == self.version and data.get("target") == str(
+            self.target
+        ):
+            self.entries = data.get("files", {})
+
+    def save(self):
+        if not self.manifest_file.parent.exists():
+            self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        self.manifest_file.write_bytes(
+            orjson.dumps(
+                {"version": self.version, "target": str(self.target), "files": self.entries}
+            )
+        )
+
+    def _candidates(self, rel: pathlib.PurePath) -> typing.List[str]:
+        for folder in self.copy_folders:
+            if rel == folder or folder in rel.parents:
+                return ["copy"]
+        if self.mode == "auto":
+            return ["reflink", "hardlink", "symlink", "copy"]
+        return [self.mode, "copy"]
+
+    def place(self, source: pathlib.Path, rel: pathlib.PurePath) -> str:
+        """Places a single file into the mirror. Returns the method that worked."""
+        target = self.target / rel
+        if target.is_symlink() or target.exists():
+            # Never write through an existing link.
+            target.unlink()
+        elif not target.parent.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+        for method in self._candidates(rel):
+            if method in self._failed:
+                continue
+            try:
+                _methods[method](source, target)
+                return method
+            except OSError as e:
+                if method == "copy":
+                    raise
+                self.logger.debug(f"{method} failed for {rel}: {e}. Falling back.")
+                self._failed.add(method)
+        raise Exception(f"Unable to mirror {rel}")
+
+    def sync(self) -> typing.Dict[str, int]:
+        """Brings the mirror up to date with the game folder.
+
+        Returns:
+            typing.Dict[str, int]: How many files were placed with each method. "unchanged" for skipped files.
+        """
+        stats: typing.Dict[str, int] = {"unchanged": 0}
+        seen = set()
+        for root, dirs, files in os.walk(self.source):
+            root_path = pathlib.Path(root)
+            dirs[:] = [
+                folder for folder in dirs if (root_path / folder).resolve() not in self.exclude
+            ]
+            rel_root = root_path.relative_to(self.source)
+            (self.target / rel_root).mkdir(parents=True, exist_ok=True)
+            for name in files:
+                source = root_path / name
+                rel = rel_root / name
+                key = rel.as_posix()
+                seen.add(key)
+                stat = source.stat()
+                entry = self.entries.get(key)
+                target = self.target / rel
+                if (
+                    entry
+                    and entry[0] == stat.st_size
+                    and entry[1] == stat.st_mtime_ns
+                    and (target.is_symlink() or target.exists())
+                ):
+                    stats["unchanged"] += 1
+                    continue
+                method = self.place(source, rel)
+                self.entries[key] = [stat.st_size, stat.st_mtime_ns, method]
+                stats[method] = stats.get(method, 0) + 1
+        for key in list(self.entries):
+            if key not in seen:
+                del self.entries[key]
+        self.save()
+        return stats
@@ -0,0 +1,133 @@
+import logging
+import pathlib
+import threading
+import typing
+
+import orjson
+
+from .RPGMVZCommands import EventCommandDecoder
+from .RPGMVZManifest import content_hash
+
+
+Entries = typing.List[typing.Dict[str, typing.Any]]
+
+
+def _copy(entries: Entries) -> Entries:
+    return [
+        {**entry, "text": list(entry["text"]), "pointer": list(entry["pointer"])}
+        for entry in entries
+    ]
+
+
+class PageCache:
+    version = 1
+
+    def __init__(self, cache_file: typing.Optional[pathlib.Path] = None) -> None:
+        """Decoded event pages keyed on the page's command list.
+
+        Games are full of copy pasted events (shop keepers, save points, doors...). A page
+        that was decoded before reuses the entries (and their pointers) of the first copy.
+        Pages without any command the decoder handles are not cached. They are rejected faster than they can be looked up.
+
+        Every caller gets its own copy of the entries.
+
+        When persisted, pages are stored under a hash of the command list. The hash is only worked out for pages that are not in memory.
+
+        The cache can be shared between threads.
+
+        Args:
+            cache_file (typing.Optional[pathlib.Path], optional): Where the cache is persisted between runs. Defaults to None (memory only).
+        """
+        self.cache_file = cache_file
+        self.logger = logging.getLogger("DF|Pages")
+        self.decoded = 0
+        self.reused = 0
+        # Serialized command list -> entries
+        self._pages: typing.Dict[bytes, Entries] = {}
+        # Hash of the serialized command list -> entries. Only used when persisted.
+        self._stored: typing.Dict[str, Entries] = {}
+        self._changed: typing.Set[str] = set()
+        self._dirty = False
+        self._lock = threading.RLock()
+        self.load()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def load(self):
+        if self.cache_file is None or not self.cache_file.exists():
+            return
+        try:
+            data = orjson.loads(self.cache_file.read_bytes())
+        except orjson.JSONDecodeError:
+            self.logger.warning("Page cache is corrupted. Pages will be decoded again.")
+            return
+        if data.get("version") != self.version:
+            return
+        self._stored = data.get("pages", {})
+
+    def save(self):
+        if self.cache_file is None or not self._dirty:
+            return
+        if not self.cache_file.parent.exists():
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            raw = orjson.dumps({"version": self.version, "pages": self._stored})
+        self.cache_file.write_bytes(raw)
+        self._dirty = False
+
+    def decode(self, decoder: EventCommandDecoder, page_list: list) -> Entries:
+        """Decodes a page's command list, reusing the entries of an identical page."""
+        if not decoder.wants(page_list):
+            return []
+        key = decoder.key + orjson.dumps(page_list)
+        with self._lock:
+            entries = self._pages.get(key)
+            if entries is None and self.cache_file is not None:
+                digest = content_hash(key)
+                entries = self._stored.get(digest)
+                if entries is not None:
+                    self._pages[key] = entries
+            if entries is not None:
+                self.reused += 1
+                return _copy(entries)
+        entries = decoder.decode(page_list)
+        with self._lock:
+            self.decoded += 1
+            self._pages[key] = _copy(entries)
+            if self.cache_file is not None:
+                self._stored[digest] = self._pages[key]
+                self._changed.add(digest)
+                self._dirty = True
+        return entries
+
+    @property
+    def stats(self) -> typing.Dict[str, int]:
+        return {"decoded": self.decoded, "duplicates": self.reused}
+
+    def pop_changes(self) -> typing.Dict[str, typing.Any]:
+        """Returns and clears the changes since the last call. Used to send worker updates to the parent."""
+        with self._lock:
+            changes = {
+                "pages": {digest: self._stored[digest] for digest in self._changed},
+                "decoded": self.decoded,
+                "duplicates": self.reused,
+            }
+            self._changed = set()
+            self.decoded = 0
+            self.reused = 0
+        return changes
+
+    def update(self, changes: typing.Dict[str, typing.Any]):
+        with self._lock:
+            self.decoded += changes["decoded"]
+            self.reused += changes["duplicates"]
+            if changes["pages"]:
+                self._stored.update(changes["pages"])
+                self._dirty = True
@@ -0,0 +1,91 @@
+import logging
+import queue
+import threading
+import traceback
+import typing
+
+# Marks the end of the stream.
+_done = object()
+
+
+def _feed(items: typing.Iterable[typing.Any], output: queue.Queue, errors: typing.List[Exception]):
+    # The stream is always ended, or the stages and `pipeline` would wait forever.
+    try:
+        for item in items:
+            output.put(item)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        output.put(_done)
+
+
+def _run_stage(
+    stage: typing.Callable[[typing.Any], typing.Any],
+    source: queue.Queue,
+    output: queue.Queue,
+    logger: logging.Logger,
+    label: typing.Callable[[typing.Any], str],
+):
+    while True:
+        item = source.get()
+        if item is _done:
+            output.put(_done)
+            return
+        try:
+            result = stage(item)
+        except Exception:
+            logger.error(f"Failed processing: {label(item)}\n{traceback.format_exc()}")
+            continue
+        if result is not None:
+            output.put(result)
+
+
+def pipeline(
+    items: typing.Iterable[typing.Any],
+    stages: typing.List[typing.Callable[[typing.Any], typing.Any]],
+    logger: logging.Logger,
+    depth: int = 4,
+    label: typing.Callable[[typing.Any], str] = str,
+) -> typing.Generator[typing.Any, None, None]:
+    """Streams items through `stages`. Each stage runs in its own thread.
+
+    Stages are connected with queues holding at most `depth` items, so a fast stage waits
+    for a slower one instead of piling up work. While one item is in a slow stage
+    (e.g. a translator waiting on the network), later items move through the others.
+
+    A stage returns the item for the next stage. Returning None drops the item.
+    A stage that raises drops the item and the error is logged.
+    If iterating `items` raises, the items read so far still go through and the error is raised afterwards.
+
+    Args:
+        items (typing.Iterable[typing.Any]): The work items.
+        stages (typing.List[typing.Callable[[typing.Any], typing.Any]]): The stages in order.
+        logger (logging.Logger): Logger for reporting failed items.
+        depth (int, optional): Queue size between stages. Defaults to 4.
+        label (typing.Callable[[typing.Any], str], optional): Names an item in error messages. Defaults to str.
+
+    Yields:
+        typing.Any: Items that made it through the last stage, in the order they finish.
+    """
+    queues = [queue.Queue(maxsize=max(1, depth)) for _ in range(len(stages) + 1)]
+    errors: typing.List[Exception] = []
+    threads = [threading.Thread(target=_feed, args=(items, queues[0], errors), daemon=True)]
+    for idx, stage in enumerate(stages):
+        threads.append(
+            threading.Thread(
+                target=_run_stage,
+                args=(stage, queues[idx], queues[idx + 1], logger, label),
+                daemon=True,
+            )
+        )
+    for thread in threads:
+        thread.start()
+    while True:
+        item = queues[-1].get()
+        if item is _done:
+            break
+        yield item
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
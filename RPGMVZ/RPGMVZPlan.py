@@ -0,0 +1,111 @@
+import array
+import struct
+import typing
+
+import orjson
+
+# Compiled plans start with this.
+MAGIC = b"DFPP"
+_header = struct.Struct("<4sBI")
+_itemsize = array.array("Q").itemsize
+
+
+class PatchPlan:
+    version = 1
+
+    def __init__(self, original: str, mapping: typing.Optional[str]) -> None:
+        """A mapping compiled against one original file: the byte ranges to replace and the encoded values to put there.
+
+        The writes of `patch_operations` are resolved to offsets (See `find_spans`), validated and encoded once.
+        Patching is then a single pass over the original bytes. The plan is only valid for the original and
+        mapping it was compiled from, so both digests are kept with it.
+
+        Args:
+            original (str): Content hash of the original file.
+            mapping (typing.Optional[str]): Digest of the mapping. (See `MappingStore.digest`)
+        """
+        self.original = original
+        self.mapping = mapping
+        self.starts = array.array("Q")
+        self.ends = array.array("Q")
+        self.values: typing.List[bytes] = []
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @classmethod
+    def compile(
+        cls,
+        original: str,
+        mapping: typing.Optional[str],
+        replacements: typing.Iterable[typing.Tuple[int, int, bytes]],
+    ) -> "PatchPlan":
+        """Builds a plan from (start, end, new bytes). Replacements are sorted and checked for overlaps here, not when patching."""
+        plan = cls(original, mapping)
+        last = 0
+        for start, end, data in sorted(replacements, key=lambda replacement: replacement[0]):
+            if start < last:
+                raise ValueError(f"Overlapping replacement at {start}")
+            plan.starts.append(start)
+            plan.ends.append(end)
+            plan.values.append(data)
+            last = end
+        return plan
+
+    def matches(self, original: str, mapping: typing.Optional[str]) -> bool:
+        return mapping is not None and self.original == original and self.mapping == mapping
+
+    def execute(self, raw: bytes) -> bytes:
+        """Applies the plan to the original bytes."""
+        view = memoryview(raw)
+        parts = []
+        last = 0
+        for start, end, data in zip(self.starts, self.ends, self.values):
+            parts.append(view[last:start])
+            parts.append(data)
+            last = end
+        parts.append(view[last:])
+        return b"".join(parts)
+
+    def to_bytes(self) -> bytes:
+        """Binary encoding: magic, version, header length, json header, the offset columns and the values as one blob."""
+        lengths = array.array("Q", map(len, self.values))
+        header = orjson.dumps(
+            {"original": self.original, "mapping": self.mapping, "count": len(self)}
+        )
+        return b"".join(
+            [
+                _header.pack(MAGIC, self.version, len(header)),
+                header,
+                self.starts.tobytes(),
+                self.ends.tobytes(),
+                lengths.tobytes(),
+            ]
+            + self.values
+        )
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "PatchPlan":
+        if len(raw) < _header.size:
+            raise ValueError("Not a patch plan.")
+        magic, version, header_size = _header.unpack_from(raw)
+        if magic != MAGIC or version != cls.version:
+            raise ValueError("Not a patch plan.")
+        offset = _header.size
+        header = orjson.loads(raw[offset : offset + header_size])
+        offset += header_size
+        plan = cls(header["original"], header["mapping"])
+        columns = []
+        for _ in range(3):
+            column = array.array("Q")
+            end = offset + header["count"] * _itemsize
+            column.frombytes(raw[offset:end])
+            columns.append(column)
+            offset = end
+        plan.starts, plan.ends, lengths = columns
+        values = []
+        for length in lengths:
+            values.append(raw[offset : offset + length])
+            offset += length
+        plan.values = values
+        return plan
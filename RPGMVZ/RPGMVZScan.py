@@ -0,0 +1,200 @@
+import re
+import typing
+
+import orjson
+
+_ws = re.compile(rb"[ \t\n\r]*")
+_string = re.compile(rb'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_scalar = re.compile(rb"[^\s,\]}]+")
+# A flat array of numbers, e.g. the tile data of a map.
+_number_array = re.compile(rb"\[[0-9eE+\-.,\s]*\]")
+_structure = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{}]', re.DOTALL)
+
+
+def skip_ws(raw: bytes, pos: int) -> int:
+    return _ws.match(raw, pos).end()
+
+
+def skip_value(raw: bytes, pos: int) -> int:
+    """Returns the end of the json value starting at `pos` without decoding it."""
+    char = raw[pos : pos + 1]
+    if char == b'"':
+        string = _string.match(raw, pos)
+        if not string:
+            raise ValueError(f"Unterminated json string at {pos}")
+        return string.end()
+    if char == b"[":
+        numbers = _number_array.match(raw, pos)
+        if numbers:
+            return numbers.end()
+    elif char != b"{":
+        scalar = _scalar.match(raw, pos)
+        if not scalar:
+            raise ValueError(f"Expected a json value at {pos}")
+        return scalar.end()
+    depth = 0
+    for token in _structure.finditer(raw, pos):
+        kind = raw[token.start()]
+        if kind == 0x5B or kind == 0x7B:  # [ {
+            depth += 1
+        elif kind == 0x5D or kind == 0x7D:  # ] }
+            depth -= 1
+            if depth == 0:
+                return token.end()
+    raise ValueError(f"Unterminated json value at {pos}")
+
+
+def iter_members(
+    raw: bytes, pos: int = 0
+) -> typing.Generator[typing.Tuple[str, int, int], None, None]:
+    """Walks the members of the json object at `pos`.
+
+    Yields:
+        typing.Tuple[str, int, int]: The key and the start/end offsets of its (undecoded) value.
+    """
+    pos = skip_ws(raw, pos)
+    if raw[pos : pos + 1] != b"{":
+        raise ValueError(f"Expected a json object at {pos}")
+    pos = skip_ws(raw, pos + 1)
+    if raw[pos : pos + 1] == b"}":
+        return
+    while True:
+        key_match = _string.match(raw, pos)
+        if not key_match:
+            raise ValueError(f"Expected a key at {pos}")
+        key = orjson.loads(key_match.group())
+        pos = skip_ws(raw, key_match.end())
+        if raw[pos : pos + 1] != b":":
+            raise ValueError(f"Expected ':' at {pos}")
+        start = skip_ws(raw, pos + 1)
+        end = skip_value(raw, start)
+        yield key, start, end
+        pos = skip_ws(raw, end)
+        if raw[pos : pos + 1] != b",":
+            return
+        pos = skip_ws(raw, pos + 1)
+
+
+def load_map_without_tiles(raw: bytes) -> typing.Any:
+    """Parses a Map*.json file without building the tile `data` array.
+
+    The top level members of the map are walked until `data` is found. The tile array is
+    matched as bytes and replaced with an empty list before the rest is parsed, so none of
+    its width*height*6 integers are created.
+
+    Falls back to a full parse if the file does not look like a map.
+
+    Args:
+        raw (bytes): The content of the map file.
+
+    Returns:
+        typing.Any: The parsed map with `data` set to an empty list.
+    """
+    if raw.startswith(b"\xef\xbb\xbf"):
+        raw = raw[3:]
+    try:
+        for key, start, end in iter_members(raw):
+            if key == "data":
+                return orjson.loads(raw[:start] + b"[]" + raw[end:])
+    except ValueError:
+        pass
+    return orjson.loads(raw)
+
+
+Path = typing.Tuple[typing.Union[str, int], ...]
+
+
+def _walk_spans(
+    raw: bytes,
+    pos: int,
+    path: Path,
+    wanted: typing.Set[Path],
+    prefixes: typing.Set[Path],
+    spans: typing.Dict[Path, typing.Tuple[int, int]],
+) -> int:
+    start = pos
+    char = raw[pos : pos + 1]
+    if path not in prefixes or char not in (b"{", b"["):
+        end = skip_value(raw, pos)
+    elif char == b"{":
+        pos = skip_ws(raw, pos + 1)
+        while raw[pos : pos + 1] != b"}":
+            key_match = _string.match(raw, pos)
+            if not key_match:
+                raise ValueError(f"Expected a key at {pos}")
+            key = orjson.loads(key_match.group())
+            pos = skip_ws(raw, key_match.end())
+            if raw[pos : pos + 1] != b":":
+                raise ValueError(f"Expected ':' at {pos}")
+            pos = skip_ws(raw, pos + 1)
+            pos = _walk_spans(raw, pos, path + (key,), wanted, prefixes, spans)
+            pos = skip_ws(raw, pos)
+            if raw[pos : pos + 1] == b",":
+                pos = skip_ws(raw, pos + 1)
+        end = pos + 1
+    else:
+        pos = skip_ws(raw, pos + 1)
+        index = 0
+        while raw[pos : pos + 1] != b"]":
+            pos = _walk_spans(raw, pos, path + (index,), wanted, prefixes, spans)
+            pos = skip_ws(raw, pos)
+            if raw[pos : pos + 1] == b",":
+                pos = skip_ws(raw, pos + 1)
+            index += 1
+        end = pos + 1
+    if path in wanted:
+        spans[path] = (start, end)
+    return end
+
+
+def find_spans(
+    raw: bytes, paths: typing.Iterable[Path]
+) -> typing.Dict[Path, typing.Tuple[int, int]]:
+    """Finds the byte offsets of the json values at `paths`.
+
+    Only containers leading to a wanted path are walked. Everything else is skipped undecoded.
+
+    Args:
+        raw (bytes): The json document.
+        paths (typing.Iterable[Path]): Paths of object keys / list indexes, e.g. ("events", 3, "pages", 0).
+
+    Returns:
+        typing.Dict[Path, typing.Tuple[int, int]]: The start and end offset of each value that was found.
+    """
+    wanted = set(paths)
+    prefixes: typing.Set[Path] = set()
+    for path in wanted:
+        for idx in range(len(path)):
+            prefixes.add(path[:idx])
+    spans: typing.Dict[Path, typing.Tuple[int, int]] = {}
+    pos = 3 if raw.startswith(b"\xef\xbb\xbf") else 0
+    _walk_spans(raw, skip_ws(raw, pos), (), wanted, prefixes, spans)
+    return spans
+
+
+def splice(raw: bytes, replacements: typing.List[typing.Tuple[int, int, bytes]]) -> bytes:
+    """Replaces byte ranges in `raw`. Everything outside the ranges is kept as is.
+
+    Args:
+        raw (bytes): The original bytes.
+        replacements (typing.List[typing.Tuple[int, int, bytes]]): (start, end, new bytes). Must not overlap.
+    """
+    view = memoryview(raw)
+    parts = []
+    last = 0
+    for start, end, data in sorted(replacements, key=lambda replacement: replacement[0]):
+        if start < last:
+            raise ValueError(f"Overlapping replacement at {start}")
+        parts.append(view[last:start])
+        parts.append(data)
+        last = end
+    parts.append(view[last:])
+    return b"".join(parts)
+
+
+def set_path(document: typing.Any, path: Path, value: typing.Any):
+    """Sets the value at `path` inside a parsed document."""
+    container = document
+    for key in path[:-1]:
+        container = container[key]
+    container[path[-1]] = value
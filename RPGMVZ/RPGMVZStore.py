@@ -0,0 +1,351 @@
+import logging
+import pathlib
+import sqlite3
+import threading
+import typing
+
+import orjson
+
+from .RPGMVZCache import DocumentCache
+from .RPGMVZEntries import EntryTable, load_mapping, load_table
+from .RPGMVZManifest import content_hash
+
+Mapping = typing.Union[typing.Dict[str, typing.Any], EntryTable]
+
+
+class MappingStore:
+    # Set when the mappings are files. Build inputs then use the hashes cached by the build graph instead of `digest`.
+    digest_files = False
+
+    def exists(self, path: pathlib.Path) -> bool:
+        raise NotImplementedError()
+
+    def read_mapping(self, path: pathlib.Path, mutable: bool = False) -> typing.Dict[str, typing.Any]:
+        """Reads a mapping as json (dictionaries and lists).
+
+        Args:
+            path (pathlib.Path): The mapped file.
+            mutable (bool, optional): The mapping will be modified. Returns a copy nobody else holds. Defaults to False.
+        """
+        raise NotImplementedError()
+
+    def read_table(self, path: pathlib.Path, paged: bool, mutable: bool = False) -> EntryTable:
+        """Reads an event mapping as an `EntryTable`.
+
+        Args:
+            path (pathlib.Path): The mapped file.
+            paged (bool): The events have pages. Only used for mappings stored as json.
+            mutable (bool, optional): The table will be modified. Returns a copy nobody else holds. Defaults to False.
+        """
+        raise NotImplementedError()
+
+    def write(self, path: pathlib.Path, mapping: Mapping, compact: bool, paged: bool):
+        """Writes a mapping.
+
+        Args:
+            path (pathlib.Path): The mapped file.
+            mapping (Mapping): The mapping. Event mappings can be given as a table or as json.
+            compact (bool): The mapping is an event mapping that can be stored as an `EntryTable`.
+            paged (bool): The events have pages.
+        """
+        raise NotImplementedError()
+
+    def digest(self, path: pathlib.Path) -> typing.Optional[str]:
+        """Changes whenever the mapping is written. None if there is no mapping."""
+        raise NotImplementedError()
+
+
+class FileStore(MappingStore):
+    digest_files = True
+
+    def __init__(self, documents: DocumentCache, mapping_format: str = "json") -> None:
+        """Mappings as one file per data file in `tl_workspace/data`. (The default)
+
+        Args:
+            documents (DocumentCache): Parsed mappings are shared through the document cache.
+            mapping_format (str, optional): How event mappings are written. "json" or "binary" (`EntryTable.to_bytes`). Defaults to "json".
+        """
+        self.documents = documents
+        self.mapping_format = mapping_format
+
+    def exists(self, path: pathlib.Path) -> bool:
+        return path.exists()
+
+    def read_mapping(self, path: pathlib.Path, mutable: bool = False) -> typing.Dict[str, typing.Any]:
+        if mutable:
+            return self.documents.take(path, loader=load_mapping)
+        return self.documents.get(path, loader=load_mapping)
+
+    def read_table(self, path: pathlib.Path, paged: bool, mutable: bool = False) -> EntryTable:
+        loader = lambda raw: load_table(raw, paged=paged)
+        if mutable:
+            return self.documents.take(path, loader=loader, variant="table")
+        return self.documents.get(path, loader=loader, variant="table")
+
+    def write(self, path: pathlib.Path, mapping: Mapping, compact: bool, paged: bool):
+        self.documents.discard(path)
+        if compact and self.mapping_format == "binary":
+            if not isinstance(mapping, EntryTable):
+                mapping = EntryTable.from_mapping(mapping, paged=paged)
+            raw = mapping.to_bytes()
+            path.write_bytes(raw)
+            self.documents.put(path, mapping, len(raw), variant="table")
+            return
+        if isinstance(mapping, EntryTable):
+            mapping = mapping.to_mapping()
+        raw = orjson.dumps(mapping, option=orjson.OPT_INDENT_2)
+        path.write_bytes(raw)
+        self.documents.put(path, mapping, len(raw))
+
+    def digest(self, path: pathlib.Path) -> typing.Optional[str]:
+        if not path.exists():
+            return None
+        return content_hash(path.read_bytes())
+
+
+_schema = """
+CREATE TABLE IF NOT EXISTS mappings (
+    rel TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    -- The whole mapping for json mappings. The header (mapping without events) for entry mappings.
+    body TEXT NOT NULL,
+    -- NULL for json mappings. Otherwise the entries are in `entries`.
+    paged INTEGER
+);
+CREATE TABLE IF NOT EXISTS entries (
+    rel TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    event INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    meta TEXT,
+    pointer TEXT NOT NULL,
+    original TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (rel, row)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_event ON entries (rel, event);
+"""
+
+
+def _json(value: typing.Any) -> str:
+    return orjson.dumps(value).decode("utf-8")
+
+
+class SQLiteStore(MappingStore):
+    version = 1
+
+    def __init__(self, db_file: pathlib.Path, root: pathlib.Path) -> None:
+        """Every mapping of the project in a single SQLite database. Enabled with `store = "sqlite"` in `[General]`.
+
+        Map and common event mappings are stored one row per entry, with the text it was mapped with (`original`)
+        and its current text. Other mappings are stored as a single json value.
+
+        Tables read with `mutable` track the rows changed by `set_text`. Writing them back only updates those rows,
+        so an import is a handful of UPDATEs instead of rewriting the whole mapping.
+
+        Each mapping has a revision that goes up on every write. It stands in for the file hash in the build graph.
+
+        Connections are opened per thread (and per worker process) on first use.
+
+        Args:
+            db_file (pathlib.Path): The database. Typically `tl_workspace/project.db`
+            root (pathlib.Path): The mapping folder (`tl_workspace/data`). Mappings are keyed on their path relative to it.
+        """
+        self.db_file = db_file
+        self.root = root
+        self.logger = logging.getLogger("DF|Store")
+        self._local = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            if not self.db_file.parent.exists():
+                self.db_file.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.db_file, timeout=60)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, self.version):
+                raise Exception(
+                    f"{self.db_file.name} was made by a different version (schema {version}). Expected {self.version}."
+                )
+            with db:
+                db.executescript(_schema)
+                db.execute(f"PRAGMA user_version={self.version}")
+            self._local.db = db
+        return db
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    def rel(self, path: pathlib.Path) -> str:
+        try:
+            return path.resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return path.resolve().as_posix()
+
+    def _record(self, path: pathlib.Path) -> typing.Optional[typing.Tuple[str, int, str, typing.Optional[int]]]:
+        return self.db.execute(
+            "SELECT type, revision, body, paged FROM mappings WHERE rel = ?", (self.rel(path),)
+        ).fetchone()
+
+    def exists(self, path: pathlib.Path) -> bool:
+        return self._record(path) is not None
+
+    def digest(self, path: pathlib.Path) -> typing.Optional[str]:
+        record = self._record(path)
+        if record is None:
+            return None
+        return f"revision:{record[1]}"
+
+    def read_mapping(self, path: pathlib.Path, mutable: bool = False) -> typing.Dict[str, typing.Any]:
+        record = self._record(path)
+        if record is None:
+            raise FileNotFoundError(path)
+        if record[3] is None:
+            return orjson.loads(record[2])
+        return self.read_table(path, bool(record[3])).to_mapping()
+
+    def read_table(self, path: pathlib.Path, paged: bool, mutable: bool = False) -> EntryTable:
+        record = self._record(path)
+        if record is None:
+            raise FileNotFoundError(path)
+        if record[3] is None:
+            return EntryTable.from_mapping(orjson.loads(record[2]), paged=paged)
+        table = EntryTable(paged=bool(record[3]))
+        table.header = orjson.loads(record[2])
+        rows = self.db.execute(
+            "SELECT event, page, kind, meta, pointer, text FROM entries WHERE rel = ? ORDER BY row",
+            (self.rel(path),),
+        )
+        for event, page, kind, meta, pointer, text in rows:
+            table.append(
+                event,
+                page,
+                {"type": kind, "meta": meta, "pointer": orjson.loads(pointer), "text": orjson.loads(text)},
+            )
+        if mutable:
+            table.revision = record[1]
+            table.edited = set()
+        return table
+
+    def write(self, path: pathlib.Path, mapping: Mapping, compact: bool, paged: bool):
+        rel = self.rel(path)
+        if isinstance(mapping, EntryTable) and mapping.edited is not None:
+            if self._write_edited(rel, mapping):
+                return
+        with self.db:
+            if not compact:
+                if isinstance(mapping, EntryTable):
+                    mapping = mapping.to_mapping()
+                self._replace(rel, mapping.get("type", ""), _json(mapping), None)
+                self.db.execute("DELETE FROM entries WHERE rel = ?", (rel,))
+                return
+            if not isinstance(mapping, EntryTable):
+                mapping = EntryTable.from_mapping(mapping, paged=paged)
+            # Keep the original text of entries that are still mapped. (e.g. `refresh_commands` keeps translations)
+            originals = {
+                (event, page, kind, pointer): original
+                for event, page, kind, pointer, original in self.db.execute(
+                    "SELECT event, page, kind, pointer, original FROM entries WHERE rel = ?", (rel,)
+                )
+            }
+            self._replace(rel, mapping.header.get("type", ""), _json(mapping.header), int(mapping.paged))
+            self.db.execute("DELETE FROM entries WHERE rel = ?", (rel,))
+            self.db.executemany(
+                "INSERT INTO entries (rel, row, event, page, kind, meta, pointer, original, text) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._rows(rel, mapping, originals),
+            )
+
+    def _replace(self, rel: str, kind: str, body: str, paged: typing.Optional[int]):
+        self.db.execute(
+            """INSERT INTO mappings (rel, type, revision, body, paged) VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT (rel) DO UPDATE SET type = excluded.type, revision = revision + 1, body = excluded.body, paged = excluded.paged""",
+            (rel, kind, body, paged),
+        )
+
+    def _rows(self, rel: str, table: EntryTable, originals: typing.Dict[tuple, str]):
+        for idx, event, page, entry in table.rows():
+            pointer = _json(entry["pointer"])
+            text = _json(entry["text"])
+            original = originals.get((event, page, entry["type"], pointer), text)
+            yield rel, idx, event, page, entry["type"], entry.get("meta"), pointer, original, text
+
+    def _write_edited(self, rel: str, table: EntryTable) -> bool:
+        """Updates the text of the rows edited since the table was read. False if the mapping was written in between."""
+        with self.db:
+            updated = self.db.execute(
+                "UPDATE mappings SET revision = revision + 1 WHERE rel = ? AND revision = ?",
+                (rel, table.revision),
+            )
+            if updated.rowcount != 1:
+                return False
+            self.db.executemany(
+                "UPDATE entries SET text = ? WHERE rel = ? AND row = ?",
+                [
+                    (_json(table.text[table.text_at[row] : table.text_at[row + 1]]), rel, row)
+                    for row in sorted(table.edited)
+                ],
+            )
+        table.revision += 1
+        table.edited = set()
+        return True
+
+    def entries(
+        self,
+        rel: typing.Optional[str] = None,
+        event: typing.Optional[int] = None,
+        untranslated: bool = False,
+    ) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        """Queries the entries of the event mappings.
+
+        Args:
+            rel (typing.Optional[str], optional): Only this data file (`Map001.json`). Defaults to None (All files).
+            event (typing.Optional[int], optional): Only this event ID. Defaults to None (All events).
+            untranslated (bool, optional): Only entries whose text is still the text they were mapped with. Defaults to False.
+        """
+        query = "SELECT rel, event, page, row, kind, meta, original, text FROM entries"
+        where, params = [], []
+        if rel is not None:
+            where.append("rel = ?")
+            params.append(rel)
+        if event is not None:
+            where.append("event = ?")
+            params.append(event)
+        if untranslated:
+            where.append("text = original")
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY rel, row"
+        for rel, event, page, row, kind, meta, original, text in self.db.execute(query, params):
+            yield {
+                "file": rel,
+                "event": event,
+                "page": page,
+                "row": row,
+                "type": kind,
+                "meta": meta,
+                "original": orjson.loads(original),
+                "text": orjson.loads(text),
+            }
+
+    def status(self) -> typing.List[typing.Tuple[str, int, int]]:
+        """(data file, entries, untranslated entries) for every event mapping."""
+        return self.db.execute(
+            "SELECT rel, COUNT(*), SUM(text = original) FROM entries GROUP BY rel ORDER BY rel"
+        ).fetchall()
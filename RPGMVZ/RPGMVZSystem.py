@@ -125,6 +125,7 @@ terms_patch = {
 class SystemMVfungler(MVZFungler):
 
     fungler_type = "system"
+    config_sections = ("General", "System")
 
     def create_maps(self):
         self.read_mapped(create=True)
@@ -194,13 +195,13 @@ class SystemMVfungler(MVZFungler):
             mapping["locale"] = system_data["locale"]
 
         mapping["game_title"] = system_data["gameTitle"]
-        self.mapped_file.write_bytes(orjson.dumps(mapping, option=orjson.OPT_INDENT_2))
+        self.write_mapped(mapping)
 
     def apply_maps(self, patch_file: pathlib.Path):
         mapping = self.read_mapped()
         if not mapping:
             return
-        system_data = self.original_data
+        system_data = self.checkout_original()
         if not isinstance(system_data, dict):
             raise Exception("System not in right format.")
         if self.config["System"]["armor_types"]:
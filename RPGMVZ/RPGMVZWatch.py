@@ -0,0 +1,122 @@
+import logging
+import os
+import pathlib
+import threading
+import time
+import typing
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class _EventRecorder(FileSystemEventHandler):
+    def __init__(self, watcher: "FolderWatcher") -> None:
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        # Editors that save atomically move a temporary file over the original.
+        path = getattr(event, "dest_path", "") or event.src_path
+        self.watcher.touch(pathlib.Path(os.fsdecode(path)))
+
+
+class FolderWatcher:
+    def __init__(
+        self,
+        folder: pathlib.Path,
+        suffix: str,
+        debounce: float = 0.3,
+        interval: float = 0.2,
+        polling: bool = False,
+    ) -> None:
+        """Watches a folder for saved files.
+
+        Uses `watchdog` (inotify, FSEvents, ...) when it is installed. Otherwise the folder is polled every `interval` seconds.
+
+        A file is only reported once it has not changed for `debounce` seconds, so rapid saves are reported once.
+
+        Args:
+            folder (pathlib.Path): The folder to watch (recursively).
+            suffix (str): Only files ending with this are reported. e.g. ".nt.txt"
+            debounce (float, optional): Seconds a file must be quiet before it is reported. Defaults to 0.3.
+            interval (float, optional): Seconds between checks. Defaults to 0.2.
+            polling (bool, optional): Always poll, even if watchdog is installed. Defaults to False.
+        """
+        self.folder = folder
+        self.suffix = suffix
+        self.debounce = debounce
+        self.interval = interval
+        self.polling = polling or Observer is None
+        self.logger = logging.getLogger("DF|Watch")
+        self._pending: typing.Dict[pathlib.Path, float] = {}
+        self._lock = threading.Lock()
+        self._stats: typing.Dict[pathlib.Path, typing.Tuple[int, int]] = {}
+
+    def touch(self, path: pathlib.Path):
+        """Records that a file changed."""
+        if not path.name.endswith(self.suffix):
+            return
+        with self._lock:
+            self._pending[path] = time.monotonic()
+
+    def _scan(self) -> typing.Dict[pathlib.Path, typing.Tuple[int, int]]:
+        stats = {}
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                if not name.endswith(self.suffix):
+                    continue
+                path = pathlib.Path(root) / name
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                stats[path] = (stat.st_size, stat.st_mtime_ns)
+        return stats
+
+    def _poll(self):
+        stats = self._scan()
+        for path, stat in stats.items():
+            if self._stats.get(path) != stat:
+                self.touch(path)
+        self._stats = stats
+
+    def _settled(self) -> typing.List[pathlib.Path]:
+        now = time.monotonic()
+        with self._lock:
+            ready = [
+                path
+                for path, changed in self._pending.items()
+                if now - changed >= self.debounce
+            ]
+            for path in ready:
+                del self._pending[path]
+        return sorted(ready)
+
+    def watch(self) -> typing.Generator[pathlib.Path, None, None]:
+        """Yields files as they are saved. Runs until interrupted."""
+        observer = None
+        if self.polling:
+            self.logger.info(f"Polling {self.folder} every {self.interval}s")
+            self._stats = self._scan()
+        else:
+            observer = Observer()
+            observer.schedule(_EventRecorder(self), str(self.folder), recursive=True)
+            observer.start()
+        try:
+            while True:
+                time.sleep(self.interval)
+                if self.polling:
+                    self._poll()
+                for path in self._settled():
+                    if path.exists():
+                        yield path
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
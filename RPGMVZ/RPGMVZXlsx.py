@@ -0,0 +1,400 @@
+import pathlib
+import posixpath
+import re
+import typing
+import zipfile
+from xml.etree import ElementTree
+
+Cell = typing.Union[str, int, float, None]
+
+# Excel's limits on sheet names.
+_sheet_name_chars = re.compile(r"[\[\]:*?/\\]")
+_max_sheet_name = 31
+
+# Characters XML cannot hold are written as `_xHHHH_`. An underscore that would read as such an escape is escaped itself.
+_unsafe = re.compile(r"_(?=x[0-9A-Fa-f]{4}_)|[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_xml_escapes = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+_content_types = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    "{sheets}</Types>"
+)
+_sheet_type = '<Override PartName="/xl/worksheets/sheet{idx}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+_root_rels = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+_workbook = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    "<sheets>{sheets}</sheets></workbook>"
+)
+_workbook_sheet = '<sheet name="{name}" sheetId="{idx}" r:id="rId{idx}"/>'
+_workbook_rels = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    "{sheets}"
+    '<Relationship Id="rId0" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    "</Relationships>"
+)
+_sheet_rel = '<Relationship Id="rId{idx}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{idx}.xml"/>'
+_styles = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+_sheet_start = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_sheet_end = "</sheetData></worksheet>"
+
+
+_escaped = re.compile(r"_x([0-9A-Fa-f]{4})_")
+_main = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_rels = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_doc_rels = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_cell_column = re.compile(r"[A-Z]+")
+_digits = "0123456789"
+
+
+def _escape_unsafe(match: re.Match) -> str:
+    return f"_x{ord(match.group()):04X}_"
+
+
+def xml_text(value: str) -> str:
+    """Escapes a string for a cell. (See `_unsafe`)"""
+    return _unsafe.sub(_escape_unsafe, value).translate(_xml_escapes).replace('"', "&quot;")
+
+
+def cell_text(value: str) -> str:
+    """Reverses the `_xHHHH_` escapes of `xml_text`. (XML escapes are already undone by the parser)"""
+    if "_x" not in value:
+        return value
+    return _escaped.sub(lambda match: chr(int(match.group(1), 16)), value)
+
+
+def column_index(ref: str) -> int:
+    """A -> 0, Z -> 25, AA -> 26 ... Takes a cell reference (`B12`) or just its column."""
+    idx = 0
+    for char in _cell_column.match(ref).group():
+        idx = idx * 26 + ord(char) - 64
+    return idx - 1
+
+
+def column_letter(idx: int) -> str:
+    """0 -> A, 25 -> Z, 26 -> AA ..."""
+    letters = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def sheet_title(name: str, used: typing.Set[str]) -> str:
+    """A valid sheet name for `name` that is not in `used` (case insensitive, like Excel). Adds it to `used`."""
+    base = _sheet_name_chars.sub("_", name).strip("'")[:_max_sheet_name] or "Sheet"
+    title = base
+    count = 1
+    while title.lower() in used:
+        count += 1
+        suffix = f"~{count}"
+        title = base[: _max_sheet_name - len(suffix)] + suffix
+    used.add(title.lower())
+    return title
+
+
+class SheetStream:
+    # Rows are encoded in batches of this many before going to the zip stream.
+    batch = 512
+
+    def __init__(self, stream: typing.BinaryIO) -> None:
+        """Writes the rows of one worksheet as they come. Only the current batch of rows is kept in memory.
+
+        Strings are written inline (`inlineStr`) so no shared string table has to be built up.
+        """
+        self.stream = stream
+        self.rows = 0
+        self._columns: typing.List[str] = []
+        self._pending: typing.List[str] = []
+        stream.write(_sheet_start.encode("utf-8"))
+
+    def write_row(self, values: typing.Sequence[Cell]) -> None:
+        """Appends a row. None leaves a cell empty."""
+        self.rows += 1
+        row = self.rows
+        columns = self._columns
+        while len(columns) < len(values):
+            columns.append(column_letter(len(columns)))
+        cells = [f'<row r="{row}">']
+        for column, value in zip(columns, values):
+            if value is None:
+                continue
+            if isinstance(value, str):
+                cells.append(
+                    f'<c r="{column}{row}" t="inlineStr"><is><t xml:space="preserve">{xml_text(value)}</t></is></c>'
+                )
+            elif isinstance(value, bool):
+                cells.append(f'<c r="{column}{row}" t="b"><v>{int(value)}</v></c>')
+            else:
+                cells.append(f'<c r="{column}{row}"><v>{value}</v></c>')
+        cells.append("</row>")
+        self._pending.append("".join(cells))
+        if len(self._pending) >= self.batch:
+            self.flush()
+
+    def write_rows(self, rows: typing.Iterable[typing.Sequence[Cell]]) -> None:
+        for values in rows:
+            self.write_row(values)
+
+    def flush(self) -> None:
+        if self._pending:
+            self.stream.write("".join(self._pending).encode("utf-8"))
+            self._pending = []
+
+    def close(self) -> None:
+        self.flush()
+        self.stream.write(_sheet_end.encode("utf-8"))
+        self.stream.close()
+
+
+class XlsxStream:
+    def __init__(self, path: pathlib.Path, compresslevel: int = 1) -> None:
+        """Streams an xlsx workbook to `path`, one sheet at a time.
+
+        The workbook is written to `<path>.part` and only moved into place by `close`, so a failed export
+        never leaves a broken workbook behind. Nothing but the sheet names is kept once a sheet is closed.
+
+        Args:
+            path (pathlib.Path): The workbook to write.
+            compresslevel (int, optional): zlib level of the sheets. Defaults to 1 (Fast. Text compresses well anyway).
+        """
+        self.path = path
+        self._part = path.with_name(path.name + ".part")
+        self._zip = zipfile.ZipFile(
+            self._part, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel
+        )
+        # (Sheet name, Row count) in the order the sheets were added.
+        self.sheets: typing.List[typing.Tuple[str, int]] = []
+        self._order: typing.List[int] = []
+        self._used: typing.Set[str] = set()
+        self._open: typing.Optional[SheetStream] = None
+
+    def add_sheet(self, name: str, position: typing.Optional[int] = None) -> SheetStream:
+        """Starts a new sheet. The previous sheet is closed first.
+
+        Args:
+            name (str): Sheet name. Made valid and unique if it is not. (See `sheet_title`)
+            position (typing.Optional[int], optional): Where the sheet goes in the workbook. Defaults to after the other sheets.
+        """
+        self.close_sheet()
+        title = sheet_title(name, self._used)
+        self.sheets.append((title, 0))
+        idx = len(self.sheets)
+        self._order.insert(len(self._order) if position is None else position, idx)
+        self._open = SheetStream(
+            self._zip.open(f"xl/worksheets/sheet{idx}.xml", "w", force_zip64=True)
+        )
+        return self._open
+
+    @property
+    def sheet_name(self) -> typing.Optional[str]:
+        """Name of the sheet being written. None if there is none."""
+        return self.sheets[-1][0] if self._open else None
+
+    def close_sheet(self) -> None:
+        if self._open is None:
+            return
+        self._open.close()
+        self.sheets[-1] = (self.sheets[-1][0], self._open.rows)
+        self._open = None
+
+    def close(self) -> None:
+        self.close_sheet()
+        if not self.sheets:
+            # Excel refuses workbooks without sheets.
+            self.add_sheet("Sheet")
+            self.close_sheet()
+        count = range(1, len(self.sheets) + 1)
+        self._zip.writestr(
+            "[Content_Types].xml",
+            _content_types.format(sheets="".join(_sheet_type.format(idx=idx) for idx in count)),
+        )
+        self._zip.writestr("_rels/.rels", _root_rels)
+        self._zip.writestr(
+            "xl/workbook.xml",
+            _workbook.format(
+                sheets="".join(
+                    _workbook_sheet.format(name=xml_text(self.sheets[idx - 1][0]), idx=idx)
+                    for idx in self._order
+                )
+            ),
+        )
+        self._zip.writestr(
+            "xl/_rels/workbook.xml.rels",
+            _workbook_rels.format(sheets="".join(_sheet_rel.format(idx=idx) for idx in count)),
+        )
+        self._zip.writestr("xl/styles.xml", _styles)
+        self._zip.close()
+        self._part.replace(self.path)
+
+    def discard(self) -> None:
+        """Drops the workbook without writing it."""
+        if self._open is not None:
+            self._open.stream.close()
+            self._open = None
+        self._zip.close()
+        self._part.unlink(missing_ok=True)
+
+    def __enter__(self) -> "XlsxStream":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def _string_item(element: ElementTree.Element) -> str:
+    """Text of a shared or inline string. Rich text runs are joined. Phonetic guides (`rPh`) are not part of the text."""
+    text = element.find(f"{_main}t")
+    if text is not None:
+        return cell_text(text.text or "")
+    return cell_text(
+        "".join(run.text or "" for run in element.iterfind(f"{_main}r/{_main}t"))
+    )
+
+
+class XlsxReader:
+    def __init__(self, path: pathlib.Path) -> None:
+        """Reads the sheets of an xlsx workbook row by row. Only the shared strings are kept in memory.
+
+        Cells are returned as text: numbers as written in the file, booleans as `0` / `1` and empty cells as None.
+        Works on workbooks written by `XlsxStream`, pandas (XlsxWriter / openpyxl) and Excel itself.
+        """
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        names = set(self._zip.namelist())
+        targets = {}
+        shared = None
+        for rel in ElementTree.fromstring(self._zip.read("xl/_rels/workbook.xml.rels")):
+            target = rel.get("Target", "")
+            target = target[1:] if target.startswith("/") else posixpath.normpath("xl/" + target)
+            targets[rel.get("Id")] = target
+            if rel.get("Type", "").endswith("/sharedStrings"):
+                shared = target
+        # Sheet name -> path in the zip, in workbook order.
+        self.sheets: typing.Dict[str, str] = {}
+        workbook = ElementTree.fromstring(self._zip.read("xl/workbook.xml"))
+        for sheet in workbook.iterfind(f"{_main}sheets/{_main}sheet"):
+            target = targets.get(sheet.get(f"{_doc_rels}id"))
+            if target in names:
+                self.sheets[sheet.get("name")] = target
+        self.shared: typing.List[str] = []
+        if shared in names:
+            with self._zip.open(shared) as stream:
+                for _, element in ElementTree.iterparse(stream):
+                    if element.tag == f"{_main}si":
+                        self.shared.append(_string_item(element))
+                        element.clear()
+
+    def rows(self, sheet: str) -> typing.Generator[typing.List[typing.Optional[str]], None, None]:
+        """The rows of a sheet, in order. Rows left out of the file (empty rows) are yielded as empty lists."""
+        shared = self.shared
+        row_tag, cell_tag = f"{_main}row", f"{_main}c"
+        value_tag, inline_tag = f"{_main}v", f"{_main}is"
+        # Column letters -> index.
+        columns: typing.Dict[str, int] = {}
+        last = 0
+        with self._zip.open(self.sheets[sheet]) as stream:
+            for _, element in ElementTree.iterparse(stream):
+                if element.tag != row_tag:
+                    continue
+                number = int(element.get("r") or last + 1)
+                while last + 1 < number:
+                    last += 1
+                    yield []
+                last = number
+                values: typing.List[typing.Optional[str]] = []
+                for cell in element:
+                    if cell.tag != cell_tag:
+                        continue
+                    ref = cell.get("r")
+                    if ref:
+                        letters = ref.rstrip(_digits)
+                        idx = columns.get(letters)
+                        if idx is None:
+                            idx = columns[letters] = column_index(letters)
+                    else:
+                        idx = len(values)
+                    if idx > len(values):
+                        values.extend([None] * (idx - len(values)))
+                    kind = cell.get("t")
+                    if kind == "inlineStr":
+                        inline = cell.find(inline_tag)
+                        value = None if inline is None else _string_item(inline)
+                    else:
+                        value = cell.findtext(value_tag)
+                        if value is not None:
+                            if kind == "s":
+                                value = shared[int(value)]
+                            elif kind == "str":
+                                value = cell_text(value)
+                    values.append(value)
+                element.clear()
+                yield values
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def __enter__(self) -> "XlsxReader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def pick_texts(
+    rows: typing.Iterable[typing.List[typing.Optional[str]]],
+    columns: typing.Sequence[str],
+    key: typing.Optional[str] = None,
+) -> typing.Dict[typing.Optional[str], typing.List[str]]:
+    """The effective text of each row of an export sheet: the first filled cell of `columns` (most edited first).
+
+    The first row is the header. Rows are grouped on the `key` column if there is one, otherwise they all go under None.
+    A row without any filled cell gives an empty string.
+    """
+    rows = iter(rows)
+    header = next(rows, [])
+    picks = [header.index(name) for name in columns if name in header]
+    key_idx = header.index(key) if key is not None and key in header else None
+    grouped: typing.Dict[typing.Optional[str], typing.List[str]] = {}
+    texts = grouped.setdefault(None, []) if key_idx is None else None
+    for values in rows:
+        size = len(values)
+        text = ""
+        for idx in picks:
+            if idx < size and values[idx]:
+                text = values[idx]
+                break
+        if key_idx is not None:
+            section = values[key_idx] if key_idx < size else None
+            texts = grouped.setdefault(section, [])
+        texts.append(text)
+    return grouped